@@ -0,0 +1,317 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Batch
+# Description:
+#   Vectorized simulator that advances many independent Kuba games in lockstep
+#   using NumPy arrays. Every game in the batch follows the same rules as
+#   KubaGame.make_move / validate_move, but a step applies one move to every
+#   game at once with array operations instead of one Python call per game.
+#   Requires NumPy.
+
+import numpy as np
+
+from KubaGame import KubaGame
+
+
+class BatchSimulator:
+    """
+    Holds N Kuba games as arrays:
+        - boards: (N, 7, 7) uint8 cell values (EMPTY, WHITE, BLACK or RED)
+        - turn: (N,) uint8 color to move (WHITE or BLACK, or 0 before the first move)
+        - ko: (N, 3) int8 Ko restriction as (row, column, direction), or (0, 0, -1)
+          for none; the row and column can be just off the board (-1 or 7)
+        - captures: (N, 2) uint8 red marbles captured by White and by Black
+        - counts: (N, 3) uint8 number of White, Black and Red marbles on the board
+        - winner: (N,) uint8 color of the winner, or 0 while the game is in play
+
+    Players are identified by their marble color. Directions are the integers
+    0 to 3 for F, B, L and R (DIRECTIONS); any other value is an unrecognized
+    direction and is rejected like a bad direction letter in validate_move.
+    """
+
+    EMPTY = 0
+    WHITE = 1
+    BLACK = 2
+    RED = 3
+
+    VALUES = 'XWBR'
+    DIRECTIONS = 'FBLR'
+
+    # row and column step for each direction code, and the opposite direction
+    STEPS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)], dtype=np.int64)
+    OPPOSITE = np.array([1, 0, 3, 2], dtype=np.int8)
+
+    # For each flat cell index and direction: the flat indices of the ray from
+    # the cell to the edge (padded with 49, the index of an always empty cell
+    # past the end of each flattened board), the ray length, the flat index of
+    # the ray's edge cell, and the flat index of the access cell behind the
+    # cell (49 when it is off the board).
+    RAY_INDEX = np.full((49, 4, 7), 49, dtype=np.int64)
+    RAY_LENGTH = np.zeros((49, 4), dtype=np.int64)
+    EDGE_INDEX = np.zeros((49, 4), dtype=np.int64)
+    ACCESS_INDEX = np.full((49, 4), 49, dtype=np.int64)
+
+    for _index in range(49):
+        for _code, _direction in enumerate(DIRECTIONS):
+            _ray = KubaGame.RAYS[(divmod(_index, 7), _direction)]
+            _behind = KubaGame.ACCESS_CELLS[(divmod(_index, 7), _direction)]
+
+            RAY_INDEX[_index, _code, :len(_ray)] = [row * 7 + col for row, col in _ray]
+            RAY_LENGTH[_index, _code] = len(_ray)
+            EDGE_INDEX[_index, _code] = _ray[-1][0] * 7 + _ray[-1][1]
+
+            if _behind != None:
+                ACCESS_INDEX[_index, _code] = _behind[0] * 7 + _behind[1]
+
+    del _index, _code, _direction, _ray, _behind
+
+    def __init__(self, size):
+        """
+        Takes the number of games and sets every game to the standard starting
+        position with no turn assigned.
+        """
+        start = KubaGame().export_state()[0]
+        layout = np.array([self.VALUES.index(value) for value in start], dtype=np.uint8)
+
+        self.boards = np.tile(layout.reshape(7, 7), (size, 1, 1))
+        self.turn = np.zeros(size, dtype=np.uint8)
+        self.ko = np.zeros((size, 3), dtype=np.int8)
+        self.ko[:, 2] = -1
+        self.captures = np.zeros((size, 2), dtype=np.uint8)
+        self.counts = np.tile(np.array([8, 8, 13], dtype=np.uint8), (size, 1))
+        self.winner = np.zeros(size, dtype=np.uint8)
+
+    def __len__(self):
+        """
+        Returns the number of games in the batch.
+        """
+        return len(self.turn)
+
+    def padded_boards(self):
+        """
+        Returns the boards flattened to (N, 50), with an extra empty cell at
+        index 49 that the padded ray and access indices point to.
+        """
+        flat = np.zeros((len(self), 50), dtype=np.uint8)
+        flat[:, :49] = self.boards.reshape(len(self), 49)
+
+        return flat
+
+    def legal_mask(self, colors=None):
+        """
+        Returns an (N, 49, 4) boolean array marking every legal (cell, direction)
+        move in each game for the given colors (an (N,) array, by default the
+        color to move). The rules are those of validate_move: the game is not
+        won, the marble is the player's, the access cell is empty or off the
+        board, the move is not the Ko move, and the push does not force the
+        player's own marble off the board. Turn order is not checked, so this
+        also works before the first move.
+        """
+        size = len(self)
+
+        if colors is None:
+            colors = self.turn
+
+        colors = np.asarray(colors, dtype=np.uint8).reshape(size, 1, 1)
+        boards = self.boards
+        own = boards == colors
+        empty = boards == self.EMPTY
+        edge = np.ones((size, 1, 7), dtype=bool)
+
+        # access cell behind each marble is empty, or off the board at the edge
+        # pushed away from (F pushes up, so the access cell is the one below)
+        access = np.stack([
+            np.concatenate([empty[:, 1:, :], edge], axis=1),
+            np.concatenate([edge, empty[:, :-1, :]], axis=1),
+            np.concatenate([empty[:, :, 1:], edge.transpose(0, 2, 1)], axis=2),
+            np.concatenate([edge.transpose(0, 2, 1), empty[:, :, :-1]], axis=2)], axis=3)
+
+        # whether the ray from each cell to the edge in each direction passes an
+        # empty cell (running ORs toward and away from row or column 0)
+        has_empty = np.stack([
+            np.logical_or.accumulate(empty, axis=1),
+            np.logical_or.accumulate(empty[:, ::-1, :], axis=1)[:, ::-1, :],
+            np.logical_or.accumulate(empty, axis=2),
+            np.logical_or.accumulate(empty[:, :, ::-1], axis=2)[:, :, ::-1]], axis=3)
+
+        # whether the edge cell each ray ends at holds one of the player's marbles
+        edge_own = np.stack(np.broadcast_arrays(
+            own[:, :1, :], own[:, 6:, :], own[:, :, :1], own[:, :, 6:]), axis=3)
+
+        push_own_off = ~has_empty & edge_own
+        own = own[..., np.newaxis]
+
+        mask = own & access & ~push_own_off & (self.winner == 0).reshape(size, 1, 1, 1)
+        mask = mask.reshape(size, 49, 4)
+
+        # remove the Ko move
+        ko_rows, ko_cols, ko_dirs = self.ko[:, 0], self.ko[:, 1], self.ko[:, 2]
+        on_board = (ko_dirs >= 0) & (ko_rows >= 0) & (ko_rows <= 6) & (ko_cols >= 0) & (ko_cols <= 6)
+        games = np.nonzero(on_board)[0]
+        mask[games, ko_rows[games] * 7 + ko_cols[games], ko_dirs[games]] = False
+
+        return mask
+
+    def step(self, rows, cols, directions, colors):
+        """
+        Applies one move to every game. Takes (N,) arrays of the row, column and
+        direction of each move and the color of the player making it. Follows
+        the order of checks in validate_move, including assigning the first
+        turn to the player who attempts a move on the board before any turn is
+        set. Valid moves are pushed, red marbles pushed off are credited to the
+        mover, the Ko restriction is updated, wins are declared and the turn
+        passes to the other color. Returns an (N,) boolean array that is True
+        where the move was made, like the return value of make_move.
+        """
+        size = len(self)
+        games = np.arange(size)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        directions = np.asarray(directions, dtype=np.int64)
+        colors = np.asarray(colors, dtype=np.uint8)
+
+        on_board = (rows >= 0) & (rows <= 6) & (cols >= 0) & (cols <= 6)
+        in_play = on_board & (self.winner == 0)
+        players = (colors == self.WHITE) | (colors == self.BLACK)
+
+        # the first player to attempt a move on the board gets the turn
+        assign = in_play & players & (self.turn == 0)
+        self.turn[assign] = colors[assign]
+
+        cells = np.where(on_board, rows * 7 + cols, 0)
+        codes = np.where((directions >= 0) & (directions <= 3), directions, 0)
+        flat = self.padded_boards()
+        value = flat[games, cells]
+
+        valid = in_play & players & (self.turn == colors) & (value == colors)
+        valid &= (directions >= 0) & (directions <= 3)
+        valid &= ~((self.ko[:, 0] == rows) & (self.ko[:, 1] == cols) & (self.ko[:, 2] == directions))
+        valid &= flat[games, self.ACCESS_INDEX[cells, codes]] == self.EMPTY
+
+        ray = self.RAY_INDEX[cells, codes]
+        length = self.RAY_LENGTH[cells, codes]
+        line = flat[games[:, np.newaxis], ray]
+        positions = np.arange(7)
+        empties = (line == self.EMPTY) & (positions < length[:, np.newaxis])
+        has_empty = empties.any(axis=1)
+        last = flat[games, self.EDGE_INDEX[cells, codes]]
+
+        valid &= has_empty | (last != colors)
+
+        # the push moves the line up to the first empty cell, or up to the edge
+        # (dropping the last marble) when there is none
+        end = np.where(has_empty, empties.argmax(axis=1), length)
+        pushed_off = np.where(valid & ~has_empty, last, self.EMPTY)
+
+        shifted = np.zeros_like(line)
+        shifted[:, 1:] = line[:, :-1]
+        changed = valid[:, np.newaxis] & (positions <= np.minimum(end, length - 1)[:, np.newaxis])
+        new_line = np.where(changed, shifted, line)
+
+        flat[games[:, np.newaxis], ray] = new_line
+        self.boards = flat[:, :49].reshape(size, 7, 7).copy()
+
+        # captures and marble counts from the marble pushed off the board
+        mover_index = (colors.astype(np.int64) - 1).clip(0, 1)
+        red_off = pushed_off == self.RED
+        self.captures[games[red_off], mover_index[red_off]] += 1
+
+        for code in (self.WHITE, self.BLACK, self.RED):
+            self.counts[pushed_off == code, code - 1] -= 1
+
+        # Ko: the reverse push from the cell where the line ended (which is just
+        # off the board when a marble was pushed off)
+        steps = self.STEPS[codes]
+        self.ko[valid, 0] = (rows + end * steps[:, 0])[valid]
+        self.ko[valid, 1] = (cols + end * steps[:, 1])[valid]
+        self.ko[valid, 2] = self.OPPOSITE[codes][valid]
+
+        # wins: opponent's marbles gone, 7 red marbles, or opponent has no moves
+        opponents = np.where(colors == self.WHITE, self.BLACK, self.WHITE).astype(np.uint8)
+        eliminated = (self.counts[:, 0] == 0) | (self.counts[:, 1] == 0)
+        reds = self.captures[games, mover_index] >= 7
+        won = valid & (eliminated | reds)
+
+        check = valid & ~won
+
+        if check.any():
+            stuck = ~self.legal_mask(opponents).any(axis=(1, 2))
+            won |= check & stuck
+
+        self.winner[won] = colors[won]
+        self.turn[valid] = opponents[valid]
+
+        return valid
+
+    def random_moves(self, rng, first_color=WHITE):
+        """
+        Takes a numpy random Generator and returns (rows, cols, directions,
+        colors) arrays holding one uniformly chosen legal move for the color to
+        move in each game; games where no move has been made yet are moved by
+        first_color. Games without a legal move (or finished games) get an
+        off-board move, which step rejects.
+        """
+        size = len(self)
+        colors = np.where(self.turn == 0, first_color, self.turn).astype(np.uint8)
+        mask = self.legal_mask(colors).reshape(size, 196)
+        weights = rng.random((size, 196)) * mask
+        choice = weights.argmax(axis=1)
+        has_move = mask.any(axis=1)
+
+        cells, directions = np.divmod(choice, 4)
+        rows = np.where(has_move, cells // 7, -1)
+        cols = np.where(has_move, cells % 7, -1)
+
+        return rows, cols, directions, colors
+
+    @classmethod
+    def from_games(cls, games):
+        """
+        Takes a list of KubaGame objects and returns a batch holding their
+        current positions. Player names are not kept: each game's players are
+        represented by their marble colors.
+        """
+        batch = cls(len(games))
+
+        for index, game in enumerate(games):
+            cells, players, current_turn, ko_move, reds, winner = game.export_state()
+            colors = dict(players)
+
+            batch.boards[index] = np.array([cls.VALUES.index(value) for value in cells],
+                                           dtype=np.uint8).reshape(7, 7)
+            batch.turn[index] = cls.VALUES.index(colors[current_turn]) if current_turn != None else 0
+            batch.winner[index] = cls.VALUES.index(colors[winner]) if winner != None else 0
+
+            if ko_move[0] != None:
+                batch.ko[index] = (ko_move[0][0], ko_move[0][1], cls.DIRECTIONS.index(ko_move[1]))
+
+            for (name, color), count in zip(players, reds):
+                batch.captures[index, cls.VALUES.index(color) - 1] = count
+
+            batch.counts[index] = game.get_marble_count()
+
+        return batch
+
+    def to_game(self, index, white_name='PlayerW', black_name='PlayerB'):
+        """
+        Takes the index of a game in the batch and optional player names, and
+        returns a KubaGame in the same position (the White player is passed
+        to the constructor first).
+        """
+        names = {self.WHITE: white_name, self.BLACK: black_name}
+        cells = ''.join(self.VALUES[value] for value in self.boards[index].reshape(49))
+        ko_row, ko_col, ko_direction = (int(value) for value in self.ko[index])
+
+        if ko_direction >= 0:
+            ko_move = ((ko_row, ko_col), self.DIRECTIONS[ko_direction])
+        else:
+            ko_move = (None, None)
+
+        state = (cells,
+                 ((white_name, 'W'), (black_name, 'B')),
+                 names.get(int(self.turn[index])),
+                 ko_move,
+                 (int(self.captures[index, 0]), int(self.captures[index, 1])),
+                 names.get(int(self.winner[index])))
+
+        return KubaGame.from_state(state)
@@ -0,0 +1,406 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Benchmark
+# Description:
+#   Reproducible benchmarks for the hot paths of KubaGame.py: move validation
+#   (accepted and rejected moves), make_move with long push chains,
+#   update_game_state and other_player_move_check on crowded and sparse boards,
+#   replays of recorded games, and full random games from the starting position. Every benchmark uses a
+#   fixed seed and reports operations per second, latency percentiles and peak
+#   memory. Results are saved as JSON and can be compared against an earlier run
+#   to catch regressions:
+#
+#       python KubaBenchmark.py --output after.json --compare before.json
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from KubaGame import KubaGame, Board, BitBoard, CompactBoard
+
+
+BOARD_CLASSES = {'dict': Board, 'bitboard': BitBoard, 'compact': CompactBoard}
+
+PLAYERS = (('PlayerA', 'W'), ('PlayerB', 'B'))
+
+# a full row of marbles behind an off-board access cell: pushing the White
+# marble at (3, 0) right moves six marbles, and in the second position also
+# pushes a red marble off the board
+LONG_CHAIN = ('WWXXXBB' 'WWXXXBB' 'XXXXXXX' 'WRBRBRX' 'XXXXXXX' 'BBXXXWW' 'BBXXXWW')
+LONG_CHAIN_CAPTURE = ('WWXXXBB' 'WWXXXBB' 'XXXXXXX' 'WRBRBRR' 'XXXXXXX' 'BBXXXWW' 'BBXXXWW')
+
+# a late-game position with few marbles left
+SPARSE = ('WXXXXXB' 'XXXXXXX' 'XXRXXXX' 'XXXRXXX' 'XXXXRXX' 'XXXXXXX' 'BXXXXXW')
+
+
+def game_from_cells(cells, board_class):
+    """
+    Takes a 49-character board string and a board backend and returns a game in
+    that position with PlayerA (White) to move.
+    """
+    state = (cells, PLAYERS, 'PlayerA', (None, None), (0, 0), None)
+
+    return KubaGame.from_state(state, board_class)
+
+
+def random_position(rng, board_class, moves):
+    """
+    Returns a game reached by playing the given number of random legal moves
+    from the starting position (fewer if the game ends first).
+    """
+    game = KubaGame(PLAYERS[0], PLAYERS[1], board_class)
+    player_name = 'PlayerA'
+
+    for _ in range(moves):
+        legal = game.legal_moves(player_name)
+
+        if not legal or game.get_winner() != None:
+            break
+
+        move = legal[rng.randrange(len(legal))]
+        game.make_move(player_name, move[0], move[1])
+        player_name = game.get_current_turn()
+
+    return game
+
+
+def setup_validate_accept(rng, board_class):
+    """
+    Benchmark: validate_move for moves that are accepted, from a mid-game
+    position.
+    """
+    game = random_position(rng, board_class, 20)
+    player_name = game.get_current_turn()
+    moves = game.legal_moves(player_name)
+
+    def step(index):
+        move = moves[index % len(moves)]
+        game.validate_move(player_name, move[0], move[1])
+
+    return step
+
+
+def setup_validate_reject(rng, board_class):
+    """
+    Benchmark: validate_move for moves that are rejected, from a mid-game
+    position. The candidates cover every rejection reason that occurs there: off
+    the board, wrong turn, empty or red cell, opponent marble, bad direction,
+    blocked access cell, Ko and pushing an own marble off.
+    """
+    game = random_position(rng, board_class, 20)
+    player_name = game.get_current_turn()
+    opponent_name = game.get_opponent(player_name)
+
+    candidates = [(player_name, (7, 7), 'F'), (opponent_name, (3, 3), 'F'),
+                  (player_name, (3, 3), 'Q')]
+
+    for row in range(7):
+
+        for col in range(7):
+
+            for direction in 'FBLR':
+                candidates.append((player_name, (row, col), direction))
+
+    rejected = [move for move in candidates
+                if not game.validate_move(move[0], move[1], move[2])]
+    rng.shuffle(rejected)
+
+    def step(index):
+        move = rejected[index % len(rejected)]
+        game.validate_move(move[0], move[1], move[2])
+
+    return step
+
+
+def setup_make_move_long_chain(rng, board_class):
+    """
+    Benchmark: make_move pushing a line of six marbles, alternating with a
+    push of seven marbles that forces a red marble off. Each operation is the
+    move followed by unmake_move to restore the position.
+    """
+    games = [game_from_cells(LONG_CHAIN, board_class),
+             game_from_cells(LONG_CHAIN_CAPTURE, board_class)]
+
+    def step(index):
+        game = games[index & 1]
+        game.make_move('PlayerA', (3, 0), 'R')
+        game.unmake_move()
+
+    return step
+
+
+def setup_replay_moves(rng, board_class):
+    """
+    Benchmark: make_move replaying recorded random games, one move per
+    operation, starting a new game (not timed separately) when one ends.
+    The same games are replayed on every backend, so the moves per second of
+    the backends can be compared directly.
+    """
+    games = []
+
+    for _ in range(50):
+        game = KubaGame(PLAYERS[0], PLAYERS[1])
+        player_name = 'PlayerA'
+        moves = []
+
+        while game.get_winner() == None and len(moves) < 300:
+            legal = game.legal_moves(player_name)
+
+            if not legal:
+                break
+
+            move = legal[rng.randrange(len(legal))]
+            game.make_move(player_name, move[0], move[1])
+            moves.append((player_name, move[0], move[1]))
+            player_name = game.get_current_turn()
+
+        games.append(moves)
+
+    # each move, and whether a new game starts with it
+    replay = [(number == 0, move) for moves in games for number, move in enumerate(moves)]
+    current = [None]
+
+    def step(index):
+        first, (player_name, coordinate, direction) = replay[index % len(replay)]
+
+        if first:
+            current[0] = KubaGame(PLAYERS[0], PLAYERS[1], board_class)
+
+        current[0].make_move(player_name, coordinate, direction)
+
+    return step
+
+
+def setup_update_crowded(rng, board_class):
+    """
+    Benchmark: update_game_state on the full starting board.
+    """
+    game = KubaGame(PLAYERS[0], PLAYERS[1], board_class)
+    game.set_current_turn('PlayerA')
+
+    def step(index):
+        game.update_game_state()
+
+    return step
+
+
+def setup_update_sparse(rng, board_class):
+    """
+    Benchmark: update_game_state on a late-game board with few marbles.
+    """
+    game = game_from_cells(SPARSE, board_class)
+
+    def step(index):
+        game.update_game_state()
+
+    return step
+
+
+def setup_move_check_crowded(rng, board_class):
+    """
+    Benchmark: other_player_move_check on the full starting board.
+    """
+    game = KubaGame(PLAYERS[0], PLAYERS[1], board_class)
+    game.set_current_turn('PlayerA')
+
+    def step(index):
+        game.other_player_move_check()
+
+    return step
+
+
+def setup_move_check_sparse(rng, board_class):
+    """
+    Benchmark: other_player_move_check on a late-game board with few marbles.
+    """
+    game = game_from_cells(SPARSE, board_class)
+
+    def step(index):
+        game.other_player_move_check()
+
+    return step
+
+
+def setup_random_playout(rng, board_class):
+    """
+    Benchmark: a complete game of random legal moves from the starting
+    position, cut off after 300 moves.
+    """
+    def step(index):
+        random_position(rng, board_class, 300)
+
+    return step
+
+
+# name, setup function, and the fraction of the requested iterations to run
+BENCHMARKS = [
+    ('validate_move_accept', setup_validate_accept, 1),
+    ('validate_move_reject', setup_validate_reject, 1),
+    ('make_move_long_chain', setup_make_move_long_chain, 1),
+    ('replay_moves', setup_replay_moves, 1),
+    ('update_game_state_crowded', setup_update_crowded, 1),
+    ('update_game_state_sparse', setup_update_sparse, 1),
+    ('other_player_move_check_crowded', setup_move_check_crowded, 1),
+    ('other_player_move_check_sparse', setup_move_check_sparse, 1),
+    ('random_playout', setup_random_playout, 1000),
+]
+
+
+def percentile(ordered, fraction):
+    """
+    Takes a sorted list and a fraction between 0 and 1 and returns the value at
+    that position (nearest rank).
+    """
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+
+    return ordered[index]
+
+
+def run_benchmark(setup, iterations, seed, board_class):
+    """
+    Runs one benchmark and returns its results as a dictionary. Latencies are
+    measured per operation after a short warmup; peak memory is measured in a
+    second, separate run under tracemalloc (which slows everything down) and
+    includes the setup.
+    """
+    step = setup(random.Random(seed), board_class)
+
+    for index in range(min(iterations, 100)):
+        step(index)
+
+    clock = time.perf_counter_ns
+    latencies = [0] * iterations
+
+    for index in range(iterations):
+        start = clock()
+        step(index)
+        latencies[index] = clock() - start
+
+    total = sum(latencies)
+    latencies.sort()
+
+    tracemalloc.start()
+    step = setup(random.Random(seed), board_class)
+
+    for index in range(min(iterations, 1000)):
+        step(index)
+
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'ops_per_sec': iterations / (total / 1e9) if total > 0 else 0.0,
+        'mean_us': total / iterations / 1000,
+        'p50_us': percentile(latencies, 0.50) / 1000,
+        'p90_us': percentile(latencies, 0.90) / 1000,
+        'p99_us': percentile(latencies, 0.99) / 1000,
+        'max_us': latencies[-1] / 1000,
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_suite(iterations=20000, seed=1234, board='dict', only=None):
+    """
+    Runs every benchmark (or those named in only) and returns the report
+    dictionary that is saved as JSON: the settings, the Python version and
+    platform, and the results of each benchmark keyed by name.
+    """
+    board_class = BOARD_CLASSES[board]
+    results = {}
+
+    for name, setup, divisor in BENCHMARKS:
+
+        if only and name not in only:
+            continue
+
+        results[name] = run_benchmark(setup, max(1, iterations // divisor), seed, board_class)
+
+    return {
+        'seed': seed,
+        'iterations': iterations,
+        'board': board,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Takes two reports and the allowed fractional slowdown and returns a list of
+    (name, baseline ops/sec, current ops/sec, ratio, regressed) tuples for the
+    benchmarks present in both.
+    """
+    rows = []
+
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+
+        if before == None or before['ops_per_sec'] == 0:
+            continue
+
+        ratio = result['ops_per_sec'] / before['ops_per_sec']
+        rows.append((name, before['ops_per_sec'], result['ops_per_sec'], ratio,
+                     ratio < 1 - tolerance))
+
+    return rows
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Prints a results table, writes the JSON report if
+    --output is given, and with --compare exits with status 1 when any benchmark
+    is slower than the baseline by more than the tolerance.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the KubaGame hot paths.")
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict')
+    parser.add_argument('--only', nargs='*', help="names of the benchmarks to run")
+    parser.add_argument('--output', help="path of the JSON report to write")
+    parser.add_argument('--compare', help="path of a baseline JSON report")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="allowed slowdown against the baseline (default 0.10)")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.iterations, args.seed, args.board, args.only)
+
+    print("%-34s %12s %9s %9s %9s %12s" % ('benchmark', 'ops/sec', 'p50 us', 'p90 us',
+                                            'p99 us', 'peak bytes'))
+
+    for name, result in report['results'].items():
+        print("%-34s %12.0f %9.2f %9.2f %9.2f %12d" % (
+            name, result['ops_per_sec'], result['p50_us'], result['p90_us'],
+            result['p99_us'], result['peak_memory_bytes']))
+
+    if args.output:
+
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        regressed = False
+        print()
+
+        for name, before, after, ratio, slower in compare(report, baseline, args.tolerance):
+            print("%-34s %12.0f -> %12.0f  %6.2fx%s" % (name, before, after, ratio,
+                                                      '  REGRESSION' if slower else ''))
+            regressed = regressed or slower
+
+        if regressed:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Cache
+# Description:
+#   Persistent position-evaluation cache for the Kuba game implemented in
+#   KubaGame.py. Entries are keyed by KubaSymmetry.canonical_key, so a result
+#   stored for one position also answers its rotations, reflections and color
+#   swaps. Each entry holds a score (from the point of view of the player to
+#   move), the search depth it came from and optionally the best move.
+#
+#   An in-process LRU dictionary sits in front of a SQLite database in WAL
+#   mode, which any number of worker processes can read while one of them
+#   writes, and which survives restarts. Writes are buffered and committed in
+#   batches. When the database holds more than max_entries entries, the least
+#   recently used are deleted. Each process opens its own EvaluationCache (a
+#   SQLite connection cannot be shared between processes):
+#
+#       with EvaluationCache('evals.db') as cache:
+#           found = cache.get(game, min_depth=4)
+#
+#           if found == None:
+#               move, stats = player.choose_move(game, name)
+#               cache.put(game, stats['score'], stats['depth'], move)
+
+import sqlite3
+import time
+from collections import OrderedDict
+
+from KubaSymmetry import canonical_key, transform_move, untransform_move
+
+
+DIRECTIONS = 'FBLR'
+
+# canonical keys fit in 118 bits
+KEY_BYTES = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    key BLOB PRIMARY KEY,
+    score REAL NOT NULL,
+    depth INTEGER NOT NULL,
+    move INTEGER,
+    used INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS evaluations_used ON evaluations (used);
+"""
+
+# commits between exact recounts of the file, which pick up entries written by
+# other processes; in between the count is kept from this process's writes
+RECOUNT_INTERVAL = 100
+
+
+def encode_move(move):
+    """
+    Returns the integer stored for a (coordinate, direction) move: cell index
+    * 4 + index of the direction in "FBLR", or None for no move.
+    """
+    if move == None:
+        return None
+
+    (row, col), direction = move
+
+    return (row * 7 + col) * 4 + DIRECTIONS.index(direction)
+
+
+def decode_move(code):
+    """
+    Returns the (coordinate, direction) move for a stored integer, or None.
+    """
+    if code == None:
+        return None
+
+    cell, direction = divmod(code, 4)
+
+    return (divmod(cell, 7), DIRECTIONS[direction])
+
+
+class EvaluationCache:
+    """
+    Caches position evaluations in memory and in a SQLite file shared between
+    processes and restarts. A result is only replaced by one from an equal or
+    deeper search.
+    """
+
+    def __init__(self, path, memory_size=100000, max_entries=1000000, write_batch=1000,
+                 timeout=30.0):
+        """
+        Takes the path of the database file (created if needed), the number of
+        entries kept in the in-process LRU, the number of entries the file may
+        hold before the least recently used are evicted, the number of buffered
+        writes that triggers a commit, and how long to wait in seconds for
+        another process's write to finish.
+        """
+        self._memory_size = memory_size
+        self._max_entries = max_entries
+        self._write_batch = write_batch
+        self._memory = OrderedDict()
+        # key -> (score, depth, move code, time used) waiting to be committed
+        self._pending = {}
+        # keys read from the file whose time used should be refreshed
+        self._touched = set()
+
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+
+        # approximate number of entries in the file: counted once here, then
+        # kept up to date from this process's inserts and evictions, and
+        # recounted every RECOUNT_INTERVAL commits
+        self._disk_entries = self._count_entries()
+        self._commits_since_count = 0
+
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0,
+                       'commits': 0, 'evictions': 0}
+
+    def get(self, game, min_depth=0):
+        """
+        Takes a KubaGame and the smallest search depth that is acceptable, and
+        returns (score, depth, move) for the position, with move translated to
+        the game's own orientation (None if no move was stored), or None if
+        there is no entry at least that deep.
+        """
+        key, transform = canonical_key(game)
+        found = self.get_key(key, min_depth)
+
+        if found == None:
+            return None
+
+        score, depth, move = found
+
+        if move != None:
+            move = untransform_move(move, transform)
+
+        return score, depth, move
+
+    def put(self, game, score, depth=0, move=None):
+        """
+        Takes a KubaGame, the score of its position for the player to move, the
+        depth of the search that produced it and optionally the best move (in
+        the game's orientation), and stores them unless a deeper result is
+        already cached.
+        """
+        key, transform = canonical_key(game)
+
+        if move != None:
+            move = transform_move((tuple(move[0]), move[1]), transform)
+
+        self.put_key(key, score, depth, move)
+
+    def get_key(self, key, min_depth=0):
+        """
+        Takes a canonical key and returns (score, depth, move) with the move in
+        the canonical orientation, or None. Looks in memory first, then in the
+        file.
+        """
+        entry = self._memory.get(key)
+
+        if entry != None:
+            self._memory.move_to_end(key)
+
+            if entry[1] >= min_depth:
+                self._stats['memory_hits'] += 1
+                return entry[0], entry[1], decode_move(entry[2])
+
+        row = self._connection.execute(
+            'SELECT score, depth, move FROM evaluations WHERE key = ?',
+            (key.to_bytes(KEY_BYTES, 'big'),)).fetchone()
+
+        if row == None or row[1] < min_depth:
+            self._stats['misses'] += 1
+            return None
+
+        self._stats['disk_hits'] += 1
+        self._remember(key, row)
+        self._touched.add(key)
+
+        return row[0], row[1], decode_move(row[2])
+
+    def put_key(self, key, score, depth=0, move=None):
+        """
+        Takes a canonical key, a score, the search depth and a move in the
+        canonical orientation (or None) and stores them unless a deeper result
+        is already cached. The file is written when write_batch entries are
+        waiting, or on flush and close.
+        """
+        entry = self._memory.get(key)
+
+        if entry != None and entry[1] > depth:
+            return
+
+        row = (score, depth, encode_move(move))
+        self._remember(key, row)
+        self._pending[key] = row
+        self._stats['stores'] += 1
+
+        if len(self._pending) >= self._write_batch:
+            self.flush()
+
+    def _remember(self, key, row):
+        """
+        Puts an entry at the most recently used end of the in-memory LRU,
+        dropping the least recently used entry when it is full.
+        """
+        self._memory[key] = row
+        self._memory.move_to_end(key)
+
+        if len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def _count_entries(self):
+        """
+        Returns the exact number of entries in the file. Scans the table, so it
+        is only used at open and every RECOUNT_INTERVAL commits.
+        """
+        return self._connection.execute('SELECT COUNT(*) FROM evaluations').fetchone()[0]
+
+    def flush(self):
+        """
+        Commits the buffered writes and the refreshed use times in one
+        transaction, then evicts the least recently used entries if the file
+        holds more than max_entries. The number of entries is tracked from the
+        rows each commit inserts and deletes rather than counted each time.
+        """
+        if not self._pending and not self._touched:
+            return
+
+        now = time.time_ns()
+        rows = [(key.to_bytes(KEY_BYTES, 'big'), score, depth, move, now)
+                for key, (score, depth, move) in self._pending.items()]
+        touched = [(now, key.to_bytes(KEY_BYTES, 'big')) for key in self._touched]
+
+        with self._connection:
+            # existing entries are replaced by equal or deeper results first, so
+            # that the insert below only adds new keys and its row count is the
+            # number of entries added
+            self._connection.executemany(
+                'UPDATE evaluations SET score = ?, depth = ?, move = ?, used = ? '
+                'WHERE key = ? AND depth <= ?',
+                [(score, depth, move, used, key, depth) for key, score, depth, move, used in rows])
+            inserted = self._connection.executemany(
+                'INSERT OR IGNORE INTO evaluations (key, score, depth, move, used) '
+                'VALUES (?, ?, ?, ?, ?)', rows).rowcount
+            self._connection.executemany('UPDATE evaluations SET used = ? WHERE key = ?', touched)
+
+            self._commits_since_count += 1
+
+            if self._commits_since_count >= RECOUNT_INTERVAL:
+                self._disk_entries = self._count_entries()
+                self._commits_since_count = 0
+            else:
+                self._disk_entries += inserted
+
+            if self._disk_entries > self._max_entries:
+                # evict down to 90% so eviction does not run on every commit
+                excess = self._disk_entries - self._max_entries * 9 // 10
+                deleted = self._connection.execute(
+                    'DELETE FROM evaluations WHERE key IN '
+                    '(SELECT key FROM evaluations ORDER BY used LIMIT ?)', (excess,)).rowcount
+                self._disk_entries -= deleted
+                self._stats['evictions'] += deleted
+
+        self._pending.clear()
+        self._touched.clear()
+        self._stats['commits'] += 1
+
+    def stats(self):
+        """
+        Returns a dictionary of counters: hits in memory and in the file,
+        misses, stores, commits and evicted entries, the hit rate, and the
+        number of entries in memory and in the file (the tracked count, which
+        can lag behind entries written by other processes).
+        """
+        stats = dict(self._stats)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['memory_entries'] = len(self._memory)
+        stats['disk_entries'] = self._disk_entries
+
+        return stats
+
+    def close(self):
+        """
+        Commits any buffered writes and closes the database.
+        """
+        self.flush()
+        self._connection.close()
+
+    def __enter__(self):
+        """
+        Allows the cache to be used in a with statement.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the cache when the with block ends.
+        """
+        self.close()
@@ -0,0 +1,234 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Dataset
+# Description:
+#   Training-data exporter for learned Kuba evaluators. Random playouts run in
+#   lockstep in KubaBatch.BatchSimulator (same rules as KubaGame), and every
+#   position before each move is written as fixed-shape arrays:
+#       - planes: (M, 4, 7, 7) uint8, one plane each for the White, Black, Red
+#         and empty cells
+#       - features: (M, 9) uint8, the FEATURES columns (color to move, Ko
+#         restriction, captured red marbles and marble counts)
+#       - outcome: (M,) int8, +1 if the player to move went on to win, -1 if
+#         they lost and 0 if the game was stopped unfinished
+#   Arrays are written a batch of games at a time into memory-mapped .npy
+#   files, so memory use depends on the batch size and not on the dataset size.
+#   A dataset is split into shards generated in parallel, each with its own seed
+#   derived from the dataset seed, so the output does not depend on the number
+#   of workers:
+#
+#       python KubaDataset.py data/kuba --positions 1000000 --shards 8 --workers 8
+#
+#   Requires NumPy.
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from KubaBatch import BatchSimulator
+
+
+FEATURES = ('turn', 'ko_row', 'ko_col', 'ko_direction', 'captured_white', 'captured_black',
+            'white', 'black', 'red')
+
+# plane order: the BatchSimulator cell value shown on each plane
+PLANE_VALUES = np.array([BatchSimulator.WHITE, BatchSimulator.BLACK, BatchSimulator.RED,
+                         BatchSimulator.EMPTY], dtype=np.uint8).reshape(1, 4, 1, 1)
+
+
+def encode_batch(batch, colors, games=None):
+    """
+    Takes a BatchSimulator, an (N,) array with the color to move in each game
+    and optionally the indices of the games to encode. Returns (planes,
+    features) for those games: planes is (n, 4, 7, 7) uint8 and features is
+    (n, 9) uint8 with the FEATURES columns. The color to move is 1 for White
+    and 2 for Black; the Ko row and column are stored plus one (0 to 8, since
+    they can be just off the board) and the Ko direction plus one (0 for no
+    Ko restriction).
+    """
+    if games is None:
+        games = np.arange(len(batch))
+
+    boards = batch.boards[games]
+    planes = (boards[:, np.newaxis, :, :] == PLANE_VALUES).astype(np.uint8)
+
+    features = np.empty((len(games), len(FEATURES)), dtype=np.uint8)
+    ko = batch.ko[games]
+    has_ko = ko[:, 2] >= 0
+
+    features[:, 0] = colors[games]
+    features[:, 1] = np.where(has_ko, ko[:, 0] + 1, 0)
+    features[:, 2] = np.where(has_ko, ko[:, 1] + 1, 0)
+    features[:, 3] = ko[:, 2] + 1
+    features[:, 4:6] = batch.captures[games]
+    features[:, 6:9] = batch.counts[games]
+
+    return planes, features
+
+
+def encode_game(game):
+    """
+    Takes a KubaGame and returns (planes, features) for its position with
+    shapes (4, 7, 7) and (9,), encoded like the exported positions. Before the
+    first move White is taken to be the player to move.
+    """
+    batch = BatchSimulator.from_games([game])
+    colors = np.where(batch.turn == 0, BatchSimulator.WHITE, batch.turn).astype(np.uint8)
+    planes, features = encode_batch(batch, colors)
+
+    return planes[0], features[0]
+
+
+def play_batch(games, max_moves, rng):
+    """
+    Plays a batch of random games from the starting position (White moves
+    first) until every game is won or max_moves moves have been made. Returns
+    (planes, features, outcome) for every position before a move, grouped by
+    game in move order.
+    """
+    batch = BatchSimulator(games)
+    plane_chunks = []
+    feature_chunks = []
+    game_chunks = []
+
+    for _ in range(max_moves):
+        active = np.nonzero(batch.winner == 0)[0]
+
+        if len(active) == 0:
+            break
+
+        rows, cols, directions, colors = batch.random_moves(rng)
+        planes, features = encode_batch(batch, colors, active)
+        plane_chunks.append(planes)
+        feature_chunks.append(features)
+        game_chunks.append(active)
+        batch.step(rows, cols, directions, colors)
+
+    planes = np.concatenate(plane_chunks)
+    features = np.concatenate(feature_chunks)
+    game_ids = np.concatenate(game_chunks)
+
+    order = np.argsort(game_ids, kind='stable')
+    planes, features, game_ids = planes[order], features[order], game_ids[order]
+
+    winners = batch.winner[game_ids]
+    outcome = np.where(winners == 0, 0, np.where(winners == features[:, 0], 1, -1)).astype(np.int8)
+
+    return planes, features, outcome
+
+
+def shard_paths(prefix, shard):
+    """
+    Returns the paths of the planes, features and outcome files of a shard.
+    """
+    base = '%s-%05d' % (prefix, shard)
+
+    return base + '-planes.npy', base + '-features.npy', base + '-outcome.npy'
+
+
+def write_shard(prefix, shard, positions, seed, batch_games=256, max_moves=300):
+    """
+    Worker entry point: generates one shard of exactly the given number of
+    positions with a generator seeded from the seed sequence and writes it to
+    memory-mapped .npy files. Games are played batch_games at a time and each
+    batch is written as soon as it finishes. Returns a dictionary with the
+    shard number, positions written and games started.
+    """
+    rng = np.random.default_rng(seed)
+    planes_path, features_path, outcome_path = shard_paths(prefix, shard)
+
+    planes_out = open_memmap(planes_path, mode='w+', dtype=np.uint8, shape=(positions, 4, 7, 7))
+    features_out = open_memmap(features_path, mode='w+', dtype=np.uint8,
+                               shape=(positions, len(FEATURES)))
+    outcome_out = open_memmap(outcome_path, mode='w+', dtype=np.int8, shape=(positions,))
+
+    written = 0
+    games = 0
+
+    while written < positions:
+        planes, features, outcome = play_batch(batch_games, max_moves, rng)
+        count = min(len(outcome), positions - written)
+
+        planes_out[written:written + count] = planes[:count]
+        features_out[written:written + count] = features[:count]
+        outcome_out[written:written + count] = outcome[:count]
+
+        written += count
+        games += batch_games
+
+    for array in (planes_out, features_out, outcome_out):
+        array.flush()
+
+    del planes_out, features_out, outcome_out
+
+    return {'shard': shard, 'positions': written, 'games': games}
+
+
+def export(prefix, positions, shards=1, workers=1, seed=0, batch_games=256, max_moves=300):
+    """
+    Generates a dataset of the given number of positions split into shards
+    (files prefix-00000-planes.npy and so on), using a pool of worker processes
+    when workers is more than 1. Shard k is seeded from the k-th child of
+    numpy's SeedSequence(seed), so the same arguments give the same files for
+    any number of workers. Returns the list of per-shard results from
+    write_shard.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    sizes = [positions // shards + (1 if shard < positions % shards else 0) for shard in range(shards)]
+    jobs = [(prefix, shard, sizes[shard], seeds[shard], batch_games, max_moves) for shard in range(shards)]
+
+    if workers == 1:
+        return [write_shard(*job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_shard, *job) for job in jobs]
+
+        return [future.result() for future in futures]
+
+
+def load_shard(prefix, shard):
+    """
+    Returns (planes, features, outcome) of a shard as read-only memory-mapped
+    arrays.
+    """
+    return tuple(np.load(path, mmap_mode='r') for path in shard_paths(prefix, shard))
+
+
+def main(argv=None):
+    """
+    Command-line entry point: exports a dataset and prints the positions and
+    games of each shard and the overall positions per second.
+    """
+    parser = argparse.ArgumentParser(description="Export Kuba training positions to .npy files.")
+    parser.add_argument('prefix', help="path prefix of the shard files")
+    parser.add_argument('--positions', type=int, default=100000)
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-games', type=int, default=256,
+                        help="games played at once per shard (default 256)")
+    parser.add_argument('--max-moves', type=int, default=300,
+                        help="moves after which a game is stopped unfinished (default 300)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = export(args.prefix, args.positions, args.shards, args.workers, args.seed,
+                     args.batch_games, args.max_moves)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        print("shard %d: %d positions from %d games" % (result['shard'], result['positions'],
+                                                         result['games']))
+
+    print("%d positions in %.1f s (%.0f positions/s)" % (
+        args.positions, elapsed, args.positions / elapsed if elapsed > 0 else 0))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
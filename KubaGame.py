@@ -13,12 +13,25 @@
 #   able to make any moves.
 #   Full Kuba rules: https://sites.google.com/site/boardandpieces/list-of-games/kuba
 
+import random
+import struct
+import sys
+import time
+
 
 class WrongParameterTypeError (Exception):
     """Defines exception: WrongParameterTypeError"""
     pass
 
 
+class GameStateMismatchError (Exception):
+    """
+    Defines exception: GameStateMismatchError. Raised in debug mode when the
+    incrementally maintained game state disagrees with a full recount of the board.
+    """
+    pass
+
+
 class KubaGame:
     """
     Implements the core functionality of the Kuba game. Responsibilities including:
@@ -38,35 +51,227 @@ class KubaGame:
 
     """
 
-    def __init__(self, playerTuple1=None, playerTuple2=None):
+    # games keep no per-instance __dict__, so a large number of them stay small
+    __slots__ = ('_board', '_playerA', '_playerB', '_player_list', '_current_turn',
+                 '_off_turn', '_winner', '_ko_move', '_marble_count', '_undo_stack',
+                 '_debug', '_instrumentation', '_move_listeners', '_hash', '_superko',
+                 '_positions', '_draw')
+
+    # row and column change for one step in each direction
+    DIRECTION_STEPS = {'L': (0, -1), 'R': (0, 1), 'B': (1, 0), 'F': (-1, 0)}
+
+    # for each (coordinate, direction): the cells from the coordinate to the edge
+    # of the board in that direction, and the access cell behind the coordinate
+    # that must be empty to push from (None when it is off the board)
+    RAYS = {}
+    ACCESS_CELLS = {}
+
+    for _row in range(7):
+        for _col in range(7):
+            for _direction, (_row_step, _col_step) in DIRECTION_STEPS.items():
+                _ray = []
+                _cell = (_row, _col)
+
+                while 0 <= _cell[0] <= 6 and 0 <= _cell[1] <= 6:
+                    _ray.append(_cell)
+                    _cell = (_cell[0] + _row_step, _cell[1] + _col_step)
+
+                _behind = (_row - _row_step, _col - _col_step)
+
+                if not (0 <= _behind[0] <= 6 and 0 <= _behind[1] <= 6):
+                    _behind = None
+
+                RAYS[((_row, _col), _direction)] = tuple(_ray)
+                ACCESS_CELLS[((_row, _col), _direction)] = _behind
+
+    del _row, _col, _direction, _row_step, _col_step, _ray, _cell, _behind
+
+    # bit tables for games on a BitBoard, which validate and push with the
+    # board's masks instead of reading cells one at a time (cell (row, col) is
+    # bit row * 7 + col): the bit of each cell, and for each (coordinate,
+    # direction) the (cell, bit) pairs along the ray, the mask of the whole
+    # ray, and the bits of the access cell (0 when it is off the board) and of
+    # the edge cell
+    CELL_BITS = {}
+    RAY_BITS = {}
+    RAY_MASKS = {}
+    ACCESS_BITS = {}
+    EDGE_BITS = {}
+
+    for _key, _ray in RAYS.items():
+        _behind = ACCESS_CELLS[_key]
+        RAY_BITS[_key] = tuple((_cell, 1 << (_cell[0] * 7 + _cell[1])) for _cell in _ray)
+        RAY_MASKS[_key] = sum(1 << (_cell[0] * 7 + _cell[1]) for _cell in _ray)
+        ACCESS_BITS[_key] = 0 if _behind == None else 1 << (_behind[0] * 7 + _behind[1])
+        EDGE_BITS[_key] = 1 << (_ray[-1][0] * 7 + _ray[-1][1])
+        CELL_BITS[_ray[0]] = 1 << (_ray[0][0] * 7 + _ray[0][1])
+
+    del _key, _ray, _behind
+
+    # tables for validate_moves, which works on cell indexes (row * 7 + col):
+    # the index of each cell, every (coordinate, direction) candidate, and for
+    # each cell index * 4 + direction index ("FBLR") the index of the access
+    # cell (-1 when it is off the board) and of the edge cell the push heads to
+    DIRECTION_INDEX = {'F': 0, 'B': 1, 'L': 2, 'R': 3}
+    CELL_INDEX = {}
+    ALL_MOVES = []
+    MOVE_LINES = []
+
+    for _row in range(7):
+        for _col in range(7):
+            CELL_INDEX[(_row, _col)] = _row * 7 + _col
+
+            for _direction in 'FBLR':
+                _ray = RAYS[((_row, _col), _direction)]
+                _behind = ACCESS_CELLS[((_row, _col), _direction)]
+                ALL_MOVES.append(((_row, _col), _direction))
+                MOVE_LINES.append((-1 if _behind == None else _behind[0] * 7 + _behind[1],
+                                   _ray[-1][0] * 7 + _ray[-1][1]))
+
+    # EMPTY_SCANS[direction index]: (cell index, index of the next cell toward
+    # the edge or -1), listed so that each cell comes after its next cell
+    EMPTY_SCANS = ([], [], [], [])
+
+    for _row in range(7):
+        for _col in range(7):
+            EMPTY_SCANS[0].append((_row * 7 + _col, _row * 7 + _col - 7 if _row > 0 else -1))
+            EMPTY_SCANS[1].append(((6 - _row) * 7 + _col, (7 - _row) * 7 + _col if _row > 0 else -1))
+            EMPTY_SCANS[2].append((_col * 7 + _row, _col * 7 + _row - 1 if _row > 0 else -1))
+            EMPTY_SCANS[3].append((_col * 7 + 6 - _row, _col * 7 + 7 - _row if _row > 0 else -1))
+
+    del _row, _col, _direction, _ray, _behind
+
+    # Zobrist keys: random 64-bit numbers that are XORed together to form the
+    # position hash. There is one key per cell and marble value, per color to
+    # move, per Ko restriction (its cell can be just off the board) and per
+    # count of red marbles captured by each color. A fixed seed keeps hashes
+    # identical across runs and processes.
+    ZOBRIST_CELLS = {}
+    ZOBRIST_TURN = {}
+    ZOBRIST_KO = {}
+    ZOBRIST_RED = {}
+
+    _random = random.Random(20210601)
+
+    for _row in range(-1, 8):
+        for _col in range(-1, 8):
+            for _direction in ('F', 'B', 'L', 'R'):
+                ZOBRIST_KO[((_row, _col), _direction)] = _random.getrandbits(64)
+
+            if 0 <= _row <= 6 and 0 <= _col <= 6:
+                for _value in ('W', 'B', 'R'):
+                    ZOBRIST_CELLS[((_row, _col), _value)] = _random.getrandbits(64)
+
+    for _value in ('W', 'B'):
+        ZOBRIST_TURN[_value] = _random.getrandbits(64)
+
+        # no captured red marbles adds nothing to the hash
+        ZOBRIST_RED[(_value, 0)] = 0
+
+        for _count in range(1, 14):
+            ZOBRIST_RED[(_value, _count)] = _random.getrandbits(64)
+
+    del _random, _row, _col, _direction, _value, _count
+
+    # reasons returned by rejection_reason for a move that is not allowed
+    REJECT_OFF_BOARD = 'off_board'
+    REJECT_GAME_OVER = 'game_over'
+    REJECT_NOT_YOUR_TURN = 'not_your_turn'
+    REJECT_EMPTY_CELL = 'empty_cell'
+    REJECT_RED_MARBLE = 'red_marble'
+    REJECT_WRONG_COLOR = 'wrong_color'
+    REJECT_BAD_DIRECTION = 'bad_direction'
+    REJECT_KO = 'ko'
+    REJECT_BLOCKED = 'blocked'
+    REJECT_PUSH_OWN_OFF = 'push_own_off'
+    REJECT_REPETITION = 'repetition'
+
+    # optional positional repetition (superko) rules: moves that recreate an
+    # earlier position are rejected, or end the game as a draw
+    SUPERKO_REJECT = 'reject'
+    SUPERKO_DRAW = 'draw'
+
+    # Binary record layout used by to_bytes / from_bytes (big-endian):
+    #   version (1 byte), cells (13 bytes: 2 bits per cell, 4 cells per byte,
+    #   X=0 W=1 B=2 R=3), flags (1 byte: bits 0-1 turn and bits 2-3 winner as
+    #   0 none / 1 first player / 2 second player, bits 4 and 5 set when the
+    #   first or second player plays Black), Ko move (2 bytes: 0xFFFF for none,
+    #   otherwise ((row + 1) * 9 + col + 1) * 4 + index of the direction in FBLR), captured red
+    #   marbles (1 byte: first player in the high 4 bits), then each player name
+    #   as a 1-byte length followed by UTF-8 text.
+    RECORD_VERSION = 1
+    RECORD_HEADER = struct.Struct('>B13sBHB')
+    RECORD_VALUES = 'XWBR'
+    RECORD_DIRECTIONS = 'FBLR'
+    # the four cells packed into each possible byte value
+    # header of delta_to_bytes: move, flags, red marbles, Ko move, W, B and R
+    # counts, number of changed cells
+    DELTA_HEADER = struct.Struct('>BBBHBBBB')
+    RECORD_BYTE_CELLS = []
+
+    for _byte in range(256):
+        RECORD_BYTE_CELLS.append(RECORD_VALUES[_byte >> 6] + RECORD_VALUES[(_byte >> 4) & 3] +
+                                 RECORD_VALUES[(_byte >> 2) & 3] + RECORD_VALUES[_byte & 3])
+
+    del _byte
+
+    def __init__(self, playerTuple1=None, playerTuple2=None, board_class=None, debug=False,
+                 superko=None):
         """
         Takes as parameters two tuples, each containing player name
         and color of the marble that the player is playing (ex: ('PlayerA', 'B'),
         ('PlayerB','W')) and it intializes the board. Players can choose to be
         either 'B' or 'W'. On the board R, B, W are used to represent Red, Black
         and White marbles. X represents an empty spot (cell) on the board.
+        The optional board_class selects the board storage backend: Board
+        (the default, a dictionary of cells), BitBoard (per-color bit masks) or
+        CompactBoard (a 49-byte bytearray, the smallest in memory). All
+        backends produce identical game play. With debug set to True,
+        the marble counts and captures that are updated move by move are
+        checked against a full recount of the board after every move.
+        superko turns on a positional repetition rule on top of the Ko rule:
+        with SUPERKO_REJECT ("reject") a move that recreates a position seen
+        earlier in the game (same cells, player to move and captured red
+        marbles) is not allowed, and with SUPERKO_DRAW ("draw") such a move
+        ends the game as a draw (see is_draw).
         """
 
+        if superko not in (None, self.SUPERKO_REJECT, self.SUPERKO_DRAW):
+            raise ValueError("superko must be None, 'reject' or 'draw'")
+
         if playerTuple1 is None:
             playerTuple1 = ('PlayerA', 'B')
 
         if playerTuple2 is None:
             playerTuple2 = ('PlayerB', 'W')
 
-        self._board = Board()
+        if board_class is None:
+            board_class = Board
+
+        self._board = board_class()
 
         # initialize players
         self._playerA = Player(playerTuple1[0], playerTuple1[1])
         self._playerB = Player(playerTuple2[0], playerTuple2[1])
 
         # initalize player list
-        self._player_list = [self._playerA, self._playerB]
+        self._player_list = (self._playerA, self._playerB)
         self._current_turn = None
         self._off_turn = None
         self._winner = None
         # _ko_move format is tuple: (coordinate, direction)
         self._ko_move = (None, None)
         self._marble_count = (8, 8, 13)
+        # undo entries for the moves made so far (most recent last)
+        self._undo_stack = []
+        self._debug = debug
+        self._instrumentation = None
+        self._move_listeners = ()
+        self._hash = self.compute_position_hash()
+        self._superko = superko
+        self._draw = False
+        # repetition key -> times the position has occurred, when superko is on
+        self._positions = None if superko == None else {self.repetition_key(): 1}
 
     def get_current_turn(self):
         """
@@ -87,6 +292,8 @@ class KubaGame:
         turn-taking.
 
         """
+        previous = self._current_turn
+
         for player in self._player_list:
 
             if player_name == player.get_player_name():
@@ -97,6 +304,14 @@ class KubaGame:
 
                 self._off_turn = player
 
+        # keep the side to move in the position hash up to date
+        if self._current_turn is not previous:
+
+            if previous != None:
+                self._hash ^= self.ZOBRIST_TURN[previous.get_player_color()]
+
+            self._hash ^= self.ZOBRIST_TURN[self._current_turn.get_player_color()]
+
     def print_board(self):
         """
         Prints a rough visual of the board updated with its current state.
@@ -108,221 +323,553 @@ class KubaGame:
         Takes a player name (string), coordinate (tuple), and direction (string),
         which indicate an intended move. Validates the move according to
         game rules. Returns False if the move is invalid and True if the move
-        is allowed to proceed. Used within the make_move method.
+        is allowed to proceed. See rejection_reason for why a move is invalid.
         """
+        return self.rejection_reason(player_name, coordinate, direction) == None
 
-        cur_row = coordinate[0]
-        cur_col = coordinate[1]
+    def rejection_reason(self, player_name, coordinate, direction):
+        """
+        Takes a player name (string), coordinate (tuple), and direction (string)
+        and checks the move against the game rules. Returns None if the move is
+        allowed, otherwise one of the REJECT_ reason strings. Like validate_move,
+        it assigns the first turn to the player if no turn has been taken yet and
+        the coordinate is on the board. Used within the make_move method.
+        """
 
-        # check that key (coordinate tuple) is on the board (in dictionary)
-        # will cause KeyError if not
-        try:
-            self._board.get_marble(coordinate)
+        board = self._board
+        bitboard = board.__class__ is BitBoard
 
-        # Raises a KeyError (the current cell (key) can't be located in the dict - cell is not on the board)
-        except KeyError:
+        if bitboard:
+            # BitBoard fast path: read the three masks once and test bits
+            bit = self.CELL_BITS.get(coordinate)
 
-            # print("Invalid move: Space that is not on the board.")  # For testing
-            return False
+            if bit == None:
+                return self.REJECT_OFF_BOARD
 
-        current_val = self._board.get_marble(coordinate)
+            white, black, red = board.get_masks()
 
-        # check if the game is still in play (winner not yet declared)
+            if white & bit:
+                current_val = 'W'
 
-        if self._winner != None:
-            # For testing
-            # print("Invalid move: A winner has already been declared.")
-            return False
+            elif black & bit:
+                current_val = 'B'
+
+            elif red & bit:
+                current_val = 'R'
+
+            else:
+                current_val = 'X'
+
+        else:
+
+            # check that key (coordinate tuple) is on the board (in dictionary)
+            # will cause KeyError if not
+            try:
+                current_val = board.get_marble(coordinate)
+
+            # Raises a KeyError (the current cell (key) can't be located in the dict - cell is not on the board)
+            except KeyError:
+                return self.REJECT_OFF_BOARD
 
-        if self.get_current_turn() == None:
+        # check if the game is still in play (winner not yet declared)
+        if self._winner != None or self._draw:
+            return self.REJECT_GAME_OVER
+
+        if self._current_turn == None:
             # if current turn is not assigned yet, assign it to first player
             # who makes a move
             self.set_current_turn(player_name)
 
+        # Check that it is player's turn
         if self.get_current_turn() != player_name:
-            # Check that it is player's turn or not yet assigned (None)
-            # print("Invalid move: It is not your turn.")  # For testing
-            return False
+            return self.REJECT_NOT_YOUR_TURN
 
         # Check that there is a marble at the current location and it is not red
-        if current_val in ('X', 'R'):
-            # For testing
-            # print("Invalid move: You are attempting to move an incorrect value.")
-            return False
+        if current_val == 'X':
+            return self.REJECT_EMPTY_CELL
+
+        if current_val == 'R':
+            return self.REJECT_RED_MARBLE
 
         # Reject attempt to move a marble different than assigned color ("B", "W")
         if current_val != self._current_turn.get_player_color():
-            # For testing
-            #print("Invalid move: You are attempting to move an incorrect value.")
-            return False
+            return self.REJECT_WRONG_COLOR
 
         # Reject incorrect direction entry - invalid move
         if direction not in ("B", "F", "L", "R"):
-            # For testing
-            #print("Invalid move: This is not a recognized direction.")
-            return False
+            return self.REJECT_BAD_DIRECTION
 
         # Reject attempt to reverse the prior move position (Ko rule)
         if self._ko_move[0] == coordinate and self._ko_move[1] == direction:
+            return self.REJECT_KO
 
-            #print("Invalid move: Blocked because of Ko rule")
-            return False
+        key = (coordinate, direction)
 
-        # Below - Check that the cell is moveable (must have 'X' space in the opposite
-        # direction) from the move direction
+        if bitboard:
+            occupied = white | black | red
 
-        # validate Backward (down) direction move (there must be an empty spot 'above' the cell)
-        if direction == 'B':
-            if self.get_marble((cur_row-1, cur_col)) != 'X':
-                # For testing
-                #print("Invalid move: Cannot start a move between two marbles.")
-                return False
-
-        # validate Forward (up) direction move (must be an empty spot 'below' the cell)
-        elif direction == "F":
-            if self.get_marble((cur_row+1, cur_col)) != 'X':
-                # For testing
-                #print("Invalid move: Cannot start a move between two marbles.")
-                return False
-
-        # validate Right direction move (must be an empty spot 'left' of the cell)
-        elif direction == "R":
-            if self.get_marble((cur_row, cur_col-1)) != 'X':
-                # For testing
-                #print("Invalid move: Cannot start a move between two marbles.")
-                return False
+            # the access cell must be empty or off the board, and a push that
+            # reaches the edge (no empty cell on the ray) must not end in an own marble
+            if self.ACCESS_BITS[key] & occupied:
+                return self.REJECT_BLOCKED
 
-        # validate Left direction move (must be an empty spot 'right' of the cell)
-        elif direction == "L":
-            if self.get_marble((cur_row, cur_col+1)) != 'X':
-                # For testing
-                #print("Invalid move: Cannot start a move between two marbles.")
-                return False
+            if self.EDGE_BITS[key] & (white if current_val == 'W' else black) and \
+                    not self.RAY_MASKS[key] & ~occupied:
+                return self.REJECT_PUSH_OWN_OFF
 
-        # check that the player will not push their own marble type off the board
-        check_list = []
+        else:
+            ray = self.RAYS[key]
+            behind = self.ACCESS_CELLS[key]
 
-        if direction == 'B':
+            # Check that the cell is moveable: the cell in the opposite direction from
+            # the move must be empty ('X') or off the board
+            if behind != None and board.get_marble(behind) != 'X':
+                return self.REJECT_BLOCKED
+
+            # check that the player will not push their own marble type off the board:
+            # the push reaches the edge when there is no empty cell along the ray
+            if board.get_marble(ray[-1]) == current_val:
+                reaches_edge = True
+
+                for cell in ray:
+                    if board.get_marble(cell) == 'X':
+                        reaches_edge = False
+                        break
 
-            for num in range(cur_row, 7):
-                check_list.append(self.get_marble((num, cur_col)))
+                if reaches_edge:
+                    return self.REJECT_PUSH_OWN_OFF
 
-            if 'X' not in check_list:
+        # Reject a move that recreates an earlier position (superko rule)
+        if self._superko == self.SUPERKO_REJECT and \
+                self.repetition_key_after(self._current_turn, coordinate, direction) in self._positions:
+            return self.REJECT_REPETITION
 
-                if self.get_marble((6, cur_col)) == self._current_turn.get_player_color():
+        return None
 
-                    #print("Invalid move: Cannot push your own marble off board.")
+    def validate_moves(self, player_name, candidates=None):
+        """
+        Takes a player name (string) and a list of (coordinate, direction)
+        candidates, or None for all 196 moves in ALL_MOVES (row-major order,
+        directions F, B, L, R), and checks them all in one pass. Returns a
+        tuple (mask, reasons) of two lists in the order of the candidates: mask
+        holds True for each move validate_move would allow, and reasons holds
+        None or the REJECT_ string rejection_reason would return. The board is
+        read once and the scans for an empty cell along each line are shared
+        by all candidates. Unlike validate_move it has no side effects: before
+        the first move it answers as if this player took the first turn,
+        without assigning it.
+        """
+        if candidates is None:
+            candidates = self.ALL_MOVES
 
-                    return False
+        player = None
 
-        if direction == 'F':
+        for candidate_player in self._player_list:
 
-            for num in range(0, cur_row + 1):
-                check_list.append(self.get_marble((num, cur_col)))
+            if candidate_player.get_player_name() == player_name:
+                player = candidate_player
 
-            if 'X' not in check_list:
+        # reasons that apply to every candidate on the board
+        if self._winner != None or self._draw:
+            common = self.REJECT_GAME_OVER
 
-                if self.get_marble((0, cur_col)) == self._current_turn.get_player_color():
+        elif player == None or (self._current_turn != None and self._current_turn is not player):
+            common = self.REJECT_NOT_YOUR_TURN
 
-                    #print("Invalid move: Cannot push your own marble off board.")
+        else:
+            common = None
 
-                    return False
+        cell_index = self.CELL_INDEX
+        reasons = []
 
-        if direction == 'R':
+        if common != None:
 
-            for num in range(cur_col, 7):
-                check_list.append(self.get_marble((cur_row, num)))
+            for coordinate, direction in candidates:
+                reasons.append(self.REJECT_OFF_BOARD if coordinate not in cell_index else common)
 
-            if 'X' not in check_list:
+            return [False] * len(reasons), reasons
 
-                if self.get_marble((cur_row, 6)) == self._current_turn.get_player_color():
+        color = player.get_player_color()
+        get_marble = self._board.get_marble
+        values = [get_marble(cell) for cell in cell_index]
 
-                    #print("Invalid move: Cannot push your own marble off board.")
+        # reaches_empty[direction index][cell index]: the line from the cell to
+        # the edge has an empty cell, so pushing from the cell stays on the board
+        reaches_empty = []
 
-                    return False
+        for scan in self.EMPTY_SCANS:
+            found = [False] * 49
 
-        if direction == 'L':
+            for index, next_index in scan:
+                found[index] = values[index] == 'X' or (next_index >= 0 and found[next_index])
 
-            for num in range(0, cur_col+1):
-                check_list.append(self.get_marble((cur_row, num)))
+            reaches_empty.append(found)
 
-            if 'X' not in check_list:
+        direction_index = self.DIRECTION_INDEX
+        move_lines = self.MOVE_LINES
+        ko_move = self._ko_move
+        check_repetition = self._superko == self.SUPERKO_REJECT
 
-                if self.get_marble((cur_row, 0)) == self._current_turn.get_player_color():
+        for coordinate, direction in candidates:
+            index = cell_index.get(coordinate)
 
-                    #print("Invalid move: Cannot push your own marble off board.")
+            if index == None:
+                reasons.append(self.REJECT_OFF_BOARD)
+                continue
 
-                    return False
+            value = values[index]
 
-        return True
+            if value == 'X':
+                reasons.append(self.REJECT_EMPTY_CELL)
+
+            elif value == 'R':
+                reasons.append(self.REJECT_RED_MARBLE)
+
+            elif value != color:
+                reasons.append(self.REJECT_WRONG_COLOR)
 
-    def make_move(self, player_name, coordinate, direction):
+            elif direction not in direction_index:
+                reasons.append(self.REJECT_BAD_DIRECTION)
+
+            elif ko_move[0] == coordinate and ko_move[1] == direction:
+                reasons.append(self.REJECT_KO)
+
+            else:
+                code = direction_index[direction]
+                behind, edge = move_lines[index * 4 + code]
+
+                if behind >= 0 and values[behind] != 'X':
+                    reasons.append(self.REJECT_BLOCKED)
+
+                elif values[edge] == color and not reaches_empty[code][index]:
+                    reasons.append(self.REJECT_PUSH_OWN_OFF)
+
+                elif check_repetition and \
+                        self.repetition_key_after(player, coordinate, direction) in self._positions:
+                    reasons.append(self.REJECT_REPETITION)
+
+                else:
+                    reasons.append(None)
+
+        return [reason == None for reason in reasons], reasons
+
+    def make_move(self, player_name, coordinate, direction, return_delta=False):
         """
         Implements a Kuba move. Takes three parameters: playername, coordinates i.e. a
         tuple containing the location of marble that is being moved, and the direction
         in which the player wants to push the marble. Valid directions are L(Left), R(Right),
         F(Forward) and B(Backward). Returns True if move is successful, False otherwise.
-        Note that this method uses a recursive strategy to implement a move and includes
-        an inner function (rec_move) to do so.
+        The push follows the precomputed ray from the marble to the edge of the board:
+        every marble up to the first empty cell moves one space, and if there is no
+        empty cell the last marble is pushed off the board. Each successful move
+        records an undo entry so that it can be reversed with unmake_move.
+        With return_delta set to True a successful move returns its delta (see
+        move_delta) instead of True. Registered move listeners are called with
+        the delta after every successful move.
         """
 
-        if self.validate_move(player_name, coordinate, direction) != True:
+        # validating the move assigns the first turn, so save the turn (and the position
+        # hash, which includes it) before it runs
+        prev_turn = (self._current_turn, self._off_turn)
+        prev_hash = self._hash
+
+        if self.rejection_reason(player_name, coordinate, direction) != None:
             return False
 
-        def rec_move(current_cell, direction):
-            """
-            Takes a cell address (coordinates tuple) and direction (string) and 'moves' the
-            marble value in the cell in the direction specified. If the next cell
-            is not marked 'X', then it will 'push' the next marble value forward
-            as well (until 'X' or border is reached). This uses a recursive
-            strategy to simulate movement of a row n marbles where n >= 1. Note
-            that this approach will 'move' any values in the cell. Validation of which
-            values are allowed to move is handled separately.
-            """
-            cur_row = current_cell[0]
-            cur_col = current_cell[1]
+        # collect the cells the push will change: the marbles in the pushed line
+        # and the empty cell that absorbs them (if the line does not reach the edge)
+        board = self._board
+        line = []
 
-            # define direction adjustments (initialize next cell)
-            if direction == 'L':
-                next = (cur_row, cur_col-1)
+        if board.__class__ is BitBoard:
+            # BitBoard fast path: values come from bit tests on the masks, and the
+            # line is pushed as one mask
+            white, black, red = board.get_masks()
+            line_mask = 0
 
-            elif direction == 'R':
-                next = (cur_row, cur_col + 1)
+            for cell, bit in self.RAY_BITS[(coordinate, direction)]:
+                line_mask |= bit
 
-            elif direction == 'B':
-                next = (cur_row + 1, cur_col)
+                if white & bit:
+                    line.append((cell, 'W'))
 
-            elif direction == 'F':
-                next = (cur_row - 1, cur_col)
+                elif black & bit:
+                    line.append((cell, 'B'))
 
-            # base case - successful move opportunity identified
-            if self.get_marble(next) == 'X':
+                elif red & bit:
+                    line.append((cell, 'R'))
 
-                if next[0] < 0 or next[0] > 6 or next[1] < 0 or next[1] > 6:
+                else:
+                    line.append((cell, 'X'))
+                    break
 
-                    if self.get_marble(current_cell) == 'R':
-                        self._current_turn.increment_red_marbles()
+        else:
+            line_mask = None
 
-                    self._board.set_marble(current_cell, 'X')
+            for cell in self.RAYS[(coordinate, direction)]:
+                value = board.get_marble(cell)
+                line.append((cell, value))
 
-                    self._ko_move = self.ko_rule(next, direction)
-                    self.update_game_state()
-                    return True
+                if value == 'X':
+                    break
 
-                self._board.set_marble(next, self.get_marble(current_cell))
-                self._ko_move = self.ko_rule(next, direction)
-                self._board.set_marble(current_cell, 'X')
-                self.update_game_state()
-                return True
+        mover = self._current_turn
+        last_cell, last_value = line[-1]
+
+        if last_value == 'X':
+            # the push ends in the empty cell; the reverse push starts from there
+            pushed_off = None
+            end = last_cell
+
+        else:
+            # the last marble leaves the board past the edge
+            pushed_off = last_value
+            end = (last_cell[0] + self.DIRECTION_STEPS[direction][0],
+                   last_cell[1] + self.DIRECTION_STEPS[direction][1])
 
+        self._undo_stack.append((tuple(line), mover, pushed_off == 'R', self._ko_move, prev_turn,
+                                 self._winner, self._marble_count, prev_hash))
+
+        if line_mask == None:
+            board.push_line([cell for cell, value in line], direction)
+        else:
+            board.push_mask(line_mask, direction)
+
+        # update the position hash for the cells along the line: every value
+        # moves one cell forward and the first cell becomes empty
+        zobrist_cells = self.ZOBRIST_CELLS
+        position_hash = self._hash
+        previous_value = 'X'
+
+        for cell, value in line:
+
+            if value != 'X':
+                position_hash ^= zobrist_cells[(cell, value)]
+
+            if previous_value != 'X':
+                position_hash ^= zobrist_cells[(cell, previous_value)]
+
+            previous_value = value
+
+        if pushed_off == 'R':
+            color = mover.get_player_color()
+            position_hash ^= self.ZOBRIST_RED[(color, mover.get_red_marbles())]
+            mover.increment_red_marbles()
+            position_hash ^= self.ZOBRIST_RED[(color, mover.get_red_marbles())]
+
+        position_hash ^= self.ZOBRIST_KO.get(self._ko_move, 0)
+        self._ko_move = self.ko_rule(end, direction)
+        position_hash ^= self.ZOBRIST_KO.get(self._ko_move, 0)
+
+        self._hash = position_hash
+        self.update_game_state(pushed_off)
+
+        if self._positions != None:
+            key = self.repetition_key()
+            count = self._positions.get(key, 0)
+
+            # a repeated position ends the game as a draw unless the move won it
+            if count and self._superko == self.SUPERKO_DRAW and self._winner == None:
+                self._draw = True
+
+            self._positions[key] = count + 1
+
+        if return_delta or self._move_listeners:
+            delta = self.move_delta()
+
+            for listener in self._move_listeners:
+                listener(delta)
+
+            if return_delta:
+                return delta
+
+        return True
+
+    def move_delta(self):
+        """
+        Returns a dictionary describing the most recent move, enough for a client
+        that knows the previous position to update its copy without re-reading
+        the board:
+            - player, coordinate, direction: the move
+            - changes: list of (cell, new value) for the cells whose value changed
+              along the pushed line
+            - pushed_off: the marble pushed off the board ("W", "B" or "R"), or None
+            - captured_red: True if that marble was a red one captured by the player
+            - red_marbles: the number of red marbles the player has captured
+            - ko: the Ko restriction for the next move, as (coordinate, direction)
+            - counts: the (W, B, R) marble counts
+            - turn: the player to move next
+            - winner: the winner, or None
+        Returns None if no move has been made.
+        """
+        if not self._undo_stack:
+            return None
+
+        entry = self._undo_stack[-1]
+        line = entry[0]
+        mover = entry[1]
+
+        # every value moves one cell along the line and the first cell empties
+        changes = []
+        previous_value = 'X'
+
+        for cell, value in line:
+
+            if value != previous_value:
+                changes.append((cell, previous_value))
+
+            previous_value = value
+
+        pushed_off = line[-1][1] if line[-1][1] != 'X' else None
+
+        # the Ko restriction set by the move is the reverse push
+        direction = self.ko_rule(None, self._ko_move[1])[1]
+
+        return {
+            'player': mover.get_player_name(),
+            'coordinate': line[0][0],
+            'direction': direction,
+            'changes': changes,
+            'pushed_off': pushed_off,
+            'captured_red': entry[2],
+            'red_marbles': mover.get_red_marbles(),
+            'ko': self._ko_move,
+            'counts': self._marble_count,
+            'turn': self.get_current_turn(),
+            'winner': self._winner,
+        }
+
+    def delta_to_bytes(self, delta):
+        """
+        Takes a move delta of this game (see move_delta) and returns it as a few
+        bytes for sending to clients: the move as cell index * 4 + direction
+        index, a flags byte (marble pushed off as 0 none / 1 W / 2 B / 3 R in
+        bits 0-1, bit 2 set when the second player moved, bit 3 when the second
+        player moves next, bit 4 when the mover won), the mover's captured red
+        marbles, the Ko move (2 bytes, as in to_bytes), the W, B and R counts,
+        the number of changed cells and one byte per changed cell (cell index
+        * 4 + value index in "XWBR"). Player names are replaced by their
+        position in the game, so decode with delta_from_bytes on a game with the
+        same players.
+        """
+        names = [player.get_player_name() for player in self._player_list]
+        (row, col), direction = delta['coordinate'], delta['direction']
+
+        flags = self.RECORD_VALUES.index(delta['pushed_off']) if delta['pushed_off'] != None else 0
+        flags |= names.index(delta['player']) << 2
+
+        if delta['turn'] == names[1]:
+            flags |= 8
+
+        if delta['winner'] != None:
+            flags |= 16
+
+        (ko_row, ko_col), ko_direction = delta['ko']
+        ko = ((ko_row + 1) * 9 + ko_col + 1) * 4 + self.RECORD_DIRECTIONS.index(ko_direction)
+
+        record = bytearray(self.DELTA_HEADER.pack(
+            (row * 7 + col) * 4 + self.RECORD_DIRECTIONS.index(direction), flags,
+            delta['red_marbles'], ko, delta['counts'][0], delta['counts'][1],
+            delta['counts'][2], len(delta['changes'])))
+
+        for (row, col), value in delta['changes']:
+            record.append((row * 7 + col) * 4 + self.RECORD_VALUES.index(value))
+
+        return bytes(record)
+
+    def delta_from_bytes(self, data):
+        """
+        Takes the bytes returned by delta_to_bytes (on this game or one with the
+        same players) and returns the move delta dictionary.
+        """
+        move, flags, red_marbles, ko, white, black, red, count = \
+            self.DELTA_HEADER.unpack_from(data)
+
+        names = [player.get_player_name() for player in self._player_list]
+        player = names[(flags >> 2) & 1]
+        changes = []
+
+        for code in data[self.DELTA_HEADER.size:self.DELTA_HEADER.size + count]:
+            changes.append((divmod(code >> 2, 7), self.RECORD_VALUES[code & 3]))
+
+        cell, direction = divmod(ko, 4)
+        ko_row, ko_col = divmod(cell, 9)
+
+        return {
+            'player': player,
+            'coordinate': divmod(move >> 2, 7),
+            'direction': self.RECORD_DIRECTIONS[move & 3],
+            'changes': changes,
+            'pushed_off': self.RECORD_VALUES[flags & 3] if flags & 3 else None,
+            'captured_red': flags & 3 == 3,
+            'red_marbles': red_marbles,
+            'ko': ((ko_row - 1, ko_col - 1), self.RECORD_DIRECTIONS[direction]),
+            'counts': (white, black, red),
+            'turn': names[(flags >> 3) & 1],
+            'winner': player if flags & 16 else None,
+        }
+
+    def add_move_listener(self, listener):
+        """
+        Takes a function and calls it with the delta of every successful move
+        (see move_delta) from now on.
+        """
+        self._move_listeners = self._move_listeners + (listener,)
+
+    def remove_move_listener(self, listener):
+        """
+        Stops calling a function added with add_move_listener.
+        """
+        listeners = list(self._move_listeners)
+        listeners.remove(listener)
+        self._move_listeners = tuple(listeners)
+
+    def unmake_move(self):
+        """
+        Reverses the most recent successful move, restoring the board, the
+        captured red marbles, the Ko restriction, the turn, the winner and
+        the marble counts to exactly what they were before the move. Returns
+        True if a move was undone and False if there is no move to undo.
+        """
+        if not self._undo_stack:
+            return False
+
+        if self._positions != None:
+            key = self.repetition_key()
+            count = self._positions[key] - 1
+
+            if count:
+                self._positions[key] = count
             else:
+                del self._positions[key]
 
-                rec_move(next, direction)
-                self._board.set_marble(next, self.get_marble(current_cell))
-                self._board.set_marble(current_cell, 'X')
-                return True
+            # a drawn game cannot continue, so the draw came from this move
+            self._draw = False
+
+        line, mover, captured_red, ko_move, prev_turn, winner, marble_count, position_hash = \
+            self._undo_stack.pop()
+
+        for cell, value in line:
+            self._board.set_marble(cell, value)
+
+        if captured_red:
+            mover.decrement_red_marbles()
+
+        self._ko_move = ko_move
+        self._current_turn, self._off_turn = prev_turn
+        self._winner = winner
+        self._marble_count = marble_count
+        self._hash = position_hash
+
+        return True
 
-        return rec_move(coordinate, direction)
+    def clear_history(self):
+        """
+        Discards the undo entries of the moves made so far, so they can no
+        longer be undone. Each entry holds a few hundred bytes, so this keeps
+        long-lived games (e.g. idle games waiting to be resumed) small.
+        """
+        self._undo_stack.clear()
 
     def ko_rule(self, current_cell, direction):
         """
@@ -359,115 +906,137 @@ class KubaGame:
         False. Used as part of post-move check to identify a
         winner while updating game state.
         """
-        marble_list = []
-        # a list of coordinates where a player has a marble
-
-        directions = ("F", "B", "R", "L")
-
-        player_color = self._off_turn.get_player_color()
-        next = None
+        if self._superko == self.SUPERKO_REJECT:
 
-        for key, value in self._board.get_board().items():
-            if value == player_color:
-                marble_list.append(key)
+            # every move has to be checked for recreating an earlier position
+            for move in self._board.get_moves(self._off_turn.get_player_color()):
 
-            for coord in marble_list:
-                # for each coordinate where the player has a marble
-
-                for direction in directions:
-                    # check one square in each direction for an empty cell
-                    # to push from
-
-                    if direction == 'L':
-                        next = (coord[0], coord[1]-1)
-
-                    elif direction == 'R':
-                        next = (coord[0], coord[1] + 1)
+                if move != self._ko_move and \
+                        self.repetition_key_after(self._off_turn, move[0], move[1]) not in self._positions:
+                    return True
 
-                    elif direction == 'B':
-                        next = (coord[0] + 1, coord[1])
+            return False
 
-                    elif direction == 'F':
-                        next = (coord[0] - 1, coord[1])
+        if self._board.__class__ is BitBoard:
+            # BitBoard fast path: test the move masks without listing moves
+            return self._board.has_moves(self._off_turn.get_player_color(), self._ko_move)
 
-                    if self.get_marble(next) == 'X':
-                        # if a move is available (an empty spot to 'push from')
-                        # check the last spot opposite direction in the column or row
-                        # if it is not the player's color,then a move is available
-                        # if it is the player's color, then check all the marbles between
-                        # the current marble and the end of row or column; if any 'X's, move
-                        # is still available
+        # two candidates are enough: at most one of them can be the Ko move
+        moves = self._board.get_moves(self._off_turn.get_player_color(), 2)
 
-                        if direction == 'L':
+        # the other player moves next, so the Ko restriction applies to them
+        return len(moves) > 1 or (len(moves) == 1 and moves[0] != self._ko_move)
 
-                            if self.get_marble((coord[0], 6)) != player_color:
+    def legal_moves(self, player_name):
+        """
+        Takes a player name (string) and returns a list of every legal move for
+        that player as (coordinate, direction) tuples, e.g. ((6, 5), 'F'). Uses
+        the same rules as validate_move (access square, Ko rule, not pushing
+        the player's own marble off the board) but has no side effects: it does
+        not assign the first turn. Returns an empty list if the game is over,
+        the player is unknown, or it is the other player's turn.
+        """
+        if self._winner != None or self._draw:
+            return []
 
-                                return True
+        for player in self._player_list:
 
-                            for col in range(coord[1], 7):
-                                if self.get_marble((coord[0], col)) == 'X':
+            if player_name == player.get_player_name():
 
-                                    return True
+                if self._current_turn != None and self._current_turn is not player:
+                    return []
 
-                        elif direction == 'R':
+                moves = self._board.get_moves(player.get_player_color())
 
-                            if self.get_marble((coord[0], 0)) != player_color:
+                if self._superko == self.SUPERKO_REJECT:
+                    return [move for move in moves if move != self._ko_move and
+                            self.repetition_key_after(player, move[0], move[1]) not in self._positions]
 
-                                return True
+                return [move for move in moves if move != self._ko_move]
 
-                            for col in range(0, coord[1]+1):
+        return []
 
-                                if self.get_marble((coord[0], col)) == 'X':
-                                    available_move = True
-                                    return True
+    def perft(self, depth):
+        """
+        Takes a depth (int) and returns the number of legal move sequences of
+        exactly that many moves from the current position. A sequence stops
+        when a move wins the game. Before the first move either player may
+        start, so the moves of both players are counted at the first ply. The
+        moves of the last ply are counted without being made (bulk counting).
+        The position is left exactly as it was.
+        """
+        if depth == 0:
+            return 1
 
-                        elif direction == 'F':
+        if self._winner != None or self._draw:
+            return 0
 
-                            if self.get_marble((6, coord[1])) != player_color:
+        players = self._player_list if self._current_turn == None else (self._current_turn,)
+        total = 0
 
-                                return True
+        for player in players:
+            player_name = player.get_player_name()
+            moves = self.legal_moves(player_name)
 
-                            for row in range(coord[0], 7):
-                                if self.get_marble((row, coord[1])) == 'X':
+            if depth == 1:
+                total += len(moves)
+                continue
 
-                                    return True
+            for coordinate, direction in moves:
+                self.make_move(player_name, coordinate, direction)
+                total += self.perft(depth - 1)
+                self.unmake_move()
 
-                        elif direction == 'B':
+        return total
 
-                            if self.get_marble((0, coord[1])) != player_color:
+    def perft_divide(self, depth):
+        """
+        Takes a depth (int) of at least 1 and returns a dictionary mapping each
+        legal first move, as a (player_name, coordinate, direction) tuple, to
+        the perft count of depth - 1 after it. The counts add up to
+        perft(depth).
+        """
+        players = self._player_list if self._current_turn == None else (self._current_turn,)
+        counts = {}
 
-                                return True
+        if self._winner != None or self._draw:
+            return counts
 
-                            for row in range(0, coord[0]+1):
-                                if self.get_marble((row, coord[1])) == 'X':
+        for player in players:
+            player_name = player.get_player_name()
 
-                                    return True
+            for coordinate, direction in self.legal_moves(player_name):
+                self.make_move(player_name, coordinate, direction)
+                counts[(player_name, coordinate, direction)] = self.perft(depth - 1)
+                self.unmake_move()
 
-        return False
+        return counts
 
-    def update_game_state(self):
+    def update_game_state(self, pushed_off=None):
         """
         Checks for a win, updates the winner, and
-        designates next turn as appropriate
+        designates next turn as appropriate. Takes the value of the marble
+        the move pushed off the board ("W", "B" or "R"), or None if no marble
+        left the board, and updates the marble counts from it rather than
+        recounting the whole board.
         """
         # update the marble count attributes
-        white = 0
-        black = 0
-        red = 0
+        white, black, red = self._marble_count
 
-        for value in self._board.get_board().values():
+        if pushed_off == 'W':
+            white -= 1
 
-            if value == "W":
-                white += 1
-
-            elif value == "B":
-                black += 1
+        elif pushed_off == 'B':
+            black -= 1
 
-            elif value == "R":
-                red += 1
+        elif pushed_off == 'R':
+            red -= 1
 
         self._marble_count = (white, black, red)
 
+        if self._debug:
+            self.check_game_state()
+
         if white == 0 or black == 0:
             # Win State 1: if either are 0, then whoever made
             # current move caused this -> they win
@@ -488,135 +1057,534 @@ class KubaGame:
             # print("The winner is:", self._winner)  # For testing
             #print("Other player cannot make any moves!")
 
-        # change player turn for the next move
-        if self.get_current_turn() == self._playerA.get_player_name():
-            self.set_current_turn(self._playerB.get_player_name())
+        # change player turn for the next move (as set_current_turn would with the
+        # other player's name, without looking the players up by name)
+        previous = self._current_turn
 
-        elif self.get_current_turn() == self._playerB.get_player_name():
-            self.set_current_turn(self._playerA.get_player_name())
+        if previous is self._playerA or previous is self._playerB:
+            following = self._playerB if previous is self._playerA else self._playerA
+            self._current_turn = following
+            self._off_turn = previous
+            self._hash ^= (self.ZOBRIST_TURN[previous.get_player_color()] ^
+                           self.ZOBRIST_TURN[following.get_player_color()])
 
-    def get_winner(self):
+    def check_game_state(self):
         """
-        Returns the name of the winning player. If no player has won yet,
-        it returns None. Note that this does not return the color that
-        the player chose
+        Recounts every marble on the board and compares the result with the
+        marble counts and captured red marbles maintained move by move.
+        Raises GameStateMismatchError if they disagree. Called after every
+        move when the game is created with debug=True.
         """
-        return self._winner
+        recount = self._board.count_marbles()
 
-    def get_captured(self, player_name):
-        """
-        Takes a player's name and returns the number of Red marbles
-        captured by the player. This returns 0 if no marble is captured.
-        """
-        for player in self._player_list:
+        if recount != self._marble_count:
+            raise GameStateMismatchError(
+                "Marble count %s does not match board recount %s" % (self._marble_count, recount))
 
-            if player_name == player.get_player_name():
+        # every red marble missing from the board must have been captured
+        captured = self._playerA.get_red_marbles() + self._playerB.get_red_marbles()
 
-                return player.get_red_marbles()
+        if captured != 13 - recount[2]:
+            raise GameStateMismatchError(
+                "Players captured %d red marbles but %d are off the board" % (captured, 13 - recount[2]))
 
-    def get_marble(self, coordinate):
+        if self._hash != self.compute_position_hash():
+            raise GameStateMismatchError("Position hash does not match a hash of the full game state")
+
+    def position_hash(self):
         """
-        Takes the coordinates of a cell as a tuple and returns the marble
-        that is present at the location. If no marble is present at the
-        coordinate location return 'X'
+        Returns a 64-bit integer identifying the current position: the contents of
+        every cell, the color whose turn it is, the Ko restriction and the number
+        of red marbles each player has captured. Identical positions have the same
+        hash no matter which moves led to them. The hash is updated as each move
+        is made, so calling this costs nothing.
         """
-        row = coordinate[0]
-        col = coordinate[1]
+        return self._hash
 
-        if row < 0 or row > 6 or col < 0 or col > 6:
-            # sets up the outside of the board to be recognized as
-            # moveable (empty space) because you can only move a marble
-            # if there is an empty space in the opposite direction from
-            # which you are trying to move
-            return 'X'
-
-        # returns the value at the location ("R", "W", "B" or "X")
-        return self._board.get_marble(coordinate)
+    def repetition_key(self):
+        """
+        Returns the key the superko rule compares positions by: the position
+        hash without the Ko restriction, so it identifies the cells, the player
+        to move and the captured red marbles.
+        """
+        return self._hash ^ self.ZOBRIST_KO.get(self._ko_move, 0)
 
-    def get_marble_count(self):
+    def repetition_key_after(self, player, coordinate, direction):
         """
-        Returns the numer of White marbles, Black marbles
-        and Red marbles as tuple in the order (W,B,R).
+        Takes a Player object and a move of theirs that is otherwise legal, and
+        returns the repetition_key of the position the move would create
+        (with the other player to move), without making the move. Returns None
+        for a push that forces a marble off the board, since a position with
+        fewer marbles cannot have occurred before. Costs one pass along the
+        pushed line, however long the game has been.
         """
-        return self._marble_count
+        zobrist_cells = self.ZOBRIST_CELLS
+        key = self.repetition_key()
+        previous_value = 'X'
 
+        for cell in self.RAYS[(coordinate, direction)]:
+            value = self._board.get_marble(cell)
 
-class Player:
-    """
-    Player class interacts with KubaGame class in order to provide
-    identifying details needed to track game state. These elements are the player
-    name (a string), the color of the player's marbles (either "W" or "B"), and
-    the number of red marbles ("R") that the player has 'captured' in the
-    course of the game. KubaGame updates these attributes in initialization of the
-    game, and in the case of the red marbles, during play.
+            if value != 'X':
+                key ^= zobrist_cells[(cell, value)]
 
-    """
+            if previous_value != 'X':
+                key ^= zobrist_cells[(cell, previous_value)]
 
-    def __init__(self, player_name, marble_color):
-        """
-        Takes a player name (string) and marble_color ("W" or "B"), and intitiates
-        the Player object.
-        """
+            previous_value = value
 
-        self._name = player_name
-        self._color = marble_color
-        self._red_marbles = 0
+            if value == 'X':
+                break
 
-    def get_player_name(self):
+        # no empty cell along the line: the last marble leaves the board
+        if previous_value != 'X':
+            return None
+
+        # the turn passes from the player to the other player
+        if self._current_turn != None:
+            key ^= self.ZOBRIST_TURN[self._current_turn.get_player_color()]
+
+        return key ^ self.ZOBRIST_TURN['B' if player.get_player_color() == 'W' else 'W']
+
+    def is_draw(self):
         """
-        Returns player name
+        Returns True if the game ended in a draw under the SUPERKO_DRAW rule
+        (a move recreated an earlier position), and False otherwise.
         """
-        return self._name
+        return self._draw
 
-    def get_player_color(self):
+    def compute_position_hash(self):
         """
-        Returns player's marble color
+        Computes the position hash from scratch by visiting every cell and the
+        rest of the game state. Used to initialize the hash and, in debug mode,
+        to check the value that is updated move by move.
         """
+        position_hash = 0
 
-        return self._color
+        for row in range(7):
+            for col in range(7):
+                value = self._board.get_marble((row, col))
 
-    def get_red_marbles(self):
+                if value != 'X':
+                    position_hash ^= self.ZOBRIST_CELLS[((row, col), value)]
+
+        if self._current_turn != None:
+            position_hash ^= self.ZOBRIST_TURN[self._current_turn.get_player_color()]
+
+        position_hash ^= self.ZOBRIST_KO.get(self._ko_move, 0)
+
+        for player in self._player_list:
+            position_hash ^= self.ZOBRIST_RED[(player.get_player_color(), player.get_red_marbles())]
+
+        return position_hash
+
+    def export_state(self):
         """
-        Returns the count of red marbles that the
-        player has captured.
+        Returns the game state as a tuple of plain values that is cheap to pickle
+        or send to another process: (cells, players, current turn, Ko move,
+        captured red marbles, winner). cells is a 49-character string of the
+        board values in row-major order, players holds the (name, color) tuple
+        of each player in the order they were passed in, and the captured red
+        marbles are listed in the same order. The undo history is not included.
         """
+        cells = ''.join(self._board.get_marble((row, col)) for row in range(7) for col in range(7))
+        players = tuple((player.get_player_name(), player.get_player_color())
+                        for player in self._player_list)
+        reds = tuple(player.get_red_marbles() for player in self._player_list)
 
-        return self._red_marbles
+        return (cells, players, self.get_current_turn(), self._ko_move, reds, self._winner)
 
-    def increment_red_marbles(self):
+    @classmethod
+    def from_state(cls, state, board_class=None, debug=False, superko=None):
         """
-        Adds a red marble to the player's count of red
-        marbles that have been won
+        Takes a state tuple produced by export_state (and optionally the board
+        backend, debug flag and superko rule accepted by the constructor) and
+        returns a new KubaGame in that state. The new game has no moves to
+        undo, and its repetition history starts from this position.
         """
-        self._red_marbles += 1
+        cells, players, current_turn, ko_move, reds, winner = state
 
+        game = cls(players[0], players[1], board_class, debug, superko)
 
-class Board:
-    """
-    Implements the board object which is the basis for the Kuba game. The board
-    is a 6 x 6 grid which can be populated by one of 4 values: "W" (representing
-    white marble), "B" (black marble), "R" (red marble), and "X" (an empty space).
+        for index, value in enumerate(cells):
+            game._board.set_marble(divmod(index, 7), value)
 
-    Board class interacts with the KubaGame class to allow access and adjustment to
-    the current state of the board. Board is implemented as a dictionary with key
-    lookup by grid-cell tuples: first element is row, second element is column (range
-    is (0,0) through (6,6))
-    """
+        for player, count in zip(game._player_list, reds):
+            player.set_red_marbles(count)
 
-    def __init__(self):
+        if current_turn != None:
+            game.set_current_turn(current_turn)
+
+        game._ko_move = ko_move
+        game._winner = winner
+        game._marble_count = game._board.count_marbles()
+        game._hash = game.compute_position_hash()
+
+        if superko != None:
+            game._positions = {game.repetition_key(): 1}
+
+        return game
+
+    def to_bytes(self):
         """
-        Initiates the game board
+        Returns the game state as a compact bytes record (see RECORD_HEADER for
+        the layout). It holds the same information as export_state in about 20
+        bytes plus the player names, and can be read back with from_bytes. The
+        undo history is not included.
         """
+        cells, players, current_turn, ko_move, reds, winner = self.export_state()
 
-        self._board = {
-            (0, 0): 'W', (0, 1): 'W', (0, 2): 'X', (0, 3): 'X', (0, 4): 'X', (0, 5): 'B', (0, 6): 'B',
-            (1, 0): 'W', (1, 1): 'W', (1, 2): 'X', (1, 3): 'R', (1, 4): 'X', (1, 5): 'B', (1, 6): 'B',
-            (2, 0): 'X', (2, 1): 'X', (2, 2): 'R', (2, 3): 'R', (2, 4): 'R', (2, 5): 'X', (2, 6): 'X',
-            (3, 0): 'X', (3, 1): 'R', (3, 2): 'R', (3, 3): 'R', (3, 4): 'R', (3, 5): 'R', (3, 6): 'X',
-            (4, 0): 'X', (4, 1): 'X', (4, 2): 'R', (4, 3): 'R', (4, 4): 'R', (4, 5): 'X', (4, 6): 'X',
-            (5, 0): 'B', (5, 1): 'B', (5, 2): 'X', (5, 3): 'R', (5, 4): 'X', (5, 5): 'W', (5, 6): 'W',
-            (6, 0): 'B', (6, 1): 'B', (6, 2): 'X', (6, 3): 'X', (6, 4): 'X', (6, 5): 'W', (6, 6): 'W'
-        }
+        packed = bytearray(13)
+
+        for index, value in enumerate(cells):
+            packed[index >> 2] |= self.RECORD_VALUES.index(value) << (6 - 2 * (index & 3))
+
+        names = [name for name, color in players]
+
+        flags = (names.index(current_turn) + 1) if current_turn != None else 0
+        flags |= ((names.index(winner) + 1) if winner != None else 0) << 2
+
+        if players[0][1] == 'B':
+            flags |= 16
+
+        if players[1][1] == 'B':
+            flags |= 32
+
+        if ko_move[0] != None:
+            (row, col), direction = ko_move
+            ko = ((row + 1) * 9 + col + 1) * 4 + self.RECORD_DIRECTIONS.index(direction)
+        else:
+            ko = 0xFFFF
+
+        record = bytearray(self.RECORD_HEADER.pack(self.RECORD_VERSION, bytes(packed), flags,
+                                                   ko, (reds[0] << 4) | reds[1]))
+
+        for name in names:
+            encoded = name.encode('utf-8')
+            record.append(len(encoded))
+            record += encoded
+
+        return bytes(record)
+
+    @classmethod
+    def record_length(cls, data, offset=0):
+        """
+        Takes a buffer holding to_bytes records and the offset of one record.
+        Returns the length of that record in bytes, so records stored back to
+        back can be walked without decoding them.
+        """
+        first = offset + cls.RECORD_HEADER.size
+        second = first + 1 + data[first]
+
+        return second + 1 + data[second] - offset
+
+    @classmethod
+    def from_bytes(cls, data, offset=0, board_class=None, debug=False):
+        """
+        Takes a record produced by to_bytes (bytes, bytearray or memoryview,
+        with an optional offset into a larger buffer) and returns a new KubaGame
+        in that state. The fixed part of the record is read in place with
+        struct.unpack_from, so a memoryview over a large buffer is decoded
+        without copying it.
+        """
+        version, packed, flags, ko, reds = cls.RECORD_HEADER.unpack_from(data, offset)
+
+        if version != cls.RECORD_VERSION:
+            raise ValueError("Unsupported Kuba record version: " + str(version))
+
+        cells = ''.join([cls.RECORD_BYTE_CELLS[byte] for byte in packed])[:49]
+
+        position = offset + cls.RECORD_HEADER.size
+        names = []
+
+        for _ in range(2):
+            length = data[position]
+            names.append(bytes(data[position + 1:position + 1 + length]).decode('utf-8'))
+            position += 1 + length
+
+        players = ((names[0], 'B' if flags & 16 else 'W'),
+                   (names[1], 'B' if flags & 32 else 'W'))
+        current_turn = names[(flags & 3) - 1] if flags & 3 else None
+        winner = names[((flags >> 2) & 3) - 1] if (flags >> 2) & 3 else None
+
+        if ko != 0xFFFF:
+            cell, direction = divmod(ko, 4)
+            row, col = divmod(cell, 9)
+            ko_move = ((row - 1, col - 1), cls.RECORD_DIRECTIONS[direction])
+        else:
+            ko_move = (None, None)
+
+        state = (cells, players, current_turn, ko_move, (reds >> 4, reds & 15), winner)
+
+        return cls.from_state(state, board_class, debug)
+
+    def enable_instrumentation(self, sampler=None, interval=1.0):
+        """
+        Starts counting and timing calls to validate_move (by rejection reason),
+        make_move (with the length of each push chain), update_game_state and
+        other_player_move_check on this game. Takes an optional sampler function
+        that is called with instrumentation_snapshot(reset=True) about every
+        interval seconds while moves are being made. Returns the Instrumentation
+        object holding the counters.
+
+        A game that is not instrumented runs the plain methods, so the
+        instrumentation costs nothing until it is enabled.
+        """
+        self._instrumentation = Instrumentation(sampler, interval)
+        self.__class__ = InstrumentedKubaGame
+
+        return self._instrumentation
+
+    def disable_instrumentation(self):
+        """
+        Stops instrumenting the game and returns the final snapshot of the
+        counters, or None if the game was not instrumented.
+        """
+        if self._instrumentation == None:
+            return None
+
+        snapshot = self._instrumentation.snapshot()
+        self._instrumentation = None
+        self.__class__ = KubaGame
+
+        return snapshot
+
+    def instrumentation_snapshot(self, reset=False):
+        """
+        Returns a dictionary of the counters and timings collected since
+        instrumentation was enabled (or last reset), or None if the game is not
+        instrumented. With reset set to True the counters start again from zero.
+        """
+        if self._instrumentation == None:
+            return None
+
+        return self._instrumentation.snapshot(reset)
+
+    def fork(self):
+        """
+        Returns an independent copy of the game in its current position, for
+        trying out moves without changing this game. Only the mutable parts are
+        copied: the board (a single copy of its storage) and the two players;
+        names, marble counts, the Ko restriction and all lookup tables are
+        shared. The copy has no moves to undo, no move listeners and no
+        instrumentation, but keeps the superko rule and its own copy of the
+        positions seen so far.
+        """
+        game = KubaGame.__new__(KubaGame)
+        game._board = self._board.copy()
+        game._playerA = self._playerA.copy()
+        game._playerB = self._playerB.copy()
+        game._player_list = (game._playerA, game._playerB)
+
+        # point the turn at the copied players
+        if self._current_turn is self._playerA:
+            game._current_turn, game._off_turn = game._playerA, game._playerB
+
+        elif self._current_turn is self._playerB:
+            game._current_turn, game._off_turn = game._playerB, game._playerA
+
+        else:
+            game._current_turn, game._off_turn = None, None
+
+        game._winner = self._winner
+        game._ko_move = self._ko_move
+        game._marble_count = self._marble_count
+        game._undo_stack = []
+        game._debug = self._debug
+        game._instrumentation = None
+        game._move_listeners = ()
+        game._hash = self._hash
+        game._superko = self._superko
+        game._positions = None if self._positions == None else dict(self._positions)
+        game._draw = self._draw
+
+        return game
+
+    def get_winner(self):
+        """
+        Returns the name of the winning player. If no player has won yet,
+        it returns None. Note that this does not return the color that
+        the player chose
+        """
+        return self._winner
+
+    def get_captured(self, player_name):
+        """
+        Takes a player's name and returns the number of Red marbles
+        captured by the player. This returns 0 if no marble is captured.
+        """
+        for player in self._player_list:
+
+            if player_name == player.get_player_name():
+
+                return player.get_red_marbles()
+
+    def get_player_color(self, player_name):
+        """
+        Takes a player's name and returns the color of the marbles
+        the player is playing ("W" or "B").
+        """
+        for player in self._player_list:
+
+            if player_name == player.get_player_name():
+
+                return player.get_player_color()
+
+    def get_opponent(self, player_name):
+        """
+        Takes a player's name and returns the name of the other player.
+        """
+        for player in self._player_list:
+
+            if player_name != player.get_player_name():
+
+                return player.get_player_name()
+
+    def get_mobility(self, player_name):
+        """
+        Takes a player's name and returns the number of pushes available
+        to the player's marbles on the current board. Unlike legal_moves,
+        this ignores whose turn it is and the Ko rule, so it can be used to
+        compare both players' freedom of movement in any position.
+        """
+        return len(self._board.get_moves(self.get_player_color(player_name)))
+
+    def get_marble(self, coordinate):
+        """
+        Takes the coordinates of a cell as a tuple and returns the marble
+        that is present at the location. If no marble is present at the
+        coordinate location return 'X'
+        """
+        row = coordinate[0]
+        col = coordinate[1]
+
+        if row < 0 or row > 6 or col < 0 or col > 6:
+            # sets up the outside of the board to be recognized as
+            # moveable (empty space) because you can only move a marble
+            # if there is an empty space in the opposite direction from
+            # which you are trying to move
+            return 'X'
+
+        # returns the value at the location ("R", "W", "B" or "X")
+        return self._board.get_marble(coordinate)
+
+    def get_marble_count(self):
+        """
+        Returns the numer of White marbles, Black marbles
+        and Red marbles as tuple in the order (W,B,R).
+        """
+        return self._marble_count
+
+
+class Player:
+    """
+    Player class interacts with KubaGame class in order to provide
+    identifying details needed to track game state. These elements are the player
+    name (a string), the color of the player's marbles (either "W" or "B"), and
+    the number of red marbles ("R") that the player has 'captured' in the
+    course of the game. KubaGame updates these attributes in initialization of the
+    game, and in the case of the red marbles, during play.
+
+    """
+
+    __slots__ = ('_name', '_color', '_red_marbles')
+
+    def __init__(self, player_name, marble_color):
+        """
+        Takes a player name (string) and marble_color ("W" or "B"), and intitiates
+        the Player object. Names are interned so that every game played by the
+        same player shares one copy of the name.
+        """
+
+        if isinstance(player_name, str):
+            player_name = sys.intern(player_name)
+
+        self._name = player_name
+        self._color = marble_color
+        self._red_marbles = 0
+
+    def copy(self):
+        """
+        Returns a new Player with the same name, color and captured red marbles
+        """
+        player = Player.__new__(Player)
+        player._name = self._name
+        player._color = self._color
+        player._red_marbles = self._red_marbles
+
+        return player
+
+    def get_player_name(self):
+        """
+        Returns player name
+        """
+        return self._name
+
+    def get_player_color(self):
+        """
+        Returns player's marble color
+        """
+
+        return self._color
+
+    def get_red_marbles(self):
+        """
+        Returns the count of red marbles that the
+        player has captured.
+        """
+
+        return self._red_marbles
+
+    def increment_red_marbles(self):
+        """
+        Adds a red marble to the player's count of red
+        marbles that have been won
+        """
+        self._red_marbles += 1
+
+    def decrement_red_marbles(self):
+        """
+        Removes a red marble from the player's count of red
+        marbles that have been won (used when a move is undone)
+        """
+        self._red_marbles -= 1
+
+    def set_red_marbles(self, count):
+        """
+        Takes a number of red marbles and sets the player's count of
+        captured red marbles to it (used when restoring a saved game)
+        """
+        self._red_marbles = count
+
+
+class Board:
+    """
+    Implements the board object which is the basis for the Kuba game. The board
+    is a 6 x 6 grid which can be populated by one of 4 values: "W" (representing
+    white marble), "B" (black marble), "R" (red marble), and "X" (an empty space).
+
+    Board class interacts with the KubaGame class to allow access and adjustment to
+    the current state of the board. Board is implemented as a dictionary with key
+    lookup by grid-cell tuples: first element is row, second element is column (range
+    is (0,0) through (6,6))
+    """
+
+    __slots__ = ('_board',)
+
+    def __init__(self):
+        """
+        Initiates the game board
+        """
+
+        self._board = {
+            (0, 0): 'W', (0, 1): 'W', (0, 2): 'X', (0, 3): 'X', (0, 4): 'X', (0, 5): 'B', (0, 6): 'B',
+            (1, 0): 'W', (1, 1): 'W', (1, 2): 'X', (1, 3): 'R', (1, 4): 'X', (1, 5): 'B', (1, 6): 'B',
+            (2, 0): 'X', (2, 1): 'X', (2, 2): 'R', (2, 3): 'R', (2, 4): 'R', (2, 5): 'X', (2, 6): 'X',
+            (3, 0): 'X', (3, 1): 'R', (3, 2): 'R', (3, 3): 'R', (3, 4): 'R', (3, 5): 'R', (3, 6): 'X',
+            (4, 0): 'X', (4, 1): 'X', (4, 2): 'R', (4, 3): 'R', (4, 4): 'R', (4, 5): 'X', (4, 6): 'X',
+            (5, 0): 'B', (5, 1): 'B', (5, 2): 'X', (5, 3): 'R', (5, 4): 'X', (5, 5): 'W', (5, 6): 'W',
+            (6, 0): 'B', (6, 1): 'B', (6, 2): 'X', (6, 3): 'X', (6, 4): 'X', (6, 5): 'W', (6, 6): 'W'
+        }
 
     def get_board(self):
         """
@@ -625,6 +1593,15 @@ class Board:
 
         return self._board
 
+    def copy(self):
+        """
+        Returns a new Board with the same cells as this one
+        """
+        board = Board.__new__(Board)
+        board._board = self._board.copy()
+
+        return board
+
     def set_marble(self, coordinate, value):
         """
         Takes a cell coordinate (tuple) and a value (string) and sets the cell (key) to that value
@@ -639,51 +1616,873 @@ class Board:
         """
         return self._board[coordinate]
 
+    def push_line(self, line, direction):
+        """
+        Takes a list of cell coordinates, ordered from the pushed marble in the
+        direction of the push, and a direction. Moves every value one cell along
+        the line and empties the first cell. The value in the last cell is
+        dropped: it is either the empty cell that absorbs the push or the marble
+        pushed off the edge of the board.
+        """
+        board = self._board
+
+        for index in range(len(line) - 1, 0, -1):
+            board[line[index]] = board[line[index - 1]]
+
+        board[line[0]] = 'X'
+
+    def get_moves(self, color, limit=None):
+        """
+        Takes a marble color ("W" or "B") and returns a list of every
+        (coordinate, direction) push available to that color: the cell behind
+        the marble is empty or off the board, and the push does not force one
+        of the color's own marbles off the board. The Ko rule is not applied
+        here since the board does not track the previous move. Moves are listed
+        in row-major order of the marbles, directions in the order F, B, L, R.
+        If limit is given, stops once that many moves have been found.
+        """
+        board = self._board
+        moves = []
+
+        for coord, value in board.items():
+
+            if value != color:
+                continue
+
+            row = coord[0]
+            col = coord[1]
+
+            # for each direction: the cell that must be empty to push from, and the
+            # edge cell of the row or column that the push could force off the board
+            for direction, behind, edge in (('F', (row + 1, col), (0, col)),
+                                            ('B', (row - 1, col), (6, col)),
+                                            ('L', (row, col + 1), (row, 0)),
+                                            ('R', (row, col - 1), (row, 6))):
+
+                if board.get(behind, 'X') != 'X':
+                    continue
+
+                if board[edge] == color:
+                    # the push is only allowed if there is an empty cell between
+                    # the marble and the edge to absorb it
+                    if direction in ('F', 'B'):
+                        line = [board[(num, col)] for num in range(min(row, edge[0]), max(row, edge[0]) + 1)]
+                    else:
+                        line = [board[(row, num)] for num in range(min(col, edge[1]), max(col, edge[1]) + 1)]
+
+                    if 'X' not in line:
+                        continue
+
+                moves.append((coord, direction))
+
+                if len(moves) == limit:
+                    return moves
+
+        return moves
+
+    def count_marbles(self):
+        """
+        Returns the number of White, Black and Red marbles on the board
+        as a tuple in the order (W, B, R).
+        """
+        white = 0
+        black = 0
+        red = 0
+
+        for value in self._board.values():
+
+            if value == "W":
+                white += 1
+
+            elif value == "B":
+                black += 1
+
+            elif value == "R":
+                red += 1
+
+        return (white, black, red)
+
     def print_board(self):
         """
         Prints a rough visual of the board updated with its current state.
         """
 
-        # print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(0, 0)], self._board[(0, 1)], self._board[(0, 2)],
-               self._board[(0, 3)], self._board[(0, 4)], self._board[(0, 5)],
-               self._board[(0, 6)]))
-        print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(1, 0)], self._board[(1, 1)], self._board[(1, 2)],
-               self._board[(1, 3)], self._board[(1, 4)], self._board[(1, 5)],
-               self._board[(1, 6)]))
-        print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(2, 0)], self._board[(2, 1)], self._board[(2, 2)],
-               self._board[(2, 3)], self._board[(2, 4)], self._board[(2, 5)],
-               self._board[(2, 6)]))
-        print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(3, 0)], self._board[(3, 1)], self._board[(3, 2)],
-               self._board[(3, 3)], self._board[(3, 4)], self._board[(3, 5)],
-               self._board[(3, 6)]))
-        print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(4, 0)], self._board[(4, 1)], self._board[(4, 2)],
-               self._board[(4, 3)], self._board[(4, 4)], self._board[(4, 5)],
-               self._board[(4, 6)]))
-        print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(5, 0)], self._board[(5, 1)], self._board[(5, 2)],
-               self._board[(5, 3)], self._board[(5, 4)], self._board[(5, 5)],
-               self._board[(5, 6)]))
-        print('-------------------------------------------')
-        print('   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  ' %
-              (self._board[(6, 0)], self._board[(6, 1)], self._board[(6, 2)],
-               self._board[(6, 3)], self._board[(6, 4)], self._board[(6, 5)],
-               self._board[(6, 6)]))
-        # print('-------------------------------------------')
+        for row in range(7):
+
+            if row > 0:
+                print(TextRenderer.SEPARATOR)
+
+            print(TextRenderer.ROW_FORMAT % tuple(self._board[(row, col)] for col in range(7)))
 
         return
 
 
+class BitBoard:
+    """
+    Alternative board backend with the same interface as Board. Instead of a
+    dictionary of cells, the position is stored as three integer bit masks, one
+    each for White, Black and Red marbles. Cell (row, col) maps to bit
+    row * 7 + col, so (0,0) is bit 0 and (6,6) is bit 48. A cell is empty ('X')
+    when its bit is clear in all three masks.
+
+    Occupancy tests and marble counting are done with shifts and popcounts
+    rather than dictionary lookups.
+    """
+
+    # mask with one bit set for each of the 49 cells on the board
+    FULL_MASK = (1 << 49) - 1
+
+    # masks of the cells in the first and last column and row
+    COL_0 = sum(1 << (row * 7) for row in range(7))
+    COL_6 = COL_0 << 6
+    ROW_0 = (1 << 7) - 1
+    ROW_6 = ROW_0 << 42
+
+    # bit for each cell coordinate; looking up a coordinate that is not on the
+    # board raises KeyError, matching the dictionary lookup of Board
+    CELL_BITS = {(row, col): 1 << (row * 7 + col) for row in range(7) for col in range(7)}
+
+    # the three masks are plain attributes, so reading one is a single slot
+    # access (KubaGame reads them all at once through get_masks)
+    __slots__ = ('_white', '_black', '_red')
+
+    def __init__(self):
+        """
+        Initiates the game board with the standard Kuba starting layout
+        (the same layout used by Board)
+        """
+        self._white = 0
+        self._black = 0
+        self._red = 0
+
+        for coordinate, value in Board().get_board().items():
+            if value != 'X':
+                self.set_marble(coordinate, value)
+
+    def copy(self):
+        """
+        Returns a new BitBoard with the same cells as this one
+        """
+        board = BitBoard.__new__(BitBoard)
+        board._white = self._white
+        board._black = self._black
+        board._red = self._red
+
+        return board
+
+    def get_masks(self):
+        """
+        Returns the White, Black and Red bit masks as a tuple (W, B, R)
+        """
+        return self._white, self._black, self._red
+
+    def get_mask(self, value):
+        """
+        Takes a marble value ("W", "B" or "R") and returns the bit mask
+        of the cells holding that marble
+        """
+        if value == 'W':
+            return self._white
+
+        if value == 'B':
+            return self._black
+
+        return self._red
+
+    def get_occupied(self):
+        """
+        Returns the bit mask of all cells holding any marble
+        """
+        return self._white | self._black | self._red
+
+    def get_board(self):
+        """
+        Returns the game board as a dictionary in the same format used by Board.
+        The dictionary is a snapshot: changing it does not change the board.
+        """
+        board = {}
+
+        for row in range(7):
+            for col in range(7):
+                board[(row, col)] = self.get_marble((row, col))
+
+        return board
+
+    def set_marble(self, coordinate, value):
+        """
+        Takes a cell coordinate (tuple) and a value (string) and sets the cell
+        to that value by clearing its bit in every mask and setting it in the
+        mask for the new value ('X' leaves the cell empty)
+        """
+        bit = self.CELL_BITS[coordinate]
+        keep = ~bit
+
+        self._white &= keep
+        self._black &= keep
+        self._red &= keep
+
+        if value == 'W':
+            self._white |= bit
+
+        elif value == 'B':
+            self._black |= bit
+
+        elif value == 'R':
+            self._red |= bit
+
+    def get_marble(self, coordinate):
+        """
+        Takes a board coordinate tuple (row number, column number) and returns
+        the value assigned to that spot on the board ("W", "B", "R" or "X")
+        """
+        bit = self.CELL_BITS[coordinate]
+
+        if self._white & bit:
+            return 'W'
+
+        if self._black & bit:
+            return 'B'
+
+        if self._red & bit:
+            return 'R'
+
+        return 'X'
+
+    def push_line(self, line, direction):
+        """
+        Takes a list of cell coordinates, ordered from the pushed marble in the
+        direction of the push, and a direction. Moves every value one cell along
+        the line and empties the first cell, the same as Board.push_line.
+        """
+        cells = 0
+
+        for coordinate in line:
+            cells |= self.CELL_BITS[coordinate]
+
+        self.push_mask(cells, direction)
+
+    def push_mask(self, cells, direction):
+        """
+        Takes the bit mask of the cells of a pushed line (see push_line) and the
+        direction of the push, and moves every value one cell along the line by
+        shifting each color mask once, restricted to the cells of the line. A
+        line lies in one row or column, so a value shifted past its end leaves
+        the mask.
+        """
+        keep = ~cells
+        white = self._white
+        black = self._black
+        red = self._red
+
+        if direction == 'R':
+            self._white = (white & keep) | (((white & cells) << 1) & cells)
+            self._black = (black & keep) | (((black & cells) << 1) & cells)
+            self._red = (red & keep) | (((red & cells) << 1) & cells)
+
+        elif direction == 'L':
+            self._white = (white & keep) | (((white & cells) >> 1) & cells)
+            self._black = (black & keep) | (((black & cells) >> 1) & cells)
+            self._red = (red & keep) | (((red & cells) >> 1) & cells)
+
+        elif direction == 'B':
+            self._white = (white & keep) | (((white & cells) << 7) & cells)
+            self._black = (black & keep) | (((black & cells) << 7) & cells)
+            self._red = (red & keep) | (((red & cells) << 7) & cells)
+
+        else:
+            self._white = (white & keep) | (((white & cells) >> 7) & cells)
+            self._black = (black & keep) | (((black & cells) >> 7) & cells)
+            self._red = (red & keep) | (((red & cells) >> 7) & cells)
+
+    @classmethod
+    def shift(cls, mask, direction):
+        """
+        Takes a bit mask and a direction ("L", "R", "F" or "B") and returns the
+        mask with every cell moved one space in that direction. Cells that
+        would move off the board are dropped.
+        """
+        if direction == 'R':
+            return (mask << 1) & ~cls.COL_0 & cls.FULL_MASK
+
+        if direction == 'L':
+            return (mask >> 1) & ~cls.COL_6
+
+        if direction == 'B':
+            return (mask << 7) & cls.FULL_MASK
+
+        return mask >> 7
+
+    @staticmethod
+    def fill(full, occupied, step):
+        """
+        Takes a mask of starting cells, a mask of occupied cells and a bit step
+        (1 or 7 moves one cell right or down, -1 or -7 left or up). Extends the
+        starting cells one step at a time through occupied cells until an empty
+        cell stops every line, and returns the extended mask.
+        """
+        while True:
+
+            if step > 0:
+                spread = full | (occupied & (full << step))
+            else:
+                spread = full | (occupied & (full >> -step))
+
+            if spread == full:
+                return full
+
+            full = spread
+
+    def get_move_masks(self, color):
+        """
+        Takes a marble color ("W" or "B") and returns a tuple of four masks, one
+        for each push direction in the order F, B, L, R. Each mask holds that
+        color's marbles which can be pushed in the direction: the cell behind
+        the marble is empty or off the board, and the push does not force one
+        of the player's own marbles off the board.
+        """
+        own = self._white if color == 'W' else self._black
+        occupied = self._white | self._black | self._red
+        empty = self.FULL_MASK & ~occupied
+
+        # marbles with an empty access square (or the edge) behind them
+        access_f = own & ((empty >> 7) | self.ROW_6)
+        access_b = own & ((empty << 7) | self.ROW_0)
+        access_l = own & (((empty >> 1) & ~self.COL_6) | self.COL_6)
+        access_r = own & (((empty << 1) & ~self.COL_0) | self.COL_0)
+
+        # spread each of the player's front edge marbles along its whole row or
+        # column (the bits of an edge are 7 or 1 apart, so multiplying by a full
+        # column or row mask copies them without carries)
+        edge_f = own & self.ROW_0
+        edge_b = own & self.ROW_6
+        edge_l = own & self.COL_0
+        edge_r = own & self.COL_6
+
+        lines_f = edge_f * self.COL_0
+        lines_b = (edge_b >> 42) * self.COL_0
+        lines_l = edge_l * self.ROW_0
+        lines_r = (edge_r >> 6) * self.ROW_0
+
+        # in those lines, pushing any marble of the full run that ends at the
+        # player's edge marble would push that marble off the board
+        if access_f & lines_f:
+            access_f &= ~self.fill(edge_f, occupied & lines_f, 7)
+
+        if access_b & lines_b:
+            access_b &= ~self.fill(edge_b, occupied & lines_b, -7)
+
+        if access_l & lines_l:
+            access_l &= ~self.fill(edge_l, occupied & lines_l, 1)
+
+        if access_r & lines_r:
+            access_r &= ~self.fill(edge_r, occupied & lines_r, -1)
+
+        return (access_f, access_b, access_l, access_r)
+
+    def has_moves(self, color, excluded=(None, None)):
+        """
+        Takes a marble color ("W" or "B") and a (coordinate, direction) move to
+        leave out (the Ko move), and returns True if the color has any other
+        push. Marbles with an empty access cell that are not in a row or column
+        ending in one of the player's own edge marbles can always be pushed, so
+        those are checked first; the full masks of get_move_masks are only
+        built when there are none.
+        """
+        own = self._white if color == 'W' else self._black
+        occupied = self._white | self._black | self._red
+        empty = self.FULL_MASK & ~occupied
+
+        excluded_bit = self.CELL_BITS.get(excluded[0], 0)
+        excluded_direction = excluded[1]
+
+        # marbles with an empty access cell (or the edge) behind them, outside
+        # the lines that end in an own marble on the edge they are pushed toward
+        safe = (own & ((empty >> 7) | self.ROW_6) & ~((own & self.ROW_0) * self.COL_0),
+                own & ((empty << 7) | self.ROW_0) & ~(((own & self.ROW_6) >> 42) * self.COL_0),
+                own & (((empty >> 1) & ~self.COL_6) | self.COL_6) & ~((own & self.COL_0) * self.ROW_0),
+                own & (((empty << 1) & ~self.COL_0) | self.COL_0) & ~(((own & self.COL_6) >> 6) * self.ROW_0))
+
+        for direction, mask in zip('FBLR', safe):
+
+            if direction == excluded_direction:
+                mask &= ~excluded_bit
+
+            if mask:
+                return True
+
+        count = 0
+
+        for direction, mask in zip('FBLR', self.get_move_masks(color)):
+
+            if direction == excluded_direction:
+                mask &= ~excluded_bit
+
+            count += mask.bit_count()
+
+        return count > 0
+
+    def get_moves(self, color, limit=None):
+        """
+        Takes a marble color ("W" or "B") and returns a list of every
+        (coordinate, direction) push available to that color, in the same
+        order as Board.get_moves, built from the masks of get_move_masks.
+        If limit is given, stops once that many moves have been found.
+        """
+        directions = ('F', 'B', 'L', 'R')
+        direction_masks = self.get_move_masks(color)
+        mask = direction_masks[0] | direction_masks[1] | direction_masks[2] | direction_masks[3]
+        moves = []
+
+        while mask:
+            # isolate and clear the lowest set bit
+            bit = mask & -mask
+            mask ^= bit
+            coord = divmod(bit.bit_length() - 1, 7)
+
+            for direction, direction_mask in zip(directions, direction_masks):
+
+                if direction_mask & bit:
+                    moves.append((coord, direction))
+
+                    if len(moves) == limit:
+                        return moves
+
+        return moves
+
+    def count_marbles(self):
+        """
+        Returns the number of White, Black and Red marbles on the board
+        as a tuple in the order (W, B, R).
+        """
+        return (self._white.bit_count(), self._black.bit_count(), self._red.bit_count())
+
+    def print_board(self):
+        """
+        Prints a rough visual of the board updated with its current state.
+        """
+        for row in range(7):
+
+            if row > 0:
+                print(TextRenderer.SEPARATOR)
+
+            print(TextRenderer.ROW_FORMAT % tuple(self.get_marble((row, col)) for col in range(7)))
+
+        return
+
+
+class CompactBoard:
+    """
+    Alternative board backend with the same interface as Board, for holding a
+    very large number of games in memory. The cells are stored in one 49-byte
+    bytearray in row-major order (cell (row, col) at index row * 7 + col), each
+    byte being the ASCII code of the cell's value ("W", "B", "R" or "X"). All
+    lookup tables are shared by every board.
+    """
+
+    INITIAL_CELLS = b'WWXXXBBWWXRXBBXXRRRXXXRRRRRXXXRRRXXBBXRXWWBBXXXWW'
+
+    # index of each cell coordinate; looking up a coordinate that is not on
+    # the board raises KeyError, matching the dictionary lookup of Board
+    CELL_INDEX = {(row, col): row * 7 + col for row in range(7) for col in range(7)}
+    CELLS = tuple((row, col) for row in range(7) for col in range(7))
+
+    EMPTY = ord('X')
+
+    # for each cell index: a (direction, access cell index or None, ray cell
+    # indexes) entry per direction in the order F, B, L, R
+    MOVE_TABLE = []
+
+    for _cell in CELLS:
+        _entries = []
+
+        for _direction in ('F', 'B', 'L', 'R'):
+            _behind = KubaGame.ACCESS_CELLS[(_cell, _direction)]
+            _entries.append((_direction, None if _behind == None else _behind[0] * 7 + _behind[1],
+                             tuple(_row * 7 + _col for _row, _col in KubaGame.RAYS[(_cell, _direction)])))
+
+        MOVE_TABLE.append(tuple(_entries))
+
+    del _cell, _entries, _direction, _behind
+
+    __slots__ = ('_cells',)
+
+    def __init__(self):
+        """
+        Initiates the game board with the standard Kuba starting layout
+        (the same layout used by Board)
+        """
+        self._cells = bytearray(self.INITIAL_CELLS)
+
+    def copy(self):
+        """
+        Returns a new CompactBoard with the same cells as this one
+        """
+        board = CompactBoard.__new__(CompactBoard)
+        board._cells = self._cells[:]
+
+        return board
+
+    def get_board(self):
+        """
+        Returns the game board as a dictionary in the same format used by Board.
+        The dictionary is a snapshot: changing it does not change the board.
+        """
+        return {cell: chr(value) for cell, value in zip(self.CELLS, self._cells)}
+
+    def set_marble(self, coordinate, value):
+        """
+        Takes a cell coordinate (tuple) and a value (string) and sets the cell to
+        that value
+        """
+        self._cells[self.CELL_INDEX[coordinate]] = ord(value)
+
+    def get_marble(self, coordinate):
+        """
+        Takes a board coordinate tuple (row number, column number) and returns
+        the value assigned to that spot on the board ("W", "B", "R" or "X")
+        """
+        return chr(self._cells[self.CELL_INDEX[coordinate]])
+
+    def push_line(self, line, direction):
+        """
+        Takes a list of cell coordinates, ordered from the pushed marble in the
+        direction of the push, and a direction. Moves every value one cell along
+        the line and empties the first cell (see Board.push_line).
+        """
+        cells = self._cells
+        cell_index = self.CELL_INDEX
+        indexes = [cell_index[cell] for cell in line]
+
+        for position in range(len(indexes) - 1, 0, -1):
+            cells[indexes[position]] = cells[indexes[position - 1]]
+
+        cells[indexes[0]] = self.EMPTY
+
+    def get_moves(self, color, limit=None):
+        """
+        Takes a marble color ("W" or "B") and returns a list of every
+        (coordinate, direction) push available to that color, in the same order
+        and under the same rules as Board.get_moves. If limit is given, stops
+        once that many moves have been found.
+        """
+        cells = self._cells
+        code = ord(color)
+        empty = self.EMPTY
+        moves = []
+        index = cells.find(code)
+
+        while index != -1:
+
+            for direction, behind, ray in self.MOVE_TABLE[index]:
+
+                if behind != None and cells[behind] != empty:
+                    continue
+
+                # the push is only allowed if there is an empty cell between
+                # the marble and the edge to absorb it
+                if cells[ray[-1]] == code and all(cells[cell] != empty for cell in ray):
+                    continue
+
+                moves.append((self.CELLS[index], direction))
+
+                if len(moves) == limit:
+                    return moves
+
+            index = cells.find(code, index + 1)
+
+        return moves
+
+    def count_marbles(self):
+        """
+        Returns the number of White, Black and Red marbles on the board
+        as a tuple in the order (W, B, R).
+        """
+        cells = self._cells
+
+        return (cells.count(b'W'), cells.count(b'B'), cells.count(b'R'))
+
+    def print_board(self):
+        """
+        Prints a rough visual of the board updated with its current state.
+        """
+        for row in range(7):
+
+            if row > 0:
+                print(TextRenderer.SEPARATOR)
+
+            print(TextRenderer.ROW_FORMAT % tuple(self._cells[row * 7:row * 7 + 7].decode()))
+
+        return
+
+
+class TextRenderer:
+    """
+    Keeps a text picture of a game's board (in the same format as print_board)
+    and updates it from move deltas, reformatting only the rows a move changed
+    instead of reprinting every cell. Attach it to a game with
+    game.add_move_listener(renderer.apply), or feed it deltas received from
+    elsewhere.
+    """
+
+    ROW_FORMAT = '   %s  |  %s  |  %s  |  %s  |  %s  |  %s  |  %s  '
+    SEPARATOR = '-------------------------------------------'
+
+    def __init__(self, game):
+        """
+        Takes the game whose board is drawn, in its current position.
+        """
+        self._cells = [[game.get_marble((row, col)) for col in range(7)] for row in range(7)]
+        self._lines = [self.ROW_FORMAT % tuple(cells) for cells in self._cells]
+
+    def apply(self, delta):
+        """
+        Takes a move delta (see KubaGame.move_delta) and updates the picture.
+        Returns the sorted list of board rows whose text changed.
+        """
+        rows = set()
+
+        for (row, col), value in delta['changes']:
+            self._cells[row][col] = value
+            rows.add(row)
+
+        for row in rows:
+            self._lines[row] = self.ROW_FORMAT % tuple(self._cells[row])
+
+        return sorted(rows)
+
+    def get_line(self, row):
+        """
+        Returns the text of one board row.
+        """
+        return self._lines[row]
+
+    def render(self):
+        """
+        Returns the whole board as text, as print_board prints it.
+        """
+        return ('\n' + self.SEPARATOR + '\n').join(self._lines)
+
+    def ansi_update(self, delta, top=1):
+        """
+        Takes a move delta and returns the ANSI terminal escape sequence that
+        rewrites only the changed rows of a board previously written with render
+        starting at terminal line top, leaving the cursor below the board.
+        """
+        output = []
+
+        for row in self.apply(delta):
+            output.append('\x1b[%d;1H\x1b[2K%s' % (top + 2 * row, self._lines[row]))
+
+        output.append('\x1b[%d;1H' % (top + 13))
+
+        return ''.join(output)
+
+
+class Instrumentation:
+    """
+    Counters and timings collected by an instrumented KubaGame (see
+    KubaGame.enable_instrumentation). Times are in seconds and inclusive:
+    make_move includes the validation and update_game_state it runs, and
+    update_game_state includes other_player_move_check.
+    """
+
+    TIMED = ('validate_move', 'make_move', 'update_game_state', 'other_player_move_check')
+
+    def __init__(self, sampler=None, interval=1.0):
+        """
+        Takes an optional sampler function and the number of seconds between
+        calls to it.
+        """
+        self._sampler = sampler
+        self._interval = interval
+        self._next_sample = time.perf_counter() + interval
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every counter back to zero.
+        """
+        # method name -> [calls, total seconds, longest call in seconds]
+        self._timings = {name: [0, 0.0, 0.0] for name in self.TIMED}
+        # reason -> count, for validate_move calls and for failed make_move calls
+        self._rejections = {}
+        self._move_rejections = {}
+        # reason found by the last rejection_reason call, read by make_move
+        self.last_reason = None
+        self._moves_made = 0
+        self._no_moves = 0
+        # push chain length -> [pushes, total make_move seconds]
+        self._chains = {}
+
+    def record(self, name, seconds):
+        """
+        Adds one call to the named method taking the given number of seconds.
+        """
+        timing = self._timings[name]
+        timing[0] += 1
+        timing[1] += seconds
+
+        if seconds > timing[2]:
+            timing[2] = seconds
+
+    def record_rejection(self, reason):
+        """
+        Counts a validate_move call that rejected its move for the given reason.
+        """
+        self._rejections[reason] = self._rejections.get(reason, 0) + 1
+
+    def record_move_rejection(self, reason):
+        """
+        Counts a make_move call that failed for the given reason.
+        """
+        self._move_rejections[reason] = self._move_rejections.get(reason, 0) + 1
+
+    def record_push(self, length, seconds):
+        """
+        Counts a successful move that pushed a chain of the given number of
+        marbles, and the time make_move took for it.
+        """
+        self._moves_made += 1
+        chain = self._chains.get(length)
+
+        if chain == None:
+            chain = self._chains[length] = [0, 0.0]
+
+        chain[0] += 1
+        chain[1] += seconds
+
+    def record_no_moves(self):
+        """
+        Counts an other_player_move_check call that found no moves.
+        """
+        self._no_moves += 1
+
+    def maybe_sample(self, now):
+        """
+        Calls the sampler with a snapshot (and resets the counters) if the
+        sampling interval has passed.
+        """
+        if self._sampler != None and now >= self._next_sample:
+            self._next_sample = now + self._interval
+            self._sampler(self.snapshot(True))
+
+    def snapshot(self, reset=False):
+        """
+        Returns the counters as a dictionary of plain values keyed by method
+        name, with the moves rejected by reason under validate_move and under
+        make_move (each counting only calls to that method) and the pushes by
+        chain length under make_move. With reset set to True the counters start
+        again from zero.
+        """
+        result = {}
+
+        for name, (calls, seconds, longest) in self._timings.items():
+            result[name] = {
+                'calls': calls,
+                'seconds': seconds,
+                'mean_seconds': seconds / calls if calls else 0.0,
+                'max_seconds': longest,
+            }
+
+        result['validate_move']['rejected'] = dict(self._rejections)
+        result['validate_move']['accepted'] = (result['validate_move']['calls'] -
+                                               sum(self._rejections.values()))
+        result['make_move']['successful'] = self._moves_made
+        result['make_move']['rejected'] = dict(self._move_rejections)
+        result['make_move']['push_chains'] = {
+            length: {'count': count, 'mean_seconds': seconds / count}
+            for length, (count, seconds) in sorted(self._chains.items())}
+        result['other_player_move_check']['no_moves'] = self._no_moves
+
+        if reset:
+            self.reset()
+
+        return result
+
+
+class InstrumentedKubaGame (KubaGame):
+    """
+    A KubaGame whose hot-path methods are wrapped to record calls, timings,
+    rejection reasons and push chain lengths in its Instrumentation object.
+    Games are switched to and from this class by
+    KubaGame.enable_instrumentation and disable_instrumentation.
+    """
+
+    __slots__ = ()
+
+    def validate_move(self, player_name, coordinate, direction):
+        """
+        Validates the move as KubaGame.validate_move does and records the call
+        and the reason for rejecting it. The checks make_move runs itself are
+        not counted here.
+        """
+        start = time.perf_counter()
+        reason = KubaGame.rejection_reason(self, player_name, coordinate, direction)
+        self._instrumentation.record('validate_move', time.perf_counter() - start)
+
+        if reason != None:
+            self._instrumentation.record_rejection(reason)
+
+        return reason == None
+
+    def rejection_reason(self, player_name, coordinate, direction):
+        """
+        Checks the move as KubaGame.rejection_reason does and keeps the reason
+        for make_move to record if the move fails. Not counted as a call.
+        """
+        reason = KubaGame.rejection_reason(self, player_name, coordinate, direction)
+        self._instrumentation.last_reason = reason
+
+        return reason
+
+    def make_move(self, player_name, coordinate, direction, return_delta=False):
+        """
+        Makes the move as KubaGame.make_move does and records the call and, for
+        a successful move, the number of marbles it pushed, or for a failed one
+        the reason it was rejected.
+        """
+        start = time.perf_counter()
+        result = KubaGame.make_move(self, player_name, coordinate, direction, return_delta)
+        now = time.perf_counter()
+        self._instrumentation.record('make_move', now - start)
+
+        if not result:
+            self._instrumentation.record_move_rejection(self._instrumentation.last_reason)
+
+        else:
+            # the undo entry lists the pushed marbles and the empty cell after them
+            line = self._undo_stack[-1][0]
+            length = len(line) - 1 if line[-1][1] == 'X' else len(line)
+            self._instrumentation.record_push(length, now - start)
+
+        self._instrumentation.maybe_sample(now)
+
+        return result
+
+    def update_game_state(self, pushed_off=None):
+        """
+        Updates the game state as KubaGame.update_game_state does and records
+        the call.
+        """
+        start = time.perf_counter()
+        KubaGame.update_game_state(self, pushed_off)
+        self._instrumentation.record('update_game_state', time.perf_counter() - start)
+
+    def other_player_move_check(self):
+        """
+        Checks the other player's moves as KubaGame.other_player_move_check does
+        and records the call and whether no moves were found.
+        """
+        start = time.perf_counter()
+        result = KubaGame.other_player_move_check(self)
+        self._instrumentation.record('other_player_move_check', time.perf_counter() - start)
+
+        if not result:
+            self._instrumentation.record_no_moves()
+
+        return result
+
+
 if __name__ == "__main__":
     """
     For testing purposes
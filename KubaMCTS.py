@@ -0,0 +1,244 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba MCTS
+# Description:
+#   Monte Carlo Tree Search (UCT) computer player for the Kuba game implemented in
+#   KubaGame.py. Each worker process grows its own search tree from the root
+#   position with random playouts (root parallelization), and the root move
+#   statistics of all workers are added together to choose the move. Workers
+#   receive the position as the plain tuple from KubaGame.export_state rather
+#   than a pickled KubaGame, and play out games with make_move / unmake_move.
+
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from KubaGame import KubaGame
+
+
+class Node:
+    """
+    A node of the search tree. It holds the move that led to it from its parent,
+    the name of the player who made that move, and the number of visits and wins
+    (from that player's point of view; a draw counts as half a win) of the
+    playouts that passed through it. Moves not yet expanded into children are
+    kept in untried.
+    """
+
+    def __init__(self, parent, move, player_name, untried):
+        """
+        Takes the parent node (None for the root), the move and player that led
+        here, and the list of legal moves in this position.
+        """
+        self.parent = parent
+        self.move = move
+        self.player_name = player_name
+        self.untried = untried
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self, exploration):
+        """
+        Returns the child with the highest UCT score: its win rate plus an
+        exploration bonus that shrinks the more often it has been visited.
+        """
+        log_visits = math.log(self.visits)
+        best = None
+        best_score = -1.0
+
+        for child in self.children:
+            score = (child.wins / child.visits +
+                     exploration * math.sqrt(log_visits / child.visits))
+
+            if score > best_score:
+                best = child
+                best_score = score
+
+        return best
+
+
+def run_search(state, player_name, iterations, time_limit, seed, exploration, max_playout):
+    """
+    Worker entry point. Takes a state tuple from KubaGame.export_state, the name
+    of the player to move and the search settings, grows a UCT tree from that
+    position until the iteration count or time limit is reached, and returns a
+    tuple (root move statistics, iterations run). The statistics map each root
+    move to a (visits, wins) pair. Runs in a separate process, so everything it
+    takes and returns is a plain value.
+    """
+    rng = random.Random(seed)
+    game = KubaGame.from_state(state)
+    root = Node(None, None, None, game.legal_moves(player_name))
+    deadline = time.perf_counter() + time_limit if time_limit != None else None
+    count = 0
+
+    while iterations == None or count < iterations:
+
+        if deadline != None and time.perf_counter() > deadline:
+            break
+
+        node = root
+        depth = 0
+
+        # selection: follow UCT scores down through fully expanded nodes
+        while not node.untried and node.children:
+            node = node.select_child(exploration)
+            game.make_move(node.player_name, node.move[0], node.move[1])
+            depth += 1
+
+        # expansion: add one untried move as a new child
+        if node.untried and game.get_winner() == None:
+            move = node.untried.pop(rng.randrange(len(node.untried)))
+            mover = game.get_current_turn() or player_name
+            game.make_move(mover, move[0], move[1])
+            depth += 1
+
+            child = Node(node, move, mover, game.legal_moves(game.get_current_turn()))
+            node.children.append(child)
+            node = child
+
+        # playout: random moves until the game is won or the playout is cut off
+        playout = 0
+
+        while game.get_winner() == None and playout < max_playout:
+            mover = game.get_current_turn()
+            moves = game.legal_moves(mover)
+
+            if not moves:
+                break
+
+            move = moves[rng.randrange(len(moves))]
+            game.make_move(mover, move[0], move[1])
+            playout += 1
+
+        winner = game.get_winner()
+
+        for _ in range(depth + playout):
+            game.unmake_move()
+
+        # backpropagation: credit each node from the point of view of the
+        # player who made the move leading to it
+        while node != None:
+            node.visits += 1
+
+            if winner == None:
+                node.wins += 0.5
+
+            elif winner == node.player_name:
+                node.wins += 1.0
+
+            node = node.parent
+
+        count += 1
+
+    stats = {child.move: (child.visits, child.wins) for child in root.children}
+
+    return stats, count
+
+
+class MCTSPlayer:
+    """
+    Chooses moves for a KubaGame with Monte Carlo Tree Search. The search is
+    spread across a pool of worker processes, each building an independent tree
+    from the same root position with its own random seed. Since the workers
+    share nothing until the end, throughput grows with the number of workers.
+    """
+
+    def __init__(self, workers=1, iterations=None, time_limit=1.0, exploration=1.4,
+                 max_playout=200, seed=None):
+        """
+        Takes the number of worker processes (1 searches in this process), the
+        number of iterations per worker and/or the time limit per move in
+        seconds (the search stops at whichever comes first; pass None to
+        disable either), the UCT exploration constant, the number of moves after
+        which a playout is scored as a draw, and an optional seed for
+        reproducible searches.
+        """
+        self._workers = workers
+        self._iterations = iterations
+        self._time_limit = time_limit
+        self._exploration = exploration
+        self._max_playout = max_playout
+        self._random = random.Random(seed)
+        self._executor = None
+
+    def choose_move(self, game, player_name):
+        """
+        Takes a KubaGame and the name of the player to move. Returns a tuple
+        (move, stats) where move is the (coordinate, direction) visited most
+        often across all workers, or None if the player has no legal move, and
+        stats is a dictionary with the number of iterations, iterations per
+        second, workers used, the move's win rate and seconds spent. The game
+        itself is not changed.
+        """
+        start = time.perf_counter()
+        moves = game.legal_moves(player_name)
+
+        if len(moves) < 2:
+            return (moves[0] if moves else None), {
+                'iterations': 0, 'iterations_per_second': 0, 'workers': 0,
+                'win_rate': None, 'seconds': time.perf_counter() - start}
+
+        state = game.export_state()
+        settings = (self._iterations, self._time_limit)
+        seeds = [self._random.getrandbits(32) for _ in range(self._workers)]
+
+        if self._workers == 1:
+            results = [run_search(state, player_name, settings[0], settings[1], seeds[0],
+                                  self._exploration, self._max_playout)]
+
+        else:
+            if self._executor == None:
+                self._executor = ProcessPoolExecutor(max_workers=self._workers)
+
+            futures = [self._executor.submit(run_search, state, player_name, settings[0],
+                                             settings[1], seed, self._exploration,
+                                             self._max_playout)
+                       for seed in seeds]
+            results = [future.result() for future in futures]
+
+        # add up the root statistics of every worker's tree
+        totals = {}
+        iterations = 0
+
+        for stats, count in results:
+            iterations += count
+
+            for move, (visits, wins) in stats.items():
+                total = totals.get(move, (0, 0.0))
+                totals[move] = (total[0] + visits, total[1] + wins)
+
+        best_move = max(totals, key=lambda move: totals[move][0])
+        visits, wins = totals[best_move]
+        elapsed = time.perf_counter() - start
+
+        return best_move, {
+            'iterations': iterations,
+            'iterations_per_second': int(iterations / elapsed) if elapsed > 0 else 0,
+            'workers': self._workers,
+            'win_rate': wins / visits,
+            'seconds': elapsed,
+        }
+
+    def close(self):
+        """
+        Shuts down the worker processes, if any were started.
+        """
+        if self._executor != None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        """
+        Allows the player to be used in a with statement so the worker
+        processes are shut down at the end of the block.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Shuts down the worker processes when the with block ends.
+        """
+        self.close()
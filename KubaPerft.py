@@ -0,0 +1,156 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Perft
+# Description:
+#   Move-tree enumeration (perft) tool for the Kuba game implemented in
+#   KubaGame.py. Counts every legal move sequence to a given depth from the
+#   starting position with KubaGame.perft, reports nodes per second, lists the
+#   count under each first move (divide), and checks the totals against the
+#   reference counts below. The reference counts were produced with
+#   brute_force_perft, which tries every cell and direction with make_move on a
+#   copy of the game and so relies only on the rules in validate_move. Any
+#   faster engine or board backend must reproduce them exactly:
+#
+#       python KubaPerft.py --depth 5 --board compact --check
+
+import argparse
+import sys
+import time
+
+from KubaGame import KubaGame, Board, BitBoard, CompactBoard
+
+
+BOARD_CLASSES = {'dict': Board, 'bitboard': BitBoard, 'compact': CompactBoard}
+
+PLAYERS = (('PlayerA', 'W'), ('PlayerB', 'B'))
+
+# perft counts from the starting position, before either player has moved
+REFERENCE = {
+    1: 16,
+    2: 128,
+    3: 1280,
+    4: 12768,
+    5: 141624,
+    6: 1565664,
+}
+
+
+def brute_force_perft(game, depth):
+    """
+    Takes a KubaGame and a depth and returns the same count as game.perft(depth)
+    without using legal_moves or unmake_move: every cell and direction is
+    tried with make_move on a fork of the game. Much slower; used to produce
+    and confirm the reference counts.
+    """
+    if depth == 0:
+        return 1
+
+    if game.get_winner() != None:
+        return 0
+
+    if game.get_current_turn() == None:
+        names = [name for name, color in PLAYERS]
+    else:
+        names = [game.get_current_turn()]
+
+    total = 0
+
+    for player_name in names:
+
+        for row in range(7):
+
+            for col in range(7):
+
+                for direction in 'FBLR':
+                    child = game.fork()
+
+                    if child.make_move(player_name, (row, col), direction):
+                        total += brute_force_perft(child, depth - 1)
+
+    return total
+
+
+def run_perft(depth, board_class=None, divide=False):
+    """
+    Takes a depth, a board backend and whether to divide, and runs perft from
+    the starting position. Returns a dictionary with the depth, the node count,
+    the seconds spent, nodes per second and, when divide is set, the count
+    under each first move.
+    """
+    game = KubaGame(PLAYERS[0], PLAYERS[1], board_class)
+    start = time.perf_counter()
+
+    if divide:
+        counts = game.perft_divide(depth)
+        nodes = sum(counts.values())
+    else:
+        counts = None
+        nodes = game.perft(depth)
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        'depth': depth,
+        'nodes': nodes,
+        'seconds': elapsed,
+        'nodes_per_second': int(nodes / elapsed) if elapsed > 0 else 0,
+        'divide': counts,
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Prints the count at each depth up to --depth
+    with nodes per second, the divide list with --divide, and with --check
+    exits with status 1 when a count differs from REFERENCE. --brute-force
+    counts with brute_force_perft instead.
+    """
+    parser = argparse.ArgumentParser(description="Count Kuba move sequences from the starting position.")
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict')
+    parser.add_argument('--divide', action='store_true', help="list the count under each first move")
+    parser.add_argument('--check', action='store_true', help="compare the counts with REFERENCE")
+    parser.add_argument('--brute-force', action='store_true',
+                        help="count by trying every move with make_move on copies")
+    args = parser.parse_args(argv)
+
+    board_class = BOARD_CLASSES[args.board]
+    mismatch = False
+
+    for depth in range(1, args.depth + 1):
+
+        if args.brute_force:
+            start = time.perf_counter()
+            nodes = brute_force_perft(KubaGame(PLAYERS[0], PLAYERS[1], board_class), depth)
+            elapsed = time.perf_counter() - start
+            result = {'nodes': nodes, 'seconds': elapsed,
+                      'nodes_per_second': int(nodes / elapsed) if elapsed > 0 else 0, 'divide': None}
+        else:
+            result = run_perft(depth, board_class, args.divide and depth == args.depth)
+
+        line = "perft(%d) = %d  %.3f s  %d nodes/s" % (depth, result['nodes'], result['seconds'],
+                                                     result['nodes_per_second'])
+
+        if args.check and depth in REFERENCE:
+
+            if result['nodes'] == REFERENCE[depth]:
+                line += "  ok"
+            else:
+                line += "  MISMATCH (expected %d)" % REFERENCE[depth]
+                mismatch = True
+
+        print(line)
+
+        if result['divide']:
+
+            for (player_name, coordinate, direction), count in sorted(result['divide'].items()):
+                print("  %s %s %s: %d" % (player_name, coordinate, direction, count))
+
+    if mismatch:
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Record
+# Description:
+#   Compact append-only file format for archiving Kuba games, and a replay
+#   engine that reads it back. A record file starts with the 8-byte MAGIC
+#   string and then holds games back to back. Each game is a small header
+#   (player names and colors, who moved first, the recorded winner and the
+#   number of moves) followed by one byte per move: cell index (row * 7 +
+#   column) * 4 + index of the direction in "FBLR". The player making each move
+#   is not stored since turns alternate after the first move.
+#
+#   Readers memory-map the file and decode one game at a time, so a file of any
+#   size is replayed lazily without loading it into memory.
+
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from KubaGame import KubaGame
+
+
+MAGIC = b'KUBAREC1'
+
+# game header: marker byte, number of moves, flags (bits 0 and 1 set when the
+# first or second player plays Black, bits 2-3 the player who moved first and
+# bits 4-5 the recorded winner, each as 0 none / 1 first player / 2 second
+# player), followed by each player name as a 1-byte length and UTF-8 text
+GAME_MARKER = 0xB5
+GAME_HEADER = struct.Struct('>BIB')
+
+DIRECTIONS = 'FBLR'
+
+# move byte -> (coordinate, direction), and the reverse
+MOVE_DECODE = [None] * 256
+MOVE_ENCODE = {}
+
+for _cell in range(49):
+
+    for _index, _direction in enumerate(DIRECTIONS):
+        _move = (divmod(_cell, 7), _direction)
+        MOVE_DECODE[_cell * 4 + _index] = _move
+        MOVE_ENCODE[_move] = _cell * 4 + _index
+
+del _cell, _index, _direction, _move
+
+
+class RecordFormatError (Exception):
+    """
+    Defines exception: RecordFormatError. Raised when a record file does not
+    start with MAGIC or a game is damaged or cut off. offset is the offset of
+    the game, or None when the file itself is not a record file.
+    """
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+class GameRecord:
+    """
+    One archived game as read from a record file: the (name, color) tuple of
+    each player, the name of the player who moved first (None if the game has
+    no moves), the recorded winner (or None), the moves as a bytes object of
+    move codes, and the offset of the game in the file.
+    """
+
+    def __init__(self, players, first_player, winner, moves, offset):
+        """
+        Takes the fields described in the class docstring.
+        """
+        self.players = players
+        self.first_player = first_player
+        self.winner = winner
+        self.moves = moves
+        self.offset = offset
+
+    def get_moves(self):
+        """
+        Returns the moves as a list of (coordinate, direction) tuples.
+        """
+        return [MOVE_DECODE[code] for code in self.moves]
+
+
+class RecordWriter:
+    """
+    Appends games to a record file. The file is created with the MAGIC header
+    if it does not exist yet; existing games are never rewritten.
+    """
+
+    def __init__(self, path):
+        """
+        Takes the path of the record file to append to.
+        """
+        self._file = open(path, 'ab')
+
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write_game(self, players, moves, winner=None):
+        """
+        Takes the (name, color) tuple of each player, the list of successful
+        moves as (player_name, coordinate, direction) tuples (the arguments of
+        each make_move call, in order) and the name of the winner, if any, and
+        appends the game to the file.
+        """
+        names = [name for name, color in players]
+
+        flags = 0
+
+        if players[0][1] == 'B':
+            flags |= 1
+
+        if players[1][1] == 'B':
+            flags |= 2
+
+        if moves:
+            flags |= (names.index(moves[0][0]) + 1) << 2
+
+        if winner != None:
+            flags |= (names.index(winner) + 1) << 4
+
+        record = bytearray(GAME_HEADER.pack(GAME_MARKER, len(moves), flags))
+
+        for name in names:
+            encoded = name.encode('utf-8')
+            record.append(len(encoded))
+            record += encoded
+
+        record += bytes([MOVE_ENCODE[(tuple(coordinate), direction)]
+                         for player_name, coordinate, direction in moves])
+
+        self._file.write(record)
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        """
+        Allows the writer to be used in a with statement so the file is closed at
+        the end of the block.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the file when the with block ends.
+        """
+        self.close()
+
+
+def parse_header(data, offset):
+    """
+    Takes a buffer holding a record file and the offset of a game header, and
+    checks that the header and both player names lie within the buffer.
+    Returns a tuple (number of moves, flags, list of the two names as bytes,
+    offset of the first move). Raises RecordFormatError if the header is
+    damaged or the file ends inside it.
+    """
+    if offset + GAME_HEADER.size > len(data):
+        raise RecordFormatError("Truncated game header at offset " + str(offset), offset)
+
+    marker, count, flags = GAME_HEADER.unpack_from(data, offset)
+
+    if marker != GAME_MARKER:
+        raise RecordFormatError("Bad game header at offset " + str(offset), offset)
+
+    position = offset + GAME_HEADER.size
+    names = []
+
+    for _ in range(2):
+
+        # the length byte and the name it announces must both be present
+        if position >= len(data) or position + 1 + data[position] > len(data):
+            raise RecordFormatError("Truncated player name at offset " + str(offset), offset)
+
+        length = data[position]
+        names.append(data[position + 1:position + 1 + length])
+        position += 1 + length
+
+    return count, flags, names, position
+
+
+def parse_game(data, offset):
+    """
+    Takes a buffer holding a record file (bytes or mmap) and the offset of a
+    game header. Returns a tuple (GameRecord, offset of the next game).
+    Raises RecordFormatError if the game is damaged or cut off.
+    """
+    count, flags, names, position = parse_header(data, offset)
+
+    try:
+        names = [name.decode('utf-8') for name in names]
+
+    except UnicodeDecodeError:
+        raise RecordFormatError("Bad player name at offset " + str(offset), offset)
+
+    players = ((names[0], 'B' if flags & 1 else 'W'),
+               (names[1], 'B' if flags & 2 else 'W'))
+    first_player = names[((flags >> 2) & 3) - 1] if (flags >> 2) & 3 else None
+    winner = names[((flags >> 4) & 3) - 1] if (flags >> 4) & 3 else None
+    moves = data[position:position + count]
+
+    if len(moves) != count:
+        raise RecordFormatError("Truncated game at offset " + str(offset), offset)
+
+    return GameRecord(players, first_player, winner, moves, offset), position + count
+
+
+def read_games(path, start=None, stop=None):
+    """
+    Takes the path of a record file and yields a GameRecord for each game in
+    it, in order. The file is memory-mapped and decoded one game at a time.
+    start and stop optionally restrict reading to the games whose header
+    offsets lie in [start, stop), as returned by game_offsets.
+    """
+    with open(path, 'rb') as file:
+
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+            if data[:len(MAGIC)] != MAGIC:
+                raise RecordFormatError(path + " is not a Kuba record file")
+
+            offset = len(MAGIC) if start == None else start
+            end = len(data) if stop == None else min(stop, len(data))
+
+            while offset < end:
+                record, offset = parse_game(data, offset)
+                yield record
+
+
+def game_offsets(path):
+    """
+    Takes the path of a record file and returns the list of offsets at which
+    its games start. Only the headers are read, so this is much faster than
+    replaying the file; it is used to split a file between workers. A damaged
+    or cut off game is the last offset listed, so that the worker reading it
+    reports it.
+    """
+    offsets = []
+
+    with open(path, 'rb') as file:
+
+        if os.fstat(file.fileno()).st_size == 0:
+            return offsets
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = len(MAGIC)
+
+            while offset < len(data):
+                offsets.append(offset)
+
+                try:
+                    count, flags, names, position = parse_header(data, offset)
+
+                except RecordFormatError:
+                    break
+
+                offset = position + count
+
+    return offsets
+
+
+def replay_positions(record, board_class=None):
+    """
+    Takes a GameRecord (and optionally the board backend for KubaGame) and
+    replays it, yielding (move number, game) after every move. The same
+    KubaGame object is yielded each time and changes as the replay continues;
+    use export_state or to_bytes to keep a position. Stops early if a move is
+    rejected.
+    """
+    game = KubaGame(record.players[0], record.players[1], board_class)
+    player_name = record.first_player
+    number = 0
+
+    for code in record.moves:
+        coordinate, direction = MOVE_DECODE[code]
+
+        if not game.make_move(player_name, coordinate, direction):
+            return
+
+        number += 1
+        yield number, game
+
+        player_name = game.get_current_turn()
+
+
+def replay_game(record, board_class=None):
+    """
+    Takes a GameRecord and replays every move. Returns a tuple (valid, winner,
+    moves played): valid is True when every move was accepted and the winner
+    at the end matches the recorded winner.
+    """
+    game = KubaGame(record.players[0], record.players[1], board_class)
+    player_name = record.first_player
+    played = 0
+
+    for code in record.moves:
+        coordinate, direction = MOVE_DECODE[code]
+
+        if not game.make_move(player_name, coordinate, direction):
+            return False, game.get_winner(), played
+
+        played += 1
+        player_name = game.get_current_turn()
+
+    winner = game.get_winner()
+
+    return winner == record.winner, winner, played
+
+
+def replay_results(path, board_class=None):
+    """
+    Takes the path of a record file and yields (GameRecord, valid, winner,
+    moves played) for every game in it, replaying the games lazily one at a
+    time.
+    """
+    for record in read_games(path):
+        valid, winner, played = replay_game(record, board_class)
+        yield record, valid, winner, played
+
+
+def validate_range(path, start, stop, board_class=None):
+    """
+    Worker entry point for validate_file. Replays the games whose headers lie
+    in [start, stop) and returns a tuple (games, moves, offsets of invalid
+    games). A damaged or cut off game is reported as invalid and ends the
+    range, since the games after it cannot be located.
+    """
+    games = 0
+    moves = 0
+    invalid = []
+
+    try:
+
+        for record in read_games(path, start, stop):
+            valid, winner, played = replay_game(record, board_class)
+            games += 1
+            moves += played
+
+            if not valid:
+                invalid.append(record.offset)
+
+    except RecordFormatError as error:
+
+        if error.offset == None:
+            raise
+
+        games += 1
+        invalid.append(error.offset)
+
+    return games, moves, invalid
+
+
+def validate_file(path, workers=1, board_class=None, chunks_per_worker=4):
+    """
+    Takes the path of a record file and replays every game in it, using a pool
+    of worker processes when workers is more than 1 (each replays a separate
+    range of games mapped from the same file). Returns a dictionary with the
+    number of games and moves replayed and the sorted offsets of games that
+    were rejected or whose winner did not match the recording.
+    """
+    if workers == 1:
+        games, moves, invalid = validate_range(path, None, None, board_class)
+        return {'games': games, 'moves': moves, 'invalid': invalid}
+
+    offsets = game_offsets(path)
+    chunks = max(1, min(len(offsets), workers * chunks_per_worker))
+    bounds = [offsets[len(offsets) * index // chunks] for index in range(chunks)] if offsets else []
+    ranges = list(zip(bounds, bounds[1:] + [None]))
+
+    totals = {'games': 0, 'moves': 0, 'invalid': []}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(validate_range, path, start, stop, board_class)
+                   for start, stop in ranges]
+
+        for future in futures:
+            games, moves, invalid = future.result()
+            totals['games'] += games
+            totals['moves'] += moves
+            totals['invalid'] += invalid
+
+    totals['invalid'].sort()
+
+    return totals
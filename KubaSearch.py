@@ -0,0 +1,338 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Search
+# Description:
+#   Computer player for the Kuba game implemented in KubaGame.py. SearchPlayer
+#   picks a move with negamax alpha-beta search, deepening one ply at a time
+#   until a wall-clock budget is spent. Positions are cached in a transposition
+#   table keyed by KubaGame.position_hash, and moves are explored in place with
+#   make_move / unmake_move rather than copying the game.
+
+import time
+
+from KubaGame import KubaGame
+
+
+class SearchTimeout (Exception):
+    """
+    Defines exception: SearchTimeout. Raised inside the search when the time
+    budget runs out; SearchPlayer catches it and keeps the result of the last
+    completed depth.
+    """
+    pass
+
+
+class SearchPlayer:
+    """
+    Chooses moves for a KubaGame using negamax alpha-beta search with iterative
+    deepening, a transposition table, move ordering and a per-move time budget.
+
+    Scores are from the point of view of the player to move. A won position
+    scores WIN_SCORE minus the number of plies needed to reach it, so the search
+    prefers faster wins and slower losses. Other positions are scored by
+    evaluate, which uses the marble counts, captured red marbles and mobility
+    that KubaGame already tracks.
+    """
+
+    WIN_SCORE = 1000000
+
+    # transposition table entry flags: the stored score is exact, a lower
+    # bound (the search failed high) or an upper bound (it failed low)
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    # evaluation weights
+    RED_WEIGHT = 60
+    MARBLE_WEIGHT = 100
+    MOBILITY_WEIGHT = 2
+
+    def __init__(self, time_limit=0.1, max_depth=64, table_size=1 << 20, tablebase=None):
+        """
+        Takes the time budget per move in seconds, the deepest search depth to
+        try, the maximum number of transposition table entries (the table is
+        cleared when it fills up) and optionally an open KubaTablebase.Tablebase
+        whose exact results replace searching the endgames it holds.
+        """
+        self._time_limit = time_limit
+        self._tablebase = tablebase
+        self._max_depth = max_depth
+        self._table_size = table_size
+        self._table = {}
+        self._nodes = 0
+        self._deadline = None
+
+    def choose_move(self, game, player_name):
+        """
+        Takes a KubaGame and the name of the player to move. Searches the position
+        and returns a tuple (move, stats) where move is the best (coordinate,
+        direction) found, or None if the player has no legal move, and stats is a
+        dictionary with the number of nodes searched, nodes per second, depth
+        reached, score of the move and seconds spent. The game is left exactly as
+        it was passed in.
+        """
+        start = time.perf_counter()
+        self._deadline = start + self._time_limit
+        self._nodes = 0
+
+        if len(self._table) > self._table_size:
+            self._table.clear()
+
+        moves = game.legal_moves(player_name)
+        best_move = moves[0] if moves else None
+        best_score = None
+        depth_reached = 0
+
+        if len(moves) > 1:
+
+            for depth in range(1, self._max_depth + 1):
+
+                try:
+                    score, move = self.search_root(game, player_name, moves, depth)
+
+                except SearchTimeout:
+                    break
+
+                best_score = score
+                best_move = move
+                depth_reached = depth
+
+                # a forced win or loss will not change with more depth
+                if abs(score) >= self.WIN_SCORE - self._max_depth:
+                    break
+
+        elapsed = time.perf_counter() - start
+
+        stats = {
+            'nodes': self._nodes,
+            'nodes_per_second': int(self._nodes / elapsed) if elapsed > 0 else 0,
+            'depth': depth_reached,
+            'score': best_score,
+            'seconds': elapsed,
+        }
+
+        return best_move, stats
+
+    def search_root(self, game, player_name, moves, depth):
+        """
+        Searches every root move to the given depth and returns a tuple
+        (score, move) for the best one. The best move of the previous depth
+        (stored in the transposition table) is searched first.
+        """
+        entry = self._table.get(game.position_hash())
+        ordered = self.order_moves(game, moves, entry[3] if entry else None)
+
+        alpha = -self.WIN_SCORE - 1
+        beta = self.WIN_SCORE + 1
+        best_move = ordered[0]
+
+        for move in ordered:
+            game.make_move(player_name, move[0], move[1])
+
+            try:
+                score = -self.negamax(game, depth - 1, -beta, -alpha, 1)
+
+            finally:
+                game.unmake_move()
+
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        self.store(game.position_hash(), depth, alpha, self.EXACT, best_move, 0)
+
+        return alpha, best_move
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        """
+        Returns the score of the current position for the player to move,
+        searched to the given depth within the alpha-beta window. ply is the
+        distance from the root, used to score faster wins higher.
+        """
+        self._nodes += 1
+
+        if self._nodes & 63 == 0 and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+        # the player who just moved has won
+        if game.get_winner() != None:
+            return -(self.WIN_SCORE - ply)
+
+        if self._tablebase != None and sum(game.get_marble_count()) <= self._tablebase.max_marbles:
+            found = self._tablebase.probe(game)
+
+            if found != None:
+                result, plies = found
+
+                if result == 'win':
+                    return self.WIN_SCORE - (ply + plies)
+
+                if result == 'loss':
+                    return -(self.WIN_SCORE - (ply + plies))
+
+                return 0
+
+        if depth == 0:
+            return self.evaluate(game)
+
+        key = game.position_hash()
+        entry = self._table.get(key)
+        table_move = None
+
+        if entry != None:
+            entry_depth, entry_score, entry_flag, table_move = entry
+
+            if entry_depth >= depth:
+                score = self.score_from_table(entry_score, ply)
+
+                if entry_flag == self.EXACT:
+                    return score
+
+                if entry_flag == self.LOWER and score > alpha:
+                    alpha = score
+
+                elif entry_flag == self.UPPER and score < beta:
+                    beta = score
+
+                if alpha >= beta:
+                    return score
+
+        player_name = game.get_current_turn()
+        moves = game.legal_moves(player_name)
+
+        if not moves:
+            return -(self.WIN_SCORE - ply)
+
+        alpha_start = alpha
+        best_score = -self.WIN_SCORE - 1
+        best_move = None
+
+        for move in self.order_moves(game, moves, table_move):
+            game.make_move(player_name, move[0], move[1])
+
+            try:
+                score = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+
+            finally:
+                game.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+
+                if score > alpha:
+                    alpha = score
+
+                    if alpha >= beta:
+                        break
+
+        if best_score <= alpha_start:
+            flag = self.UPPER
+
+        elif best_score >= beta:
+            flag = self.LOWER
+
+        else:
+            flag = self.EXACT
+
+        self.store(key, depth, best_score, flag, best_move, ply)
+
+        return best_score
+
+    def store(self, key, depth, score, flag, move, ply):
+        """
+        Saves a search result in the transposition table. Win and loss scores
+        are stored relative to the position rather than the root so they stay
+        correct when the position is reached at a different ply.
+        """
+        if score > self.WIN_SCORE - 1000:
+            score += ply
+
+        elif score < -self.WIN_SCORE + 1000:
+            score -= ply
+
+        self._table[key] = (depth, score, flag, move)
+
+    def score_from_table(self, score, ply):
+        """
+        Converts a score read from the transposition table back to one relative
+        to the root (the reverse of the adjustment made in store).
+        """
+        if score > self.WIN_SCORE - 1000:
+            return score - ply
+
+        if score < -self.WIN_SCORE + 1000:
+            return score + ply
+
+        return score
+
+    def order_moves(self, game, moves, table_move):
+        """
+        Returns the moves sorted so the most promising are searched first: the
+        transposition table move, then pushes that capture an opponent marble,
+        then pushes that capture a red marble, then the rest in their original
+        order.
+        """
+        own = game.get_player_color(game.get_current_turn()) if game.get_current_turn() else None
+        captures = []
+        red_captures = []
+        quiet = []
+
+        for move in moves:
+
+            if move == table_move:
+                continue
+
+            captured = self.captured_marble(game, move)
+
+            if captured == 'R':
+                red_captures.append(move)
+
+            elif captured != None and captured != own:
+                captures.append(move)
+
+            else:
+                quiet.append(move)
+
+        ordered = [table_move] if table_move in moves else []
+
+        return ordered + captures + red_captures + quiet
+
+    @staticmethod
+    def captured_marble(game, move):
+        """
+        Takes a game and a (coordinate, direction) move and returns the marble
+        the push would force off the board ("W", "B" or "R"), or None if the
+        line has an empty cell to absorb the push.
+        """
+        value = None
+
+        for cell in KubaGame.RAYS[move]:
+            value = game.get_marble(cell)
+
+            if value == 'X':
+                return None
+
+        return value
+
+    def evaluate(self, game):
+        """
+        Scores a position that is not yet won for the player to move. Captured red
+        marbles, marbles left on the board and the number of available pushes each
+        count in the player's favor and against the opponent.
+        """
+        player_name = game.get_current_turn()
+        opponent_name = game.get_opponent(player_name)
+
+        white, black, red = game.get_marble_count()
+
+        if game.get_player_color(player_name) == 'W':
+            marbles = white - black
+        else:
+            marbles = black - white
+
+        reds = game.get_captured(player_name) - game.get_captured(opponent_name)
+        mobility = game.get_mobility(player_name) - game.get_mobility(opponent_name)
+
+        return (self.RED_WEIGHT * reds + self.MARBLE_WEIGHT * marbles +
+                self.MOBILITY_WEIGHT * mobility)
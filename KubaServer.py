@@ -0,0 +1,546 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Server
+# Description:
+#   Asyncio session manager hosting many KubaGame instances in one process.
+#   Games are created, looked up and expired by id, moves from any number of
+#   clients are routed to their game, and every accepted move is pushed to the
+#   game's subscribers. A JSON-lines TCP front end (serve) and a local load-test
+#   client (load_test) are included:
+#
+#       python KubaServer.py serve --port 8765
+#       python KubaServer.py loadtest --games 100000
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import random
+import sys
+import time
+from collections import OrderedDict
+
+from KubaGame import KubaGame, Board, BitBoard, CompactBoard
+
+
+BOARD_CLASSES = {'dict': Board, 'bitboard': BitBoard, 'compact': CompactBoard}
+
+
+class SessionNotFoundError (Exception):
+    """
+    Defines exception: SessionNotFoundError. Raised when a game id does not
+    belong to a live session (it never existed or has expired).
+    """
+    pass
+
+
+class Session:
+    """
+    One hosted game: the KubaGame, its subscriber queues and the time it was
+    last used.
+    """
+
+    def __init__(self, game_id, game, now):
+        """
+        Takes the game id, the KubaGame and the current monotonic time.
+        """
+        self.game_id = game_id
+        self.game = game
+        self.subscribers = []
+        self.last_active = now
+
+
+class SessionManager:
+    """
+    Hosts KubaGame sessions keyed by game id.
+
+    All sessions live on one event loop. A move is validated, applied and
+    published to the subscribers without awaiting anything, so moves on the same
+    game are applied one at a time in the order they arrive, and no lock (per
+    game or global) is needed. Subscribers receive the delta of each move (see
+    KubaGame.move_delta) rather than the whole board. Their queues are bounded:
+    when a slow subscriber's queue is full its queued deltas are replaced by one
+    full state update, from which the following deltas apply again.
+
+    Sessions are kept in least recently used order, so expiring idle games only
+    looks at the games that are actually expired.
+    """
+
+    def __init__(self, ttl=600.0, sweep_interval=30.0, board_class=None, queue_size=16):
+        """
+        Takes the number of seconds a game may stay idle before it expires, the
+        seconds between expiry sweeps, the board backend for new games and the
+        size of each subscriber queue.
+        """
+        self._ttl = ttl
+        self._sweep_interval = sweep_interval
+        self._board_class = board_class
+        self._queue_size = queue_size
+        self._sessions = OrderedDict()
+        self._ids = itertools.count(1)
+        self._sweeper = None
+        self._moves = 0
+
+    def __len__(self):
+        """
+        Returns the number of live games.
+        """
+        return len(self._sessions)
+
+    def create_game(self, player1, player2, game_id=None):
+        """
+        Takes the (name, color) tuple of each player and an optional game id
+        (one is generated otherwise). Creates the game and returns its id.
+        """
+        if game_id == None:
+            game_id = 'g%d' % next(self._ids)
+
+        game = KubaGame(tuple(player1), tuple(player2), self._board_class)
+        self._sessions[game_id] = Session(game_id, game, time.monotonic())
+
+        return game_id
+
+    def get_session(self, game_id):
+        """
+        Returns the Session for a game id. Raises SessionNotFoundError if there
+        is no such live game.
+        """
+        session = self._sessions.get(game_id)
+
+        if session == None:
+            raise SessionNotFoundError("No live game with id " + str(game_id))
+
+        return session
+
+    def get_game(self, game_id):
+        """
+        Returns the KubaGame for a game id. Raises SessionNotFoundError if there
+        is no such live game.
+        """
+        return self.get_session(game_id).game
+
+    def state(self, game_id):
+        """
+        Returns the full state of a game as a dictionary with the game id, whose
+        turn it is, the winner, the captured red marbles, the marble counts and
+        the board as 7 strings of 7 cells.
+        """
+        return self.make_state(self.get_session(game_id))
+
+    def make_state(self, session):
+        """
+        Builds the full state dictionary of a session's game.
+        """
+        game = session.game
+        cells, players, current_turn, ko_move, reds, winner = game.export_state()
+
+        return {
+            'game': session.game_id,
+            'turn': current_turn,
+            'winner': winner,
+            'captured': {name: count for (name, color), count in zip(players, reds)},
+            'marbles': game.get_marble_count(),
+            'board': [cells[row * 7:row * 7 + 7] for row in range(7)],
+        }
+
+    async def make_move(self, game_id, player_name, coordinate, direction):
+        """
+        Takes a game id and the make_move parameters and applies the move to the
+        game. Returns None if the move was made, or the rejection reason
+        (one of the KubaGame.REJECT_ strings) if it was not. Accepted moves are
+        pushed to the game's subscribers. Raises SessionNotFoundError if there
+        is no such live game.
+        """
+        session = self.get_session(game_id)
+        game = session.game
+
+        # the move is made without awaiting, so no other move on this game can
+        # interleave with it
+        delta = game.make_move(player_name, coordinate, direction, True)
+
+        if delta:
+            reason = None
+            self._moves += 1
+
+            if session.subscribers:
+                self.publish(session, {'game': game_id, 'delta': delta})
+
+        else:
+            reason = game.rejection_reason(player_name, coordinate, direction)
+
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(game_id)
+
+        return reason
+
+    def subscribe(self, game_id):
+        """
+        Takes a game id and returns an asyncio.Queue that receives a dictionary
+        {"game": id, "delta": move delta} after every accepted move, the full
+        state (see state) if the subscriber fell too far behind, and None when
+        the game expires or is closed.
+        """
+        queue = asyncio.Queue(self._queue_size)
+        self.get_session(game_id).subscribers.append(queue)
+
+        return queue
+
+    def unsubscribe(self, game_id, queue):
+        """
+        Stops sending updates for a game to a queue returned by subscribe.
+        """
+        session = self._sessions.get(game_id)
+
+        if session != None and queue in session.subscribers:
+            session.subscribers.remove(queue)
+
+    async def updates(self, game_id, queue=None):
+        """
+        Async generator yielding the state updates of a game until it expires or
+        is closed. Takes a queue already returned by subscribe, so that no
+        update published before the generator first runs is missed, or
+        subscribes when it starts.
+        """
+        if queue == None:
+            queue = self.subscribe(game_id)
+
+        try:
+            while True:
+                update = await queue.get()
+
+                if update == None:
+                    return
+
+                yield update
+
+        finally:
+            self.unsubscribe(game_id, queue)
+
+    def publish(self, session, update):
+        """
+        Puts an update on every subscriber queue of a session. A subscriber whose
+        queue is full has missed too many deltas to keep up, so its queue is
+        emptied and given the full state (which already includes this update)
+        instead.
+        """
+        for queue in session.subscribers:
+
+            if queue.full():
+
+                while not queue.empty():
+                    queue.get_nowait()
+
+                queue.put_nowait(self.make_state(session) if update != None else None)
+
+            else:
+                queue.put_nowait(update)
+
+    def close_game(self, game_id):
+        """
+        Removes a game and tells its subscribers it has ended. Returns True if
+        the game existed.
+        """
+        session = self._sessions.pop(game_id, None)
+
+        if session == None:
+            return False
+
+        self.publish(session, None)
+
+        return True
+
+    def expire(self, now=None):
+        """
+        Removes every game idle for longer than the time to live and returns the
+        number removed.
+        """
+        if now == None:
+            now = time.monotonic()
+
+        expired = 0
+
+        # sessions are in least recently used order, so stop at the first live one
+        while self._sessions:
+            game_id, session = next(iter(self._sessions.items()))
+
+            if now - session.last_active <= self._ttl:
+                break
+
+            self.close_game(game_id)
+            expired += 1
+
+        return expired
+
+    async def sweep(self):
+        """
+        Expires idle games every sweep interval until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            self.expire()
+
+    def start(self):
+        """
+        Starts the background expiry task on the running event loop.
+        """
+        if self._sweeper == None:
+            self._sweeper = asyncio.get_running_loop().create_task(self.sweep())
+
+    async def stop(self):
+        """
+        Stops the background expiry task.
+        """
+        if self._sweeper != None:
+            self._sweeper.cancel()
+
+            try:
+                await self._sweeper
+
+            except asyncio.CancelledError:
+                pass
+
+            self._sweeper = None
+
+    async def __aenter__(self):
+        """
+        Starts the expiry task when used in an async with statement.
+        """
+        self.start()
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Stops the expiry task when the async with block ends.
+        """
+        await self.stop()
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of live games and the number of
+        moves made since the manager was created.
+        """
+        return {'games': len(self._sessions), 'moves': self._moves}
+
+
+def tune_gc():
+    """
+    Tunes the garbage collector for a process holding many long-lived games.
+    Objects created so far (the hosted games among them) are moved out of the
+    collector's view with gc.freeze, and young collections run less often, so
+    full collections no longer walk every game and stall every client's
+    moves. Can be called again after creating many games.
+    """
+    gc.freeze()
+    gc.set_threshold(100000, 50, 100)
+
+
+async def handle_client(manager, reader, writer):
+    """
+    Serves one TCP client. Each line the client sends is a JSON request and is
+    answered with one JSON line:
+        {"op": "create", "players": [["A", "W"], ["B", "B"]]} -> {"ok": true, "game": id}
+        {"op": "move", "game": id, "player": "A", "coordinate": [6, 5], "direction": "F"}
+            -> {"ok": true} or {"ok": false, "reason": "not_your_turn"}
+        {"op": "state", "game": id} -> {"ok": true, "state": {...}}
+        {"op": "subscribe", "game": id} -> {"ok": true}, then an {"update": {...}}
+            line after every accepted move, holding the move delta or, if the
+            client fell behind, the full state
+    Unknown games are answered with {"ok": false, "reason": "not_found"}.
+    Every write waits for the transport to drain, so a client that reads
+    slowly holds up its own forwarders and falls back on full-state updates
+    instead of filling the server's buffers.
+    """
+    forwarders = []
+    # replies and forwarded updates share the stream; one line at a time
+    write_lock = asyncio.Lock()
+
+    async def send(message):
+        async with write_lock:
+            writer.write((json.dumps(message) + '\n').encode())
+            await writer.drain()
+
+    async def forward(game_id, queue):
+        try:
+            async for update in manager.updates(game_id, queue):
+                await send({'update': update})
+
+        except ConnectionError:
+            pass
+
+    try:
+        while True:
+            line = await reader.readline()
+
+            if not line:
+                break
+
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+
+                if op == 'create':
+                    reply = {'ok': True, 'game': manager.create_game(*request['players'])}
+
+                elif op == 'move':
+                    reason = await manager.make_move(request['game'], request['player'],
+                                                     tuple(request['coordinate']),
+                                                     request['direction'])
+                    reply = {'ok': reason == None}
+
+                    if reason != None:
+                        reply['reason'] = reason
+
+                elif op == 'state':
+                    reply = {'ok': True, 'state': manager.state(request['game'])}
+
+                elif op == 'subscribe':
+                    # subscribe before replying so no move made after the reply is missed
+                    queue = manager.subscribe(request['game'])
+                    forwarders.append((request['game'], queue,
+                                       asyncio.ensure_future(forward(request['game'], queue))))
+                    reply = {'ok': True}
+
+                else:
+                    reply = {'ok': False, 'reason': 'unknown_op'}
+
+            except SessionNotFoundError:
+                reply = {'ok': False, 'reason': 'not_found'}
+
+            except (ValueError, KeyError, TypeError, IndexError):
+                reply = {'ok': False, 'reason': 'bad_request'}
+
+            await send(reply)
+
+    except ConnectionError:
+        # the client went away; clean up below
+        pass
+
+    finally:
+        # a forwarder cancelled before it first ran never unsubscribed itself
+        for game_id, queue, forwarder in forwarders:
+            forwarder.cancel()
+            manager.unsubscribe(game_id, queue)
+
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, ttl=600.0, board_class=None):
+    """
+    Runs a SessionManager behind a JSON-lines TCP server until cancelled.
+    """
+    tune_gc()
+
+    async with SessionManager(ttl, board_class=board_class) as manager:
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_client(manager, reader, writer), host, port)
+
+        async with server:
+            await server.serve_forever()
+
+
+async def load_test(games=100000, moves=50, think=1.0, board_class=BitBoard, seed=1):
+    """
+    Simulates many concurrent games against a local SessionManager. Each game is
+    played by one client task that makes a random legal move, then waits a random
+    think time (averaging think seconds) before the next one, until the game
+    ends or has made the given number of moves. Returns a dictionary with the
+    number of games and moves, moves per second, the p50/p99/max latency of a
+    move in milliseconds (from when the client was due to move until the move
+    was applied, so it includes any delay in the event loop getting to the
+    client) and the wall-clock seconds.
+    """
+    rng = random.Random(seed)
+    manager = SessionManager(ttl=3600.0, board_class=board_class)
+    latencies = []
+
+    async def client(game_id):
+        game = manager.get_game(game_id)
+        player_name = 'A'
+        loop = asyncio.get_running_loop()
+
+        # spread the first moves out over one think time
+        delay = rng.random() * think
+
+        for _ in range(moves):
+            due = loop.time() + delay
+            await asyncio.sleep(delay)
+
+            legal = game.legal_moves(player_name)
+
+            if not legal:
+                break
+
+            move = legal[rng.randrange(len(legal))]
+            await manager.make_move(game_id, player_name, move[0], move[1])
+            latencies.append(loop.time() - due)
+
+            if game.get_winner() != None:
+                break
+
+            player_name = game.get_current_turn()
+            delay = rng.expovariate(1.0 / think) if think > 0 else 0
+
+    start = time.perf_counter()
+
+    async with manager:
+        ids = [manager.create_game(('A', 'W'), ('B', 'B')) for _ in range(games)]
+        tune_gc()
+        await asyncio.gather(*(client(game_id) for game_id in ids))
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 \
+            if latencies else 0.0
+
+    return {
+        'games': games,
+        'moves': len(latencies),
+        'moves_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'max_ms': percentile(1.0),
+        'seconds': elapsed,
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point: "serve" runs the TCP server and "loadtest" runs
+    load_test and prints its results as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Host many Kuba games in one process.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--ttl', type=float, default=600.0)
+    serve_parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='dict')
+
+    load_parser = commands.add_parser('loadtest')
+    load_parser.add_argument('--games', type=int, default=100000)
+    load_parser.add_argument('--moves', type=int, default=50)
+    load_parser.add_argument('--think', type=float, default=1.0)
+    load_parser.add_argument('--board', choices=sorted(BOARD_CLASSES), default='bitboard')
+    load_parser.add_argument('--seed', type=int, default=1)
+
+    args = parser.parse_args(argv)
+    board_class = BOARD_CLASSES[args.board]
+
+    if args.command == 'serve':
+        asyncio.run(serve(args.host, args.port, args.ttl, board_class))
+
+    else:
+        results = asyncio.run(load_test(args.games, args.moves, args.think, board_class,
+                                        args.seed))
+        print(json.dumps(results, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
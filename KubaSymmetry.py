@@ -0,0 +1,308 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Symmetry
+# Description:
+#   Canonical position keys for the Kuba game implemented in KubaGame.py. The
+#   rules are unchanged by rotating or reflecting the board (the 8 symmetries of
+#   the square) and by swapping the White and Black marbles, so each position
+#   belongs to a family of up to 16 equivalent positions. canonical_key maps a
+#   game to one integer key shared by its whole family, together with the
+#   transform that takes the game to the canonical position, so moves can be
+#   translated to the canonical position and back.
+#
+#   Transforms are numbered 0 to 15: transform % 8 selects the rotation or
+#   reflection and transforms 8 to 15 also swap the colors. Cell permutations,
+#   direction maps and the off-board cells a Ko restriction can name are all
+#   precomputed.
+
+import operator
+
+from KubaGame import KubaGame
+
+
+# the 8 symmetries of the board as functions of (row, col); they also apply to
+# the cells just off the board (row or column -1 or 7) named by a Ko move
+GEOMETRIES = (
+    lambda row, col: (row, col),            # identity
+    lambda row, col: (col, 6 - row),        # rotate 90 degrees clockwise
+    lambda row, col: (6 - row, 6 - col),    # rotate 180 degrees
+    lambda row, col: (6 - col, row),        # rotate 270 degrees clockwise
+    lambda row, col: (row, 6 - col),        # mirror left to right
+    lambda row, col: (6 - row, col),        # mirror top to bottom
+    lambda row, col: (col, row),            # mirror on the main diagonal
+    lambda row, col: (6 - col, 6 - row),    # mirror on the other diagonal
+)
+
+TRANSFORM_COUNT = 16
+
+DIRECTIONS = 'FBLR'
+STEP_DIRECTIONS = {step: direction for direction, step in KubaGame.DIRECTION_STEPS.items()}
+
+VALUE_DIGITS = str.maketrans('XWBR', '0123')
+COLOR_SWAP = str.maketrans('WB', 'BW')
+DIGIT_SWAP = str.maketrans('12', '21')
+SWAP_COLOR = {'W': 'B', 'B': 'W'}
+
+# COORDINATE_MAPS[transform][(row, col)]: the image of every cell from (-1, -1)
+# to (7, 7); DIRECTION_MAPS[transform][direction]: the image of each direction
+COORDINATE_MAPS = []
+DIRECTION_MAPS = []
+
+# CELL_SOURCES[transform]: picks, for each cell of the transformed board in
+# row-major order, the index of the cell it comes from
+CELL_SOURCES = []
+
+for _transform in range(TRANSFORM_COUNT):
+    _geometry = GEOMETRIES[_transform % 8]
+    _coordinates = {}
+
+    for _row in range(-1, 8):
+        for _col in range(-1, 8):
+            _coordinates[(_row, _col)] = _geometry(_row, _col)
+
+    _directions = {}
+
+    for _direction, (_row_step, _col_step) in KubaGame.DIRECTION_STEPS.items():
+        _origin = _geometry(0, 0)
+        _target = _geometry(_row_step, _col_step)
+        _directions[_direction] = STEP_DIRECTIONS[(_target[0] - _origin[0],
+                                                   _target[1] - _origin[1])]
+
+    _sources = [0] * 49
+
+    for _index in range(49):
+        _row, _col = _coordinates[divmod(_index, 7)]
+        _sources[_row * 7 + _col] = _index
+
+    COORDINATE_MAPS.append(_coordinates)
+    DIRECTION_MAPS.append(_directions)
+    CELL_SOURCES.append(operator.itemgetter(*_sources))
+
+# INVERSES[transform]: the transform that undoes it
+INVERSES = []
+
+for _transform in range(TRANSFORM_COUNT):
+
+    for _candidate in range(TRANSFORM_COUNT):
+
+        if (_candidate >= 8) == (_transform >= 8) and all(
+                COORDINATE_MAPS[_candidate][COORDINATE_MAPS[_transform][_cell]] == _cell
+                for _cell in ((0, 1), (1, 3))):
+            INVERSES.append(_candidate)
+            break
+
+del _transform, _geometry, _coordinates, _row, _col, _directions, _direction
+del _row_step, _col_step, _origin, _target, _sources, _index, _candidate
+
+
+def transform_coordinate(coordinate, transform):
+    """
+    Takes a (row, col) coordinate (on the board or just off it) and a transform
+    number and returns the transformed coordinate.
+    """
+    return COORDINATE_MAPS[transform][coordinate]
+
+
+def transform_direction(direction, transform):
+    """
+    Takes a direction ("F", "B", "L" or "R") and a transform number and returns
+    the transformed direction.
+    """
+    return DIRECTION_MAPS[transform][direction]
+
+
+def transform_move(move, transform):
+    """
+    Takes a (coordinate, direction) move and a transform number and returns the
+    same move in the transformed position.
+    """
+    return (COORDINATE_MAPS[transform][move[0]], DIRECTION_MAPS[transform][move[1]])
+
+
+def inverse_transform(transform):
+    """
+    Returns the transform number that undoes the given transform.
+    """
+    return INVERSES[transform]
+
+
+def untransform_move(move, transform):
+    """
+    Takes a move in a transformed position (e.g. a move found for the canonical
+    position) and the transform that produced that position, and returns the
+    move in the original position.
+    """
+    return transform_move(move, INVERSES[transform])
+
+
+def transform_state(state, transform):
+    """
+    Takes a state tuple from KubaGame.export_state and a transform number and
+    returns the state tuple of the transformed position. When the transform
+    swaps colors, each player keeps their name and captured red marbles but
+    plays the other color.
+    """
+    cells, players, current_turn, ko_move, reds, winner = state
+    cells = ''.join(CELL_SOURCES[transform](cells))
+
+    if transform >= 8:
+        cells = cells.translate(COLOR_SWAP)
+        players = tuple((name, SWAP_COLOR[color]) for name, color in players)
+
+    if ko_move[0] != None:
+        ko_move = (COORDINATE_MAPS[transform][ko_move[0]], DIRECTION_MAPS[transform][ko_move[1]])
+
+    return (cells, players, current_turn, ko_move, reds, winner)
+
+
+def transform_game(game, transform, board_class=None):
+    """
+    Takes a KubaGame and a transform number and returns a new KubaGame in the
+    transformed position.
+    """
+    return KubaGame.from_state(transform_state(game.export_state(), transform), board_class)
+
+
+def encode_key(cells, turn_color, ko_move, red_white, red_black, winner_color):
+    """
+    Packs a position into one integer: the 49 cells in base 4 (X=0, W=1, B=2,
+    R=3), the color to move (0 none, 1 W, 2 B), the Ko move (324 for none),
+    the red marbles captured by White and by Black (0 to 15 each) and the color
+    of the winner (0 none, 1 W, 2 B).
+    """
+    key = int(cells.translate(VALUE_DIGITS), 4)
+    key = key * 3 + ' WB'.index(turn_color or ' ')
+
+    if ko_move[0] != None:
+        (row, col), direction = ko_move
+        ko = ((row + 1) * 9 + col + 1) * 4 + DIRECTIONS.index(direction)
+    else:
+        ko = 324
+
+    key = (key * 325 + ko) * 16 + red_white
+    key = (key * 16 + red_black) * 3 + ' WB'.index(winner_color or ' ')
+
+    return key
+
+
+def decode_key(key):
+    """
+    Unpacks an integer made by encode_key and returns (cells, turn color, Ko
+    move, red marbles captured by White, red marbles captured by Black, winner
+    color), with None for no turn, no Ko restriction or no winner.
+    """
+    key, winner = divmod(key, 3)
+    key, red_black = divmod(key, 16)
+    key, red_white = divmod(key, 16)
+    key, ko = divmod(key, 325)
+    key, turn = divmod(key, 3)
+
+    digits = []
+
+    for _ in range(49):
+        key, digit = divmod(key, 4)
+        digits.append('XWBR'[digit])
+
+    cells = ''.join(reversed(digits))
+
+    if ko != 324:
+        cell, direction = divmod(ko, 4)
+        row, col = divmod(cell, 9)
+        ko_move = ((row - 1, col - 1), DIRECTIONS[direction])
+    else:
+        ko_move = (None, None)
+
+    return (cells, ' WB'[turn].strip() or None, ko_move, red_white, red_black,
+            ' WB'[winner].strip() or None)
+
+
+def position_fields(game):
+    """
+    Returns the player-independent description of a game's position: (cells,
+    color to move, Ko move, red marbles captured by White, by Black, winner
+    color).
+    """
+    cells, players, current_turn, ko_move, reds, winner = game.export_state()
+    colors = {name: color for name, color in players}
+    red_counts = {color: count for (name, color), count in zip(players, reds)}
+
+    return (cells, colors.get(current_turn), ko_move, red_counts.get('W', 0),
+            red_counts.get('B', 0), colors.get(winner))
+
+
+def transformed_key(fields, transform):
+    """
+    Takes the fields returned by position_fields and a transform number and
+    returns the key of the transformed position.
+    """
+    cells, turn_color, ko_move, red_white, red_black, winner_color = fields
+    cells = ''.join(CELL_SOURCES[transform](cells))
+
+    if ko_move[0] != None:
+        ko_move = (COORDINATE_MAPS[transform][ko_move[0]], DIRECTION_MAPS[transform][ko_move[1]])
+
+    if transform >= 8:
+        cells = cells.translate(COLOR_SWAP)
+        turn_color = SWAP_COLOR.get(turn_color)
+        winner_color = SWAP_COLOR.get(winner_color)
+        red_white, red_black = red_black, red_white
+
+    return encode_key(cells, turn_color, ko_move, red_white, red_black, winner_color)
+
+
+def position_key(game):
+    """
+    Returns the integer key of a game's position without applying any symmetry.
+    Player names are not part of the key.
+    """
+    return transformed_key(position_fields(game), 0)
+
+
+def canonical_key(game):
+    """
+    Takes a KubaGame and returns a tuple (key, transform): key is the smallest
+    position key among the 16 symmetric versions of the position, so every
+    equivalent position has the same key, and transform is the transform that
+    takes the game's position to the canonical one. Translate a move into the
+    canonical position with transform_move(move, transform) and a move of the
+    canonical position back with untransform_move(move, transform).
+    """
+    fields = position_fields(game)
+    digits = fields[0].translate(VALUE_DIGITS)
+    swapped = digits.translate(DIGIT_SWAP)
+
+    # the cells are the most significant part of the key, so only the
+    # transforms that give the smallest board need their full key computed
+    boards = [''.join(CELL_SOURCES[transform](swapped if transform >= 8 else digits))
+              for transform in range(TRANSFORM_COUNT)]
+    smallest = min(boards)
+
+    best_key = None
+    best_transform = 0
+
+    for transform in range(TRANSFORM_COUNT):
+
+        if boards[transform] != smallest:
+            continue
+
+        key = transformed_key(fields, transform)
+
+        if best_key == None or key < best_key:
+            best_key = key
+            best_transform = transform
+
+    return best_key, best_transform
+
+
+def game_from_key(key, players=(('PlayerA', 'W'), ('PlayerB', 'B')), board_class=None):
+    """
+    Takes a key from position_key or canonical_key and the (name, color) tuple
+    of each player, and returns a KubaGame in that position. The player with
+    each color gets that color's captured red marbles, turn and win.
+    """
+    cells, turn_color, ko_move, red_white, red_black, winner_color = decode_key(key)
+    names = {color: name for name, color in players}
+    reds = tuple(red_white if color == 'W' else red_black for name, color in players)
+    state = (cells, tuple(players), names.get(turn_color), ko_move, reds, names.get(winner_color))
+
+    return KubaGame.from_state(state, board_class)
@@ -0,0 +1,889 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Tablebase
+# Description:
+#   Endgame tablebase for the Kuba game implemented in KubaGame.py. Small
+#   endgames (a few White, Black and Red marbles left, with given counts of red
+#   marbles already captured) are solved exactly by retrograde analysis: every
+#   position of a material configuration is generated, the positions that are
+#   already decided (the side to move has no legal move, or every move loses)
+#   are resolved first, and results are propagated backwards to the positions
+#   leading to them, nearest results first. Positions never resolved are draws
+#   (the game can go on forever). Solving keeps a uint16 value and a uint8
+#   count of undecided moves per position, rather than lists of moves, and
+#   finds the positions leading to a resolved one by unpushing lines.
+#
+#   Each position is stored as its result (win, loss or draw for the side to
+#   move) and the number of moves (plies) to that result, with best play:
+#   the winner wins as fast as possible and the loser holds out as long as
+#   possible. The Ko rule is handled exactly: a position whose value changes
+#   because the previous move forbids its reverse has an extra entry.
+#
+#   The file is read through mmap, so probing needs no load step:
+#
+#       python KubaTablebase.py build --max-marbles 2 --max-reds 1 --output kuba.tb
+#
+#   File layout (little-endian): MAGIC, the number of tables (uint32), then for
+#   each table its material (W, B and R marbles on the board and red marbles
+#   captured by White and by Black, 5 bytes, 3 bytes padding) and the offset
+#   and entry count of its base section and of its Ko section (4 uint64). The
+#   base section holds one uint16 per position index (see position_index); the
+#   Ko section holds (uint64 position index, uint16 Ko move code, uint16 value)
+#   records sorted by index and move code, for positions whose value with that
+#   Ko restriction differs from the base value. Values are 0 for a draw,
+#   2 * plies - 1 for a win and 2 * plies + 2 for a loss.
+
+import argparse
+import bisect
+import itertools
+import mmap
+import struct
+import sys
+from array import array
+from math import comb
+
+from KubaGame import KubaGame
+
+
+MAGIC = b'KUBATB2\0'
+TABLE_ENTRY = struct.Struct('<5B3xQQQQ')
+KO_ENTRY = struct.Struct('<QHH')
+
+WIN = 'win'
+LOSS = 'loss'
+DRAW = 'draw'
+
+DIRECTIONS = 'FBLR'
+OPPOSITE = {'F': 'B', 'B': 'F', 'L': 'R', 'R': 'L'}
+
+# move codes are cell index * 4 + direction index
+MOVE_CODES = 49 * 4
+
+# while solving, the flag of an unresolved value and the count of moves of a
+# state that can no longer lose (it has a winning or drawing move)
+UNSOLVED = 0x8000
+BLOCKED = 255
+
+# for each cell index and direction index: the access cell index (None when it
+# is off the board) and the cell indexes from the cell to the edge
+ACCESS_INDEX = []
+RAY_INDEX = []
+
+for _cell in range(49):
+    _coordinate = divmod(_cell, 7)
+
+    for _direction in DIRECTIONS:
+        _behind = KubaGame.ACCESS_CELLS[(_coordinate, _direction)]
+        ACCESS_INDEX.append(None if _behind == None else _behind[0] * 7 + _behind[1])
+        RAY_INDEX.append(tuple(_row * 7 + _col for _row, _col in KubaGame.RAYS[(_coordinate, _direction)]))
+
+# BINOMIAL[n][k] = comb(n, k) for the ranks of marble cells
+BINOMIAL = [[comb(_n, _k) for _k in range(50)] for _n in range(50)]
+# BINOMIAL_COLUMN[k][n] = comb(n, k), increasing in n, to unrank by bisection
+BINOMIAL_COLUMN = [[comb(_n, _k) for _n in range(50)] for _k in range(50)]
+
+del _cell, _coordinate, _direction, _behind
+
+
+def encode_value(result, plies):
+    """
+    Packs a result (WIN, LOSS or DRAW) and its distance in plies into the
+    uint16 stored in the file.
+    """
+    if result == WIN:
+        return 2 * plies - 1
+
+    if result == LOSS:
+        return 2 * plies + 2
+
+    return 0
+
+
+def decode_value(value):
+    """
+    Unpacks a stored uint16 into (result, plies).
+    """
+    if value == 0:
+        return DRAW, None
+
+    if value & 1:
+        return WIN, (value + 1) // 2
+
+    return LOSS, (value - 2) // 2
+
+
+def table_size(material):
+    """
+    Returns the number of position indexes of a material configuration.
+    """
+    white, black, red = material[0], material[1], material[2]
+
+    return comb(49, white) * comb(49 - white, black) * comb(49 - white - black, red) * 2
+
+
+def rank_cells(cells, taken):
+    """
+    Takes a sorted list of cell indexes and a sorted list of cells already used
+    by other marbles, and returns the rank of the cells among the free cells
+    in the combinatorial number system.
+    """
+    rank = 0
+
+    for position, cell in enumerate(cells):
+        below = 0
+
+        for other in taken:
+
+            if other < cell:
+                below += 1
+
+        rank += BINOMIAL[cell - below][position + 1]
+
+    return rank
+
+
+def unrank_cells(rank, count, free):
+    """
+    Takes a rank from rank_cells, the number of marbles and the sorted list of
+    free cells, and returns the sorted cell indexes of the marbles.
+    """
+    cells = []
+
+    for position in range(count, 0, -1):
+        number = bisect.bisect_right(BINOMIAL_COLUMN[position], rank) - 1
+        rank -= BINOMIAL[number][position]
+        cells.append(free[number])
+
+    cells.reverse()
+
+    return cells
+
+
+def colex_combinations(free, count):
+    """
+    Yields every combination of count cells from a sorted list of free cells
+    in the order of their rank_cells rank: by the last cell, then by the ones
+    before it.
+    """
+    if count == 0:
+        yield ()
+        return
+
+    for last in range(count - 1, len(free)):
+
+        for first in colex_combinations(free[:last], count - 1):
+            yield first + (free[last],)
+
+
+def position_index(material, whites, blacks, reds, side):
+    """
+    Takes a material configuration, the sorted cell indexes of the White, Black
+    and Red marbles and the side to move (0 White, 1 Black) and returns the
+    position index within the table.
+    """
+    white, black, red = material[0], material[1], material[2]
+    taken = sorted(whites + blacks)
+
+    index = rank_cells(whites, [])
+    index = index * BINOMIAL[49 - white][black] + rank_cells(blacks, whites)
+    index = index * BINOMIAL[49 - white - black][red] + rank_cells(reds, taken)
+
+    return index * 2 + side
+
+
+def index_cells(material, index):
+    """
+    Inverse of position_index: takes a material configuration and a position
+    index and returns (49-character board string, side to move).
+    """
+    white, black, red = material[0], material[1], material[2]
+    index, side = divmod(index, 2)
+    index, red_rank = divmod(index, BINOMIAL[49 - white - black][red])
+    white_rank, black_rank = divmod(index, BINOMIAL[49 - white][black])
+
+    whites = unrank_cells(white_rank, white, range(49))
+    free = [cell for cell in range(49) if cell not in whites]
+    blacks = unrank_cells(black_rank, black, free)
+    free = [cell for cell in free if cell not in blacks]
+    reds = unrank_cells(red_rank, red, free)
+
+    board = ['X'] * 49
+
+    for cell in whites:
+        board[cell] = 'W'
+
+    for cell in blacks:
+        board[cell] = 'B'
+
+    for cell in reds:
+        board[cell] = 'R'
+
+    return ''.join(board), side
+
+
+def successors(cells, side, captures):
+    """
+    Takes a 49-character board string, the side to move (0 White, 1 Black) and
+    the (White, Black) captured red marbles, and returns the legal pushes of
+    the side to move, ignoring the Ko rule, as a list of (move code, new cells,
+    marble pushed off or None, new captures, Ko move code for the opponent or
+    None). The Ko move code is None when the push ended off the board, since a
+    reverse push from off the board is never possible. Follows the rules of
+    KubaGame.validate_move and make_move.
+    """
+    color = 'WB'[side]
+    moves = []
+    index = cells.find(color)
+
+    while index != -1:
+
+        for direction_index in range(4):
+            slot = index * 4 + direction_index
+            behind = ACCESS_INDEX[slot]
+
+            if behind != None and cells[behind] != 'X':
+                continue
+
+            ray = RAY_INDEX[slot]
+            end = None
+
+            for position, cell in enumerate(ray):
+
+                if cells[cell] == 'X':
+                    end = position
+                    break
+
+            if end == None:
+                pushed_off = cells[ray[-1]]
+
+                if pushed_off == color:
+                    continue
+
+                line = ray
+                ko = None
+
+            else:
+                pushed_off = None
+                line = ray[:end + 1]
+                ko = line[-1] * 4 + DIRECTIONS.index(OPPOSITE[DIRECTIONS[direction_index]])
+
+            board = list(cells)
+
+            for position in range(len(line) - 1, 0, -1):
+                board[line[position]] = cells[line[position - 1]]
+
+            board[line[0]] = 'X'
+
+            new_captures = captures
+
+            if pushed_off == 'R':
+                new_captures = (captures[0] + 1, captures[1]) if side == 0 else \
+                    (captures[0], captures[1] + 1)
+
+            moves.append((slot, ''.join(board), pushed_off, new_captures, ko))
+
+        index = cells.find(color, index + 1)
+
+    return moves
+
+
+def predecessors(cells, side):
+    """
+    Takes a board string and the side to move, and returns the pushes by the
+    other side that lead to it without a marble leaving the board, as a list
+    of (board string before the push, move code, Ko move code it leaves for
+    the side to move). A push moves a line of marbles one cell into the first
+    empty cell, so unpushing takes an empty cell with a marble of the mover
+    next to it, and moves that marble and any marbles behind it back one cell.
+    """
+    color = 'WB'[1 - side]
+    moves = []
+    index = cells.find(color)
+
+    while index != -1:
+
+        for direction_index in range(4):
+            # the marble came from the cell behind it, which is empty now
+            start = ACCESS_INDEX[index * 4 + direction_index]
+
+            if start == None or cells[start] != 'X':
+                continue
+
+            code = start * 4 + direction_index
+            behind = ACCESS_INDEX[code]
+
+            if behind != None and cells[behind] != 'X':
+                continue
+
+            ray = RAY_INDEX[code]
+            ko = DIRECTIONS.index(OPPOSITE[DIRECTIONS[direction_index]])
+            board = list(cells)
+
+            # the push may have ended at any marble of the line
+            for position in range(1, len(ray)):
+
+                if cells[ray[position]] == 'X':
+                    break
+
+                board[ray[position - 1]] = cells[ray[position]]
+                board[ray[position]] = 'X'
+                moves.append((''.join(board), code, ray[position] * 4 + ko))
+
+        index = cells.find(color, index + 1)
+
+    return moves
+
+
+def cells_index(material, cells, side):
+    """
+    Returns the position index of a board string in its material table, the
+    same as position_index for the cells of its marbles.
+    """
+    white, black, red = material[0], material[1], material[2]
+
+    index = rank_marbles(cells, 'W', '')
+    index = index * BINOMIAL[49 - white][black] + rank_marbles(cells, 'B', 'W')
+    index = index * BINOMIAL[49 - white - black][red] + rank_marbles(cells, 'R', 'WB')
+
+    return index * 2 + side
+
+
+def rank_marbles(cells, value, taken):
+    """
+    Takes a board string, a marble value and the values of the marbles ranked
+    before it, and returns the rank_cells rank of the cells holding the value
+    among the cells not holding one of the taken values.
+    """
+    rank = 0
+    position = 0
+    cell = cells.find(value)
+
+    while cell != -1:
+        position += 1
+        below = 0
+
+        for other in taken:
+            below += cells.count(other, 0, cell)
+
+        rank += BINOMIAL[cell - below][position]
+        cell = cells.find(value, cell + 1)
+
+    return rank
+
+
+def child_materials(material):
+    """
+    Returns the material configurations a move can lead to (other than the
+    game ending) from the given one: one fewer White or Black marble, or one
+    fewer Red marble captured by either side.
+    """
+    white, black, red, captured_white, captured_black = material
+    children = []
+
+    if white > 1:
+        children.append((white - 1, black, red, captured_white, captured_black))
+
+    if black > 1:
+        children.append((white, black - 1, red, captured_white, captured_black))
+
+    if red > 0 and captured_white < 6:
+        children.append((white, black, red - 1, captured_white + 1, captured_black))
+
+    if red > 0 and captured_black < 6:
+        children.append((white, black, red - 1, captured_white, captured_black + 1))
+
+    return children
+
+
+def solve_table(material, solved):
+    """
+    Solves one material configuration by retrograde analysis. Takes the
+    material (W, B, R on the board, reds captured by W and by B) and a
+    dictionary of already solved tables (material -> (base values, Ko
+    entries)) holding every configuration it depends on. Returns (base values
+    as an array of uint16 per position index, Ko entries as a dictionary
+    (index, Ko move code) -> value).
+
+    Nothing is stored per move: each state (a position, or a position with a
+    Ko restriction) keeps its value and a count of its moves into the table
+    that are not yet known to lose, and the states leading to a resolved one
+    are found again by unpushing (see predecessors).
+    """
+    white, black, red, captured_white, captured_black = material
+    size = table_size(material)
+    captures = (captured_white, captured_black)
+
+    # states 0 .. size - 1 are positions without a Ko restriction; state
+    # size + n is the position and forbidden move code packed in ko_keys[n]
+    # (index * MOVE_CODES + code), which are generated in increasing order.
+    # An unresolved state holds UNSOLVED | its longest known losing distance
+    values = array('H', [UNSOLVED]) * size
+    remaining = bytearray(size)
+    ko_keys = array('Q')
+    # the number of Ko states of each position, which follow each other in ko_keys
+    ko_counts = bytearray(size)
+    ko_values = array('H')
+    ko_remaining = bytearray()
+    # plies -> states resolved at that distance, nearest first
+    wins = {}
+    losses = {}
+
+    def schedule(events, plies, state):
+        bucket = events.get(plies)
+
+        if bucket == None:
+            bucket = events[plies] = array('Q')
+
+        bucket.append(state)
+
+    # returns the starting count of a state from its number of moves, its moves
+    # into the table, and the nearest win, longest loss and any draw through
+    # moves leaving the table, and schedules the state if already decided
+    def setup(state, moves, internal, best_win, longest, safe):
+        if best_win != None:
+            schedule(wins, best_win, state)
+            return BLOCKED
+
+        if safe:
+            return BLOCKED
+
+        if internal == 0:
+            schedule(losses, longest + 1 if moves else 0, state)
+
+        return internal
+
+    # first pass: generate every position in index order and count its moves
+    index = 0
+    whites_free = list(range(49))
+
+    for whites in colex_combinations(whites_free, white):
+        blacks_free = [cell for cell in whites_free if cell not in whites]
+
+        for blacks in colex_combinations(blacks_free, black):
+            reds_free = [cell for cell in blacks_free if cell not in blacks]
+
+            for reds in colex_combinations(reds_free, red):
+                board = ['X'] * 49
+
+                for cell in whites:
+                    board[cell] = 'W'
+
+                for cell in blacks:
+                    board[cell] = 'B'
+
+                for cell in reds:
+                    board[cell] = 'R'
+
+                cells = ''.join(board)
+
+                for side in (0, 1):
+                    moves = successors(cells, side, captures)
+                    opponent = 'WB'[1 - side]
+                    internal = 0
+                    best_win = None
+                    longest = 0
+                    safe = False
+                    ko_codes = []
+
+                    for code, new_cells, pushed_off, new_captures, ko in moves:
+
+                        if pushed_off == None:
+                            internal += 1
+
+                            # the move undoes an opponent push (and so can be
+                            # forbidden by Ko) when it pushes an opponent
+                            # marble back into an empty cell whose far side is
+                            # empty or off the board
+                            empty = ko // 4
+                            last = ACCESS_INDEX[empty * 4 + code % 4]
+                            beyond = ACCESS_INDEX[ko]
+
+                            if cells[last] == opponent and (beyond == None or cells[beyond] == 'X'):
+                                ko_codes.append(code)
+
+                            continue
+
+                        result, plies = move_result(material, side, new_cells, pushed_off,
+                                                    new_captures, solved)
+
+                        if result == LOSS:
+                            best_win = plies + 1 if best_win == None else min(best_win, plies + 1)
+
+                        elif result == WIN:
+                            longest = max(longest, plies)
+
+                        else:
+                            safe = True
+
+                    values[index] = UNSOLVED | longest
+                    remaining[index] = setup(index, len(moves), internal, best_win, longest, safe)
+
+                    # the forbidden move is always one of the moves into the table
+                    ko_counts[index] = len(ko_codes)
+
+                    for code in ko_codes:
+                        state = size + len(ko_keys)
+                        ko_keys.append(index * MOVE_CODES + code)
+                        ko_values.append(UNSOLVED | longest)
+                        ko_remaining.append(setup(state, len(moves) - 1, internal - 1, best_win,
+                                                  longest, safe))
+
+                    index += 1
+
+    values += ko_values
+    remaining += ko_remaining
+    del ko_values, ko_remaining
+
+    def find_ko(key):
+        position = bisect.bisect_left(ko_keys, key)
+
+        if position < len(ko_keys) and ko_keys[position] == key:
+            return size + position
+
+        return None
+
+    # returns the states with a move leading to the given one
+    def parents(state):
+        if state < size:
+            index, ko = state, None
+
+        else:
+            index, ko = divmod(ko_keys[state - size], MOVE_CODES)
+
+        cells, side = index_cells(material, index)
+        found = []
+
+        for parent_cells, code, parent_ko in predecessors(cells, side):
+
+            if ko == None:
+
+                # this push leads to the position with its Ko restriction
+                if ko_counts[index] and find_ko(index * MOVE_CODES + parent_ko) != None:
+                    continue
+
+            elif parent_ko != ko:
+                continue
+
+            parent = cells_index(material, parent_cells, 1 - side)
+            found.append(parent)
+
+            if not ko_counts[parent]:
+                continue
+
+            first = parent * MOVE_CODES
+            low = bisect.bisect_left(ko_keys, first)
+
+            # and the parent under every Ko restriction except this push
+            for position in range(low, low + ko_counts[parent]):
+
+                if ko_keys[position] != first + code:
+                    found.append(size + position)
+
+        return found
+
+    # retrograde propagation, nearest results first
+    while wins or losses:
+        plies = min(itertools.chain(wins, losses))
+
+        for result, events in ((WIN, wins), (LOSS, losses)):
+
+            for state in events.pop(plies, ()):
+
+                if not values[state] & UNSOLVED:
+                    continue
+
+                values[state] = encode_value(result, plies)
+
+                for parent in parents(state):
+
+                    if not values[parent] & UNSOLVED:
+                        continue
+
+                    if result == LOSS:
+                        schedule(wins, plies + 1, parent)
+
+                    elif remaining[parent] != BLOCKED:
+                        remaining[parent] -= 1
+                        longest = max(values[parent] & ~UNSOLVED, plies)
+                        values[parent] = UNSOLVED | longest
+
+                        if remaining[parent] == 0:
+                            schedule(losses, longest + 1, parent)
+
+    # states never resolved are draws
+    for state in range(len(values)):
+
+        if values[state] & UNSOLVED:
+            values[state] = 0
+
+    ko_entries = {}
+
+    for position, key in enumerate(ko_keys):
+        index, ko = divmod(key, MOVE_CODES)
+        value = values[size + position]
+
+        if value != values[index]:
+            ko_entries[(index, ko)] = value
+
+    del values[size:]
+
+    return values, ko_entries
+
+
+def move_result(material, side, cells, pushed_off, captures, solved):
+    """
+    Takes a move that pushed a marble off the board (the new cells, the marble
+    and the new captures) and returns (result, plies) for the player who moves
+    next, from the table the move leads to, or a loss in 0 plies when the move
+    ends the game.
+    """
+    white, black, red = material[0], material[1], material[2]
+    next_side = 1 - side
+
+    if pushed_off == 'W':
+        white -= 1
+
+    elif pushed_off == 'B':
+        black -= 1
+
+    else:
+        red -= 1
+
+    # the mover wins at once: the opponent is eliminated or 7 reds are captured
+    if white == 0 or black == 0 or captures[side] >= 7:
+        return LOSS, 0
+
+    child = (white, black, red, captures[0], captures[1])
+    value = solved[child][0][cells_index(child, cells, next_side)]
+
+    # a push that leaves the board ends off the board, so no Ko restriction applies
+    return decode_value(value)
+
+
+def build(roots, output):
+    """
+    Takes a list of material configurations and the path of the file to write.
+    Solves them and every configuration they can lead to, smallest first, and
+    writes all of them to the file. Returns the list of materials written.
+    """
+    solved = {}
+
+    def solve(material):
+        if material in solved:
+            return
+
+        for child in child_materials(material):
+            solve(child)
+
+        solved[material] = solve_table(material, solved)
+
+    for material in roots:
+        solve(tuple(material))
+
+    materials = sorted(solved)
+    header_size = len(MAGIC) + 4 + TABLE_ENTRY.size * len(materials)
+    offset = header_size
+    entries = []
+
+    for material in materials:
+        base, ko_entries = solved[material]
+        base_offset = offset
+        offset += 2 * len(base)
+        ko_offset = offset
+        offset += KO_ENTRY.size * len(ko_entries)
+        entries.append((material, base_offset, len(base), ko_offset, len(ko_entries)))
+
+    with open(output, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(materials)))
+
+        for material, base_offset, base_count, ko_offset, ko_count in entries:
+            file.write(TABLE_ENTRY.pack(*material, base_offset, base_count, ko_offset, ko_count))
+
+        for material in materials:
+            base, ko_entries = solved[material]
+
+            if sys.byteorder != 'little':
+                base = array('H', base)
+                base.byteswap()
+
+            file.write(base.tobytes())
+
+            for (index, ko), value in sorted(ko_entries.items()):
+                file.write(KO_ENTRY.pack(index, ko, value))
+
+    return materials
+
+
+class Tablebase:
+    """
+    Reads a tablebase file through mmap. Opening the file only reads its table
+    directory; each probe reads one value (plus a binary search of the Ko
+    entries when the game's Ko restriction applies) straight from the mapped
+    file.
+    """
+
+    def __init__(self, path):
+        """
+        Takes the path of a file written by build.
+        """
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError(path + " is not a Kuba tablebase file")
+
+        count = struct.unpack_from('<I', self._data, len(MAGIC))[0]
+        self._tables = {}
+        self.max_marbles = 0
+
+        for number in range(count):
+            fields = TABLE_ENTRY.unpack_from(self._data, len(MAGIC) + 4 + TABLE_ENTRY.size * number)
+            self._tables[fields[:5]] = fields[5:]
+            self.max_marbles = max(self.max_marbles, sum(fields[:3]))
+
+    def materials(self):
+        """
+        Returns the list of material configurations in the file.
+        """
+        return sorted(self._tables)
+
+    def probe(self, game):
+        """
+        Takes a KubaGame and returns (result, plies) for the player to move:
+        result is WIN, LOSS or DRAW and plies the number of moves (by both
+        players) until the result with best play, or None for a draw. Returns
+        None if the position is not in the tablebase, the game is already won
+        or no player has taken a turn yet.
+        """
+        current_turn = game.get_current_turn()
+
+        if game.get_winner() != None or current_turn == None:
+            return None
+
+        cells, players, current_turn, ko_move, reds, winner = game.export_state()
+        captured = {color: count for (name, color), count in zip(players, reds)}
+        side = 0 if game.get_player_color(current_turn) == 'W' else 1
+        material = (cells.count('W'), cells.count('B'), cells.count('R'),
+                    captured['W'], captured['B'])
+
+        table = self._tables.get(material)
+
+        if table == None:
+            return None
+
+        base_offset, base_count, ko_offset, ko_count = table
+        index = cells_index(material, cells, side)
+        value = struct.unpack_from('<H', self._data, base_offset + 2 * index)[0]
+
+        # a Ko restriction naming an off-board cell never forbids a legal move
+        if ko_move[0] != None and 0 <= ko_move[0][0] <= 6 and 0 <= ko_move[0][1] <= 6 and ko_count:
+            (ko_row, ko_col), ko_direction = ko_move
+            key = (index, (ko_row * 7 + ko_col) * 4 + DIRECTIONS.index(ko_direction))
+            low = 0
+            high = ko_count
+
+            while low < high:
+                middle = (low + high) // 2
+                entry = KO_ENTRY.unpack_from(self._data, ko_offset + KO_ENTRY.size * middle)
+
+                if entry[:2] < key:
+                    low = middle + 1
+
+                elif entry[:2] > key:
+                    high = middle
+
+                else:
+                    value = entry[2]
+                    break
+
+        return decode_value(value)
+
+    def close(self):
+        """
+        Unmaps and closes the file.
+        """
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        """
+        Allows the tablebase to be used in a with statement.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the tablebase when the with block ends.
+        """
+        self.close()
+
+
+def endgame_materials(max_marbles, max_reds, captures):
+    """
+    Returns every material configuration with at least one White and one Black
+    marble, at most max_marbles White and Black marbles together, at most
+    max_reds Red marbles, and the given (White, Black) captured red marbles.
+    """
+    materials = []
+
+    for white in range(1, max_marbles):
+
+        for black in range(1, max_marbles - white + 1):
+
+            for red in range(max_reds + 1):
+
+                if red + captures[0] + captures[1] <= 13:
+                    materials.append((white, black, red, captures[0], captures[1]))
+
+    return materials
+
+
+def main(argv=None):
+    """
+    Command-line entry point: "build" solves the endgames and writes the file,
+    "probe" prints the result for a position given as a 49-character board.
+    """
+    parser = argparse.ArgumentParser(description="Build or probe a Kuba endgame tablebase.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build')
+    build_parser.add_argument('--max-marbles', type=int, default=2,
+                              help="most White and Black marbles together (default 2)")
+    build_parser.add_argument('--max-reds', type=int, default=1,
+                              help="most Red marbles on the board (default 1)")
+    build_parser.add_argument('--captures', nargs='*', default=['0,0'],
+                              help="captured red marbles as White,Black pairs (default 0,0)")
+    build_parser.add_argument('--output', default='kuba.tb')
+
+    probe_parser = commands.add_parser('probe')
+    probe_parser.add_argument('path')
+    probe_parser.add_argument('cells', help="49 characters of W, B, R and X in row-major order")
+    probe_parser.add_argument('--to-move', choices=('W', 'B'), default='W')
+    probe_parser.add_argument('--captures', default='0,0')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        roots = []
+
+        for pair in args.captures:
+            captured = tuple(int(count) for count in pair.split(','))
+            roots += endgame_materials(args.max_marbles, args.max_reds, captured)
+
+        for material in build(roots, args.output):
+            print("solved", material)
+
+    else:
+        captured = tuple(int(count) for count in args.captures.split(','))
+        state = (args.cells, (('White', 'W'), ('Black', 'B')),
+                 'White' if args.to_move == 'W' else 'Black', (None, None), captured, None)
+
+        with Tablebase(args.path) as tablebase:
+            print(tablebase.probe(KubaGame.from_state(state)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
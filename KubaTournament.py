@@ -0,0 +1,609 @@
+# Author: Joel Swenddal
+# Date: 10/17/2026
+# Title: Kuba Tournament
+# Description:
+#   Tournament runner for computer players of the Kuba game implemented in
+#   KubaGame.py. Policies are given as short specs ("random", "greedy",
+#   "search:depth=2", "mcts:iterations=200") and play round-robin or gauntlet
+#   matches, with colors alternated between games of the same pairing. Games
+#   run in a pool of worker processes and each result is written to a CSV or
+#   JSONL file as soon as its batch finishes, so long runs can be followed and
+#   interrupted runs keep what they finished. At the end Elo ratings are fitted
+#   to all results, with 95% confidence intervals:
+#
+#       python KubaTournament.py random greedy search:depth=2 --games 200 --workers 8 --output results.jsonl
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from KubaGame import KubaGame
+from KubaMCTS import MCTSPlayer
+from KubaSearch import SearchPlayer
+
+
+# White always moves first; the names only identify the seats
+PLAYERS = (('White', 'W'), ('Black', 'B'))
+
+RESULT_FIELDS = ('game', 'white', 'black', 'winner', 'moves', 'seconds', 'seed')
+
+ELO_SCALE = 400 / math.log(10)
+
+
+class RandomPolicy:
+    """
+    Plays a uniformly random legal move.
+    """
+
+    def __init__(self, rng):
+        """
+        Takes the random.Random used to pick moves.
+        """
+        self._random = rng
+
+    def choose_move(self, game, player_name):
+        """
+        Takes a KubaGame and the name of the player to move and returns a legal
+        (coordinate, direction) move, or None if there is none.
+        """
+        moves = game.legal_moves(player_name)
+
+        if not moves:
+            return None
+
+        return moves[self._random.randrange(len(moves))]
+
+
+class GreedyPolicy:
+    """
+    Plays the move that wins at once if there is one, and otherwise the move
+    that gains the most this turn: red marbles captured (get_captured delta)
+    plus opponent marbles pushed off. Ties are broken at random.
+    """
+
+    def __init__(self, rng):
+        """
+        Takes the random.Random used to break ties.
+        """
+        self._random = rng
+
+    def choose_move(self, game, player_name):
+        """
+        Takes a KubaGame and the name of the player to move and returns a legal
+        (coordinate, direction) move, or None if there is none.
+        """
+        moves = game.legal_moves(player_name)
+
+        if not moves:
+            return None
+
+        opponent_index = 1 if game.get_player_color(player_name) == 'W' else 0
+        captured = game.get_captured(player_name)
+        opponent_marbles = game.get_marble_count()[opponent_index]
+
+        best_score = None
+        best_moves = []
+
+        for move in moves:
+            game.make_move(player_name, move[0], move[1])
+
+            if game.get_winner() == player_name:
+                score = 1000
+            else:
+                score = game.get_captured(player_name) - captured + \
+                    opponent_marbles - game.get_marble_count()[opponent_index]
+
+            game.unmake_move()
+
+            if best_score == None or score > best_score:
+                best_score = score
+                best_moves = [move]
+
+            elif score == best_score:
+                best_moves.append(move)
+
+        return best_moves[self._random.randrange(len(best_moves))]
+
+
+class SearchPolicy:
+    """
+    Plays the move chosen by KubaSearch.SearchPlayer. With a depth and no time
+    limit every game of the same seed plays out the same way.
+    """
+
+    def __init__(self, rng, depth=3, time_limit=None):
+        """
+        Takes the random.Random (unused; the search is deterministic), the search
+        depth and an optional time limit per move in seconds.
+        """
+        self._player = SearchPlayer(time_limit=float('inf') if time_limit == None else time_limit,
+                                    max_depth=depth)
+
+    def choose_move(self, game, player_name):
+        """
+        Takes a KubaGame and the name of the player to move and returns a legal
+        (coordinate, direction) move, or None if there is none.
+        """
+        return self._player.choose_move(game, player_name)[0]
+
+
+class MCTSPolicy:
+    """
+    Plays the move chosen by KubaMCTS.MCTSPlayer, searching in the worker
+    process itself (the tournament already uses every core).
+    """
+
+    def __init__(self, rng, iterations=200, time_limit=None):
+        """
+        Takes the random.Random that seeds the search, the number of iterations
+        per move and an optional time limit per move in seconds.
+        """
+        self._player = MCTSPlayer(workers=1, iterations=iterations, time_limit=time_limit,
+                                  seed=rng.randrange(1 << 30))
+
+    def choose_move(self, game, player_name):
+        """
+        Takes a KubaGame and the name of the player to move and returns a legal
+        (coordinate, direction) move, or None if there is none.
+        """
+        return self._player.choose_move(game, player_name)[0]
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'greedy': GreedyPolicy,
+    'search': SearchPolicy,
+    'mcts': MCTSPolicy,
+}
+
+
+def make_policy(spec, rng):
+    """
+    Takes a policy spec, a name from POLICIES optionally followed by ":" and
+    comma-separated key=value options (e.g. "search:depth=2,time_limit=0.05"), and
+    the random.Random for the policy. Returns the policy object.
+    """
+    name, _, options = spec.partition(':')
+
+    if name not in POLICIES:
+        raise ValueError("Unknown policy: " + name)
+
+    kwargs = {}
+
+    for option in options.split(','):
+
+        if option:
+            key, _, value = option.partition('=')
+            kwargs[key] = float(value) if '.' in value else int(value)
+
+    return POLICIES[name](rng, **kwargs)
+
+
+def play_game(game_id, white, black, seed, max_moves=500):
+    """
+    Plays one game between two policy specs with White moving first. Returns
+    the result dictionary written to the results file: the game number, both
+    specs, the winning color ("W", "B" or None for a game stopped after
+    max_moves moves), the number of moves, the seconds spent and the seed.
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    policies = {'White': make_policy(white, rng), 'Black': make_policy(black, rng)}
+    game = KubaGame(PLAYERS[0], PLAYERS[1])
+    player_name = 'White'
+    moves = 0
+
+    while game.get_winner() == None and moves < max_moves:
+        move = policies[player_name].choose_move(game, player_name)
+
+        if move == None:
+            break
+
+        game.make_move(player_name, move[0], move[1])
+        moves += 1
+        player_name = game.get_current_turn()
+
+        # the undo history is never used during a match
+        game.clear_history()
+
+    winner = game.get_winner()
+
+    return {
+        'game': game_id,
+        'white': white,
+        'black': black,
+        'winner': None if winner == None else game.get_player_color(winner),
+        'moves': moves,
+        'seconds': round(time.perf_counter() - start, 4),
+        'seed': seed,
+    }
+
+
+def play_batch(games, max_moves):
+    """
+    Worker entry point: plays a list of (game_id, white, black, seed) games and
+    returns their result dictionaries.
+    """
+    return [play_game(game_id, white, black, seed, max_moves) for game_id, white, black, seed in games]
+
+
+def round_robin(policies, games_per_pair):
+    """
+    Yields the (white, black) spec of every game of a round robin: each pair
+    of policies plays games_per_pair games, alternating colors. There are
+    len(policies) * (len(policies) - 1) // 2 * games_per_pair games.
+    """
+    for first in range(len(policies)):
+
+        for second in range(first + 1, len(policies)):
+
+            for number in range(games_per_pair):
+
+                if number % 2 == 0:
+                    yield policies[first], policies[second]
+                else:
+                    yield policies[second], policies[first]
+
+
+def gauntlet(challenger, opponents, games_per_pair):
+    """
+    Yields the (white, black) spec of every game of a gauntlet: the challenger
+    plays games_per_pair games against each opponent, alternating colors.
+    There are len(opponents) * games_per_pair games.
+    """
+    for opponent in opponents:
+
+        for number in range(games_per_pair):
+
+            if number % 2 == 0:
+                yield challenger, opponent
+            else:
+                yield opponent, challenger
+
+
+class ResultWriter:
+    """
+    Appends result dictionaries to a CSV file (when the path ends in ".csv")
+    or a JSON-lines file, one row per game.
+    """
+
+    def __init__(self, path):
+        """
+        Takes the path of the results file, which is created or truncated.
+        """
+        self._file = open(path, 'w', newline='')
+        self._csv = None
+
+        if path.endswith('.csv'):
+            self._csv = csv.DictWriter(self._file, RESULT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, results):
+        """
+        Takes a list of result dictionaries, writes them and flushes the file.
+        """
+        for result in results:
+
+            if self._csv != None:
+                self._csv.writerow(result)
+            else:
+                self._file.write(json.dumps(result) + '\n')
+
+        self._file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        """
+        Allows the writer to be used in a with statement.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the file when the with block ends.
+        """
+        self.close()
+
+
+class Standings:
+    """
+    Tallies finished games: for each pair of policies, the points scored by
+    each (1 for a win, 0.5 for a draw) and the games played, plus the number
+    of wins by each color.
+    """
+
+    def __init__(self, policies=()):
+        """
+        Takes the policy specs in the order they should be listed (the first
+        one anchors the Elo ratings); specs not listed are added as they first
+        appear. Starts with no games.
+        """
+        self.policies = list(policies)
+        self.games = 0
+        self.color_wins = {'W': 0, 'B': 0, None: 0}
+        self._pairs = {}
+
+    def add(self, result):
+        """
+        Takes a result dictionary from play_game and adds it to the tally.
+        """
+        white, black, winner = result['white'], result['black'], result['winner']
+
+        for spec in (white, black):
+
+            if spec not in self.policies:
+                self.policies.append(spec)
+
+        first, second = sorted((white, black))
+        pair = self._pairs.setdefault((first, second), [0.0, 0])
+
+        if winner == None:
+            pair[0] += 0.5
+        elif (winner == 'W') == (white == first):
+            pair[0] += 1
+
+        pair[1] += 1
+        self.games += 1
+        self.color_wins[winner] += 1
+
+    def pairs(self):
+        """
+        Returns a list of (first spec, second spec, points of the first, games)
+        for every pair that has played.
+        """
+        return [(first, second, points, games) for (first, second), (points, games) in self._pairs.items()]
+
+
+def solve_linear(matrix, vector):
+    """
+    Solves matrix * x = vector by Gaussian elimination with partial pivoting and
+    returns x. Raises ValueError if the matrix is singular.
+    """
+    size = len(vector)
+    rows = [list(matrix[row]) + [vector[row]] for row in range(size)]
+
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+
+        if abs(rows[pivot][column]) < 1e-12:
+            raise ValueError("Every policy must be connected to the first one by played games")
+
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+
+        for row in range(size):
+
+            if row != column and rows[row][column] != 0:
+                factor = rows[row][column] / rows[column][column]
+
+                for index in range(column, size + 1):
+                    rows[row][index] -= factor * rows[column][index]
+
+    return [rows[row][size] / rows[row][row] for row in range(size)]
+
+
+def elo_ratings(standings, prior=1.0, iterations=1000):
+    """
+    Fits Elo ratings to the tallied games with the Bradley-Terry model (a draw
+    counts as half a win for each side). prior adds that many drawn games
+    between each pair that has played, which keeps the ratings finite when a
+    policy wins or loses every game. Ratings are relative to the first policy
+    seen, which is rated 0. Returns a list of (spec, rating, margin) sorted by
+    rating, where rating +/- margin is a 95% confidence interval computed from
+    the Fisher information of the fit.
+    """
+    policies = standings.policies
+    index = {spec: number for number, spec in enumerate(policies)}
+    count = len(policies)
+
+    if count == 0:
+        return []
+
+    points = [0.0] * count
+    games = [[0.0] * count for _ in range(count)]
+
+    for first, second, first_points, played in standings.pairs():
+        i, j = index[first], index[second]
+        points[i] += first_points + prior / 2
+        points[j] += played - first_points + prior / 2
+        games[i][j] += played + prior
+        games[j][i] += played + prior
+
+    # minorization-maximization updates of the strengths
+    strength = [1.0] * count
+
+    for _ in range(iterations):
+        updated = []
+
+        for i in range(count):
+            total = sum(games[i][j] / (strength[i] + strength[j]) for j in range(count) if games[i][j])
+            updated.append(points[i] / total if total else strength[i])
+
+        anchor = updated[0]
+        change = max(abs(new / anchor - old) for new, old in zip(updated, strength))
+        strength = [value / anchor for value in updated]
+
+        if change < 1e-10:
+            break
+
+    # Fisher information of the log-strengths with the first policy fixed at 0
+    information = [[0.0] * (count - 1) for _ in range(count - 1)]
+
+    for i in range(1, count):
+
+        for j in range(count):
+
+            if i != j and games[i][j]:
+                expected = strength[i] / (strength[i] + strength[j])
+                weight = games[i][j] * expected * (1 - expected)
+                information[i - 1][i - 1] += weight
+
+                if j > 0:
+                    information[i - 1][j - 1] -= weight
+
+    margins = [0.0]
+
+    for i in range(1, count):
+        unit = [1.0 if row == i - 1 else 0.0 for row in range(count - 1)]
+        variance = solve_linear(information, unit)[i - 1]
+        margins.append(1.96 * ELO_SCALE * math.sqrt(max(variance, 0.0)))
+
+    ratings = [(policies[i], ELO_SCALE * math.log(strength[i]), margins[i]) for i in range(count)]
+    ratings.sort(key=lambda item: -item[1])
+
+    return ratings
+
+
+def schedule_batches(schedule, batch_size, seed, standings):
+    """
+    Yields the games of a schedule as lists of at most batch_size (game_id,
+    white, black, seed) tuples, reading the schedule lazily. Each spec is added
+    to the standings the first time it is scheduled, so the Elo anchor is the
+    first policy in the schedule whatever order the results arrive in.
+    """
+    games = iter(schedule)
+    number = 0
+
+    while True:
+        batch = []
+
+        for white, black in itertools.islice(games, batch_size):
+
+            for spec in (white, black):
+
+                if spec not in standings.policies:
+                    standings.policies.append(spec)
+
+            batch.append((number, white, black, seed + number))
+            number += 1
+
+        if not batch:
+            return
+
+        yield batch
+
+
+def run_tournament(schedule, output=None, workers=1, seed=0, max_moves=500, batch_size=10,
+                   progress=None):
+    """
+    Plays every (white, black) game of a schedule (any iterable, such as the
+    generators from round_robin and gauntlet) and returns the Standings. Game
+    number n uses seed + n, so a run can be repeated exactly. The schedule is
+    read batch_size games at a time, only as fast as batches are played, and
+    with more than one worker at most a few batches per worker are sent to
+    the process pool at a time, so schedules of millions of games need little
+    memory. Results are written to output (a ".csv" or JSON-lines path) as
+    each batch finishes, and progress, if given, is called with the Standings
+    after each batch.
+    """
+    standings = Standings()
+    writer = ResultWriter(output) if output else None
+    batches = schedule_batches(schedule, batch_size, seed, standings)
+
+    def finish(results):
+        for result in results:
+            standings.add(result)
+
+        if writer != None:
+            writer.write(results)
+
+        if progress != None:
+            progress(standings)
+
+    try:
+
+        if workers == 1:
+
+            for batch in batches:
+                finish(play_batch(batch, max_moves))
+
+        else:
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = set()
+
+                for batch in batches:
+                    pending.add(executor.submit(play_batch, batch, max_moves))
+
+                    if len(pending) >= workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                        for future in done:
+                            finish(future.result())
+
+                for future in pending:
+                    finish(future.result())
+
+    finally:
+
+        if writer != None:
+            writer.close()
+
+    return standings
+
+
+def main(argv=None):
+    """
+    Command-line entry point. Plays a round robin between the given policy specs
+    (or, with --gauntlet, the first spec against each of the others), prints
+    progress, and prints the Elo table at the end.
+    """
+    parser = argparse.ArgumentParser(description="Play a Kuba tournament between computer players.")
+    parser.add_argument('policies', nargs='+', help="policy specs, e.g. random greedy search:depth=2")
+    parser.add_argument('--games', type=int, default=100, help="games per pair of policies (default 100)")
+    parser.add_argument('--gauntlet', action='store_true',
+                        help="play the first policy against each of the others only")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-moves', type=int, default=500,
+                        help="moves after which a game is scored as a draw (default 500)")
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--output', help="results file, CSV if it ends in .csv and JSON lines otherwise")
+    args = parser.parse_args(argv)
+
+    for spec in args.policies:
+        make_policy(spec, random.Random(0))
+
+    if args.gauntlet:
+        schedule = gauntlet(args.policies[0], args.policies[1:], args.games)
+        total = (len(args.policies) - 1) * args.games
+    else:
+        schedule = round_robin(args.policies, args.games)
+        total = len(args.policies) * (len(args.policies) - 1) // 2 * args.games
+
+    start = time.perf_counter()
+    step = max(1, total // 20)
+    next_report = [step]
+
+    def progress(standings):
+        if standings.games >= next_report[0] or standings.games == total:
+            next_report[0] = standings.games + step
+            print("%d/%d games, %.1f s" % (standings.games, total, time.perf_counter() - start),
+                  file=sys.stderr)
+
+    standings = run_tournament(schedule, args.output, args.workers, args.seed, args.max_moves,
+                               args.batch_size, progress)
+
+    print("%-30s %8s %8s" % ('policy', 'elo', '+/-'))
+
+    for spec, rating, margin in elo_ratings(standings):
+        print("%-30s %8.1f %8.1f" % (spec, rating, margin))
+
+    print("games %d, White wins %d, Black wins %d, draws %d" % (
+        standings.games, standings.color_wins['W'], standings.color_wins['B'], standings.color_wins[None]))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())